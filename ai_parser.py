@@ -1,8 +1,16 @@
 import openai
-import json
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from parse_cache import ParseCache
+from local_parser import DEFAULT_CATEGORIES, LocalParser, normalize_bank_name
+from llm_client import AsyncChatClient
+from llm_batcher import MicroBatcher
+from resilience import LLMGuard, LLMUnavailable, estimate_tokens, is_retryable
+from llm_usage import TokenUsage
+import llm_prompts
 
 load_dotenv()
 
@@ -12,83 +20,227 @@ class AIParser:
         openai.api_key = os.getenv('OPENAI_API_KEY')
         
         # Стандартные категории
-        self.categories = {
-            "expense": ["еда", "транспорт", "развлечения", "покупки", "жилье", "здоровье", "другое"],
-            "income": ["зарплата", "инвестиции", "подарки", "подработка", "другое"]
-        }
+        self.categories = {name: list(values) for name, values in DEFAULT_CATEGORIES.items()}
         
         # Стандартные банки
         self.banks = ["kaspi", "halyk", "sber", "forte", "наличные", "другое"]
+        
+        # Кэш результатов: повторяющиеся фразы не отправляются в OpenAI
+        self.cache = ParseCache(
+            maxsize=int(os.getenv('PARSE_CACHE_SIZE', '2048')),
+            ttl=float(os.getenv('PARSE_CACHE_TTL', str(7 * 24 * 3600))),
+            db_path=os.getenv('PARSE_CACHE_DB') or None
+        )
+        
+        # Быстрый локальный разбор простых сообщений ("кофе 800 тг")
+        self.local_parser = LocalParser(
+            self.categories,
+            threshold=float(os.getenv('LOCAL_PARSER_THRESHOLD', '0.85'))
+        )
+        
+        # Таймаут запроса к OpenAI и асинхронный клиент с общим пулом соединений
+        self.request_timeout = float(os.getenv('OPENAI_TIMEOUT', '15'))
+        self.async_client = AsyncChatClient(
+            api_key=openai.api_key,
+            timeout=self.request_timeout,
+            max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+        )
+        
+        # Квоты, параллельность, повторы и предохранитель для всех запросов к OpenAI
+        self.guard = LLMGuard(
+            requests_per_minute=float(os.getenv('OPENAI_RPM', '500')),
+            tokens_per_minute=float(os.getenv('OPENAI_TPM', '90000')),
+            max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '16')),
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '3')),
+            deadline=float(os.getenv('OPENAI_DEADLINE', str(2 * self.request_timeout))),
+            failure_threshold=int(os.getenv('OPENAI_CIRCUIT_THRESHOLD', '5')),
+            reset_timeout=float(os.getenv('OPENAI_CIRCUIT_RESET', '30'))
+        )
+        
+        # Запросы собираются один раз: короткая инструкция и схема функции,
+        # в которой категории и банки заданы списками допустимых значений
+        self.transaction_function = llm_prompts.transaction_function(self.categories, self.banks)
+        self.transaction_batch_function = llm_prompts.transaction_batch_function(self.categories, self.banks)
+        self.transfer_function = llm_prompts.transfer_function(
+            ["kaspi", "halyk", "sber", "forte", "наличные"]
+        )
+        
+        # Токены и время ответа по видам запросов
+        self.usage = TokenUsage()
+        
+        # Пакетирование: сообщения разных пользователей, пришедшие в пределах
+        # окна, уходят в OpenAI одним запросом. LLM_BATCH_WINDOW_MS=0 отключает
+        batch_window = float(os.getenv('LLM_BATCH_WINDOW_MS', '50')) / 1000
+        self.batcher = MicroBatcher(
+            self._parse_transaction_batch,
+            window=batch_window,
+            max_size=int(os.getenv('LLM_BATCH_MAX_SIZE', '8'))
+        ) if batch_window > 0 else None
     
     def parse_transaction(self, message: str) -> Dict:
         """Парсинг сообщения о финансовой операции"""
         
-        prompt = f"""Извлеки из сообщения информацию о финансовой операции.
+        known = self.parse_without_llm(message)
+        if known:
+            return known
+        
+        result = self._parse_transaction_llm(message)
+        self.cache.set(message, result)
+        return result
 
-Сообщение: "{message}"
+    def parse_without_llm(self, message: str) -> Optional[Dict]:
+        """Результат локального парсера или кэша, если он достаточно надежен"""
+        
+        local = self.local_parser.parse(message)
+        if local['success'] and local['confidence'] >= self.local_parser.threshold:
+            return local
+        
+        return self.cache.get(message)
 
-Категории расходов: {self.categories["expense"]}
-Категории доходов: {self.categories["income"]}
-Банки: {self.banks}
+    async def parse_transaction_async(self, message: str) -> Dict:
+        """Парсинг сообщения о финансовой операции без блокировки потока"""
+        
+        known = self.parse_without_llm(message)
+        if known:
+            return known
+        
+        return await self.parse_transaction_llm_async(message)
 
-Верни JSON:
-{{
-    "success": true/false,
-    "amount": число,
-    "currency": "KZT/USD/EUR/RUB",
-    "category": "одна из категорий",
-    "description": "краткое описание",
-    "bank": "банк или null",
-    "type": "income/expense",
-    "confidence": 0.0-1.0
-}}
+    async def parse_transaction_llm_async(self, message: str) -> Dict:
+        """Разбор только через OpenAI - для вызывающих, которые уже проверили parse_without_llm"""
+        
+        if self.guard.degraded:
+            # API недоступен: не ждем окна пакета ради заведомого отказа
+            return self._llm_error(LLMUnavailable("OpenAI временно недоступен"))
+        
+        try:
+            if self.batcher:
+                result = await self.batcher.submit(message)
+            else:
+                result = await self._parse_transaction_llm_async(message)
+        except Exception as e:
+            return self._llm_error(e)
+        
+        self.cache.set(message, result)
+        return result
 
-Если не можешь извлечь информацию, верни {{"success": false, "error": "причина"}}"""
+    async def _parse_transaction_llm_async(self, message: str) -> Dict:
+        """Один запрос к OpenAI на одно сообщение"""
+        try:
+            result = await self._call_function_async(
+                'transaction', llm_prompts.TRANSACTION_PROMPT, message, self.transaction_function
+            )
+        except ValueError as e:
+            return {"success": False, "error": f"Некорректный ответ модели: {e}"}
+        return self._transaction_from_dict(result)
 
+    async def _parse_transaction_batch(self, messages: List[str]) -> List[Dict]:
+        """Разобрать пакет сообщений одним запросом (для MicroBatcher)"""
+        if len(messages) == 1:
+            return [await self._parse_transaction_llm_async(messages[0])]
+        
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Ты помощник для анализа финансовых операций. Отвечай только в формате JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.3
+            results = (await self._call_function_async(
+                'transaction_batch', llm_prompts.TRANSACTION_BATCH_PROMPT,
+                llm_prompts.numbered(messages), self.transaction_batch_function,
+                max_tokens=120 * len(messages), items=len(messages)
+            )).get('results')
+        except ValueError:
+            results = None
+        
+        if not isinstance(results, list) or len(results) != len(messages):
+            # Модель вернула не то - разбираем по одному, параллельно
+            return list(await asyncio.gather(
+                *(self._parse_transaction_llm_async(message) for message in messages)
+            ))
+        
+        return [
+            self._transaction_from_dict(result) if isinstance(result, dict)
+            else {"success": False, "error": "Не удалось распознать транзакцию"}
+            for result in results
+        ]
+
+    def _parse_transaction_llm(self, message: str) -> Dict:
+        """Парсинг сообщения через OpenAI"""
+        try:
+            result = self._call_function(
+                'transaction', llm_prompts.TRANSACTION_PROMPT, message, self.transaction_function
             )
+        except ValueError as e:
+            return {"success": False, "error": f"Некорректный ответ модели: {e}"}
+        except Exception as e:
+            return self._llm_error(e)
+        return self._transaction_from_dict(result)
+
+    def _function_request(self, system_prompt: str, content: str, function: Dict, max_tokens: int):
+        """Сообщения, параметры запроса с обязательным вызовом функции и оценка токенов"""
+        messages = llm_prompts.function_messages(system_prompt, content)
+        params = {
+            "functions": [function],
+            "function_call": {"name": function["name"]},
+            "max_tokens": max_tokens,
+            "temperature": 0.3
+        }
+        tokens = estimate_tokens(messages, max_tokens) + llm_prompts.schema_tokens(function)
+        return messages, params, tokens
+
+    def _call_function(self, kind: str, system_prompt: str, content: str, function: Dict,
+                       max_tokens: int = 200, items: int = 1) -> Dict:
+        """Блокирующий запрос к OpenAI через квоты, повторы и предохранитель; аргументы функции"""
+        messages, params, tokens = self._function_request(system_prompt, content, function, max_tokens)
+        started = time.monotonic()
+        response = self.guard.call(
+            lambda: openai.ChatCompletion.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                request_timeout=self.request_timeout,
+                **params
+            ),
+            tokens=tokens
+        )
+        self.usage.record(kind, response.get("usage"), time.monotonic() - started, items)
+        return llm_prompts.function_arguments(response)
+
+    async def _call_function_async(self, kind: str, system_prompt: str, content: str, function: Dict,
+                                   max_tokens: int = 200, items: int = 1) -> Dict:
+        """То же без блокировки потока: через общий aiohttp-клиент"""
+        messages, params, tokens = self._function_request(system_prompt, content, function, max_tokens)
+        started = time.monotonic()
+        response = await self.guard.call_async(
+            lambda: self.async_client.create(messages, **params), tokens=tokens
+        )
+        self.usage.record(kind, response.get("usage"), time.monotonic() - started, items)
+        return llm_prompts.function_arguments(response)
+
+    def _llm_error(self, error: Exception) -> Dict:
+        """Результат при ошибке OpenAI; unavailable - сбой API, сообщение можно разобрать позже"""
+        if isinstance(error, LLMUnavailable):
+            message = str(error)
+        else:
+            message = f"Ошибка при обращении к OpenAI: {str(error)}"
+        return {
+            "success": False,
+            "error": message,
+            "unavailable": isinstance(error, LLMUnavailable) or is_retryable(error)
+        }
+
+    def _transaction_from_dict(self, result: Dict) -> Dict:
+        """Проверка и нормализация одного результата модели"""
+        
+        if result.get('success', False):
+            problem = llm_prompts.result_problem(result, llm_prompts.TRANSACTION_FIELDS)
+            if problem:
+                return {"success": False, "error": problem}
             
-            result_text = response.choices[0].message.content.strip()
+            # Нормализуем банк
+            if result.get('bank'):
+                result['bank'] = self.normalize_bank_name(result['bank'])
             
-            # Пытаемся извлечь JSON
-            try:
-                if result_text.startswith('```json'):
-                    result_text = result_text.replace('```json', '').replace('```', '').strip()
-                elif result_text.startswith('```'):
-                    result_text = result_text.replace('```', '').strip()
-                
-                result = json.loads(result_text)
-                
-                if result.get('success', False):
-                    # Нормализуем банк
-                    if result.get('bank'):
-                        result['bank'] = self.normalize_bank_name(result['bank'])
-                    
-                    return result
-                else:
-                    return {
-                        "success": False,
-                        "error": result.get('error', 'Не удалось распознать транзакцию')
-                    }
-                    
-            except json.JSONDecodeError:
-                return {
-                    "success": False,
-                    "error": f"Ошибка парсинга JSON: {result_text}"
-                }
-                
-        except Exception as e:
+            return result
+        else:
             return {
                 "success": False,
-                "error": f"Ошибка при обращении к OpenAI: {str(e)}"
+                "error": result.get('error', 'Не удалось распознать транзакцию')
             }
 
     def detect_transfer(self, message: str) -> bool:
@@ -105,110 +257,39 @@ class AIParser:
 
     def normalize_bank_name(self, bank_name: str) -> str:
         """Нормализация названий банков"""
-        if not bank_name:
-            return 'другое'
-            
-        bank_name_lower = bank_name.lower()
-        
-        if any(word in bank_name_lower for word in ['каспи', 'kaspi']):
-            return 'kaspi'
-        elif any(word in bank_name_lower for word in ['халык', 'halyk']):
-            return 'halyk'
-        elif any(word in bank_name_lower for word in ['сбер', 'sber']):
-            return 'sber'
-        elif any(word in bank_name_lower for word in ['форте', 'forte']):
-            return 'forte'
-        elif any(word in bank_name_lower for word in ['наличные', 'наличка', 'кэш', 'cash']):
-            return 'наличные'
-        else:
-            return 'другое'
+        return normalize_bank_name(bank_name)
 
     def parse_transfer(self, message: str) -> dict:
         """Парсинг переводов между счетами"""
         
-        prompt = f"""Извлеки информацию о переводе денег между счетами.
-
-Сообщение: "{message}"
-
-Банки: kaspi, halyk, sber, forte, наличные
-
-Верни JSON:
-{{
-    "success": true/false,
-    "amount": число,
-    "currency": "KZT",
-    "from_account": "источник перевода",
-    "to_account": "получатель перевода", 
-    "description": "описание перевода",
-    "confidence": 0.0-1.0
-}}
-
-Примеры:
-- "перевел с каспи на халык 50000" → from_account: "kaspi", to_account: "halyk"
-- "снял с халыка 25000 наличными" → from_account: "halyk", to_account: "наличные"
-- "пополнил каспи 30000" → from_account: "наличные", to_account: "kaspi"
-
-Если не можешь извлечь информацию, верни {{"success": false, "error": "причина"}}"""
-
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Ты помощник для анализа переводов денег. Отвечай только в формате JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=200,
-                temperature=0.3
+            result = self._call_function(
+                'transfer', llm_prompts.TRANSFER_PROMPT, message, self.transfer_function
             )
-            
-            result_text = response.choices[0].message.content.strip()
-            
-            try:
-                if result_text.startswith('```json'):
-                    result_text = result_text.replace('```json', '').replace('```', '').strip()
-                elif result_text.startswith('```'):
-                    result_text = result_text.replace('```', '').strip()
-                
-                result = json.loads(result_text)
-                
-                if result.get('success', False):
-                    # Нормализуем названия банков
-                    if result.get('from_account'):
-                        result['from_account'] = self.normalize_bank_name(result['from_account'])
-                    if result.get('to_account'):
-                        result['to_account'] = self.normalize_bank_name(result['to_account'])
-                    
-                    return result
-                else:
-                    return {
-                        "success": False,
-                        "error": result.get('error', 'Не удалось распознать перевод')
-                    }
-                    
-            except json.JSONDecodeError:
-                # Если JSON не парсится, возвращаем простую версию для теста
-                print(f"JSON parse error for transfer: {result_text}")
-                return {
-                    "success": True,
-                    "amount": 5000,
-                    "currency": "KZT",
-                    "from_account": "kaspi",
-                    "to_account": "halyk",
-                    "description": "Перевод между счетами",
-                    "confidence": 0.8
-                }
-                
+        except ValueError as e:
+            print(f"Invalid model response for transfer: {e}")
+            return {"success": False, "error": f"Некорректный ответ модели: {e}"}
         except Exception as e:
+            # Никаких подставных переводов: при сбое API операция не записывается
             print(f"OpenAI API error for transfer: {str(e)}")
-            # Возвращаем тестовую версию при ошибке API
+            return self._llm_error(e)
+        
+        if result.get('success', False):
+            problem = llm_prompts.result_problem(result, llm_prompts.TRANSFER_FIELDS)
+            if problem:
+                return {"success": False, "error": problem}
+            
+            # Нормализуем названия банков
+            if result.get('from_account'):
+                result['from_account'] = self.normalize_bank_name(result['from_account'])
+            if result.get('to_account'):
+                result['to_account'] = self.normalize_bank_name(result['to_account'])
+            
+            return result
+        else:
             return {
-                "success": True,
-                "amount": 5000,
-                "currency": "KZT", 
-                "from_account": "kaspi",
-                "to_account": "halyk",
-                "description": "Перевод между счетами",
-                "confidence": 0.6
+                "success": False,
+                "error": result.get('error', 'Не удалось распознать перевод')
             }
 
     def parse_transaction_or_transfer(self, message: str) -> dict:
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Coroutine
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """Цикл asyncio в отдельном потоке для корутинных обработчиков.
+
+    Обработчики-корутины ждут сеть (OpenAI) в цикле событий, не занимая
+    потоков, а блокирующие вызовы (SQLite, синхронный Bot API) уходят в
+    пул потоков через run_blocking().
+    """
+
+    def __init__(self, blocking_workers: int = 16):
+        self.blocking_workers = blocking_workers
+        self.loop = None
+        self._thread = None
+        self._executor = None
+        self._shutdown_hooks = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Запустить цикл событий (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self.loop is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.blocking_workers, thread_name_prefix="blocking"
+            )
+            self.loop = asyncio.new_event_loop()
+            self.loop.set_default_executor(self._executor)
+            self._thread = threading.Thread(
+                target=self.loop.run_forever, name="asyncio-runtime", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Запланировать корутину из любого потока"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def run_blocking(self, func: Callable, *args, **kwargs):
+        """Выполнить блокирующую функцию в пуле потоков и дождаться результата"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def add_shutdown_hook(self, coro_func: Callable):
+        """Корутина без аргументов, которую нужно выполнить при остановке (закрыть сессии и т.п.)"""
+        self._shutdown_hooks.append(coro_func)
+
+    def stop(self, timeout: float = 10.0):
+        """Дождаться активных задач и остановить цикл"""
+        with self._lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+
+        async def drain():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=timeout)
+            for hook in self._shutdown_hooks:
+                await hook()
+
+        asyncio.run_coroutine_threadsafe(drain(), loop).result(timeout + 1)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        loop.close()
+
+
+runtime = AsyncRuntime(blocking_workers=int(os.getenv('BLOCKING_WORKERS', '16')))
+
+
+def coroutine_handler(coro_func: Callable) -> Callable:
+    """Сделать корутину обработчиком для синхронного Dispatcher python-telegram-bot.
+
+    Обертка только ставит корутину в цикл событий и сразу возвращает
+    управление, поэтому поток диспетчера не ждет OpenAI. Исключения
+    передаются в обработчик ошибок диспетчера.
+    """
+    @functools.wraps(coro_func)
+    def callback(update, context):
+        future = runtime.submit(coro_func(update, context))
+
+        def report(done: Future):
+            if done.cancelled():
+                return
+            error = done.exception()
+            if error is not None:
+                if context.dispatcher is not None:
+                    context.dispatcher.dispatch_error(update, error)
+                else:
+                    logger.error("Ошибка в обработчике %s: %s", coro_func.__name__, error)
+
+        future.add_done_callback(report)
+        return future
+
+    return callback
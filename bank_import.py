@@ -0,0 +1,259 @@
+"""Импорт банковских выписок (Kaspi, Halyk и похожие CSV/XLSX).
+
+Файл читается потоково: строки проходят через цепочку генераторов
+(чтение -> сопоставление колонок -> разбор -> дедупликация) и пишутся
+в базу порциями; в памяти держится только порция строк и счетчики
+повторов для идентификаторов дедупликации.
+"""
+import codecs
+import csv
+import hashlib
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from local_parser import DEFAULT_CATEGORIES, LocalParser, normalize_bank_name
+
+# Возможные названия колонок в выписках разных банков
+COLUMN_ALIASES = {
+    'date': ['дата', 'дата операции', 'дата проведения операции', 'date'],
+    'amount': ['сумма', 'сумма операции', 'сумма в валюте счета', 'сумма в kzt', 'amount'],
+    'operation': ['операция', 'тип операции', 'вид операции', 'operation', 'type'],
+    'description': ['детали', 'описание', 'описание операции', 'назначение',
+                    'details', 'description'],
+    'currency': ['валюта', 'валюта операции', 'currency'],
+}
+
+DATE_FORMATS = ['%d.%m.%y', '%d.%m.%Y', '%Y-%m-%d', '%d/%m/%Y', '%d.%m.%Y %H:%M:%S',
+                '%Y-%m-%d %H:%M:%S']
+
+# Операции, которые считаются доходом, расходом или переводом (остальное - по знаку суммы).
+# Расходы по названию операции нужны для выписок, где суммы пишутся без знака
+INCOME_OPERATIONS = ['пополнение', 'зачисление', 'поступление', 'зарплата', 'кэшбэк', 'кешбэк',
+                     'возврат']
+EXPENSE_OPERATIONS = ['покупка', 'оплата', 'платеж', 'платёж', 'списание', 'комиссия']
+TRANSFER_OPERATIONS = ['перевод', 'снятие']
+
+AMOUNT_CLEAN_RE = re.compile(r'[^\d,.\-+]')
+
+
+class StatementError(ValueError):
+    """Файл выписки не удалось разобрать"""
+
+
+def read_rows(path: str) -> Iterator[Dict[str, str]]:
+    """Строки выписки как словари {колонка в нижнем регистре: значение}"""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _read_xlsx(path)
+    else:
+        yield from _read_csv(path)
+
+
+def detect_encoding(path: str) -> str:
+    """Кодировка CSV: UTF-8, если весь файл в ней читается, иначе cp1251.
+
+    Файл проверяется целиком до первой строки: переключаться на другую
+    кодировку посреди чтения нельзя - уже выданные строки пришли бы второй
+    раз с другим текстом и другими идентификаторами дедупликации.
+    """
+    for encoding in ('utf-8-sig', 'cp1251'):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    raise StatementError("Не удалось определить кодировку файла")
+
+
+def _read_csv(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, encoding=detect_encoding(path), newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = [column.strip().lower() for column in next(reader, [])]
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield dict(zip(header, row))
+
+
+def _read_xlsx(path: str) -> Iterator[Dict[str, str]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise StatementError("Для XLSX нужен пакет openpyxl: pip install openpyxl")
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+        for row in rows:
+            if any(cell not in (None, '') for cell in row):
+                yield {column: '' if cell is None else cell for column, cell in zip(header, row)}
+    finally:
+        workbook.close()
+
+
+def resolve_columns(header: Iterable[str]) -> Dict[str, str]:
+    """Сопоставить колонки файла с полями транзакции"""
+    header = list(header)
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in header:
+                columns[field] = alias
+                break
+    missing = {'date', 'amount'} - set(columns)
+    if missing:
+        raise StatementError(f"В файле нет колонок: {', '.join(sorted(missing))}")
+    return columns
+
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if hasattr(value, 'isoformat'):
+        return value
+    value = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise StatementError(f"Непонятная дата: {value}")
+
+
+def parse_amount(value) -> float:
+    """'- 2 500,00 ₸' -> -2500.0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = AMOUNT_CLEAN_RE.sub('', str(value))
+    if ',' in text and '.' in text:
+        # Десятичный разделитель - тот, что стоит последним
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '')
+        else:
+            text = text.replace(',', '')
+    text = text.replace(',', '.')
+    if not text or text in '+-':
+        raise StatementError(f"Непонятная сумма: {value}")
+    return float(text)
+
+
+class StatementMapper:
+    """Превращает строки выписки в транзакции для add_transactions_bulk"""
+
+    def __init__(self, user_id: int, bank: Optional[str] = None,
+                 categories: Optional[Dict[str, List[str]]] = None):
+        self.user_id = user_id
+        self.bank = bank
+        self.parser = LocalParser(categories or DEFAULT_CATEGORIES)
+        self.rows_read = 0
+        self.rows_skipped = 0
+
+        # Описания в выписках часто повторяются ("Magnum", "Yandex Go")
+        self._category_cache = {}
+        # Одинаковые операции в один день различаются порядковым номером
+        self._occurrences = {}
+        # В выписке сотни строк на одну дату, strptime дорогой
+        self._date_cache = {}
+
+    def categorize(self, description: str, transaction_type: str) -> str:
+        if transaction_type == 'transfer':
+            return 'перевод'
+        key = (description.lower(), transaction_type)
+        category = self._category_cache.get(key)
+        if category is None:
+            category = self.parser.categorize(description, transaction_type) or 'другое'
+            self._category_cache[key] = category
+        return category
+
+    def parse_date(self, value):
+        if not isinstance(value, str):
+            return parse_date(value)
+        date = self._date_cache.get(value)
+        if date is None:
+            date = parse_date(value)
+            self._date_cache[value] = date
+        return date
+
+    def map(self, rows: Iterable[Dict[str, str]]) -> Iterator[Dict]:
+        """Генератор транзакций из строк выписки"""
+        columns = None
+        for row in rows:
+            self.rows_read += 1
+            if columns is None:
+                columns = resolve_columns(row.keys())
+
+            try:
+                date = self.parse_date(row[columns['date']])
+                amount = parse_amount(row[columns['amount']])
+            except StatementError:
+                self.rows_skipped += 1
+                continue
+            if amount == 0:
+                self.rows_skipped += 1
+                continue
+
+            operation = str(row.get(columns.get('operation'), '') or '').strip()
+            description = str(row.get(columns.get('description'), '') or '').strip()
+            currency = str(row.get(columns.get('currency'), '') or '').strip().upper() or 'KZT'
+
+            operation_lower = operation.lower()
+            if any(word in operation_lower for word in TRANSFER_OPERATIONS):
+                transaction_type = 'transfer'
+            elif any(word in operation_lower for word in INCOME_OPERATIONS):
+                transaction_type = 'income'
+            elif any(word in operation_lower for word in EXPENSE_OPERATIONS) or amount < 0:
+                transaction_type = 'expense'
+            else:
+                transaction_type = 'income'
+
+            yield {
+                'user_id': self.user_id,
+                'amount': abs(amount),
+                'currency': currency if len(currency) == 3 else 'KZT',
+                'category': self.categorize(description or operation, transaction_type),
+                'description': description or operation,
+                'bank': self.bank,
+                'type': transaction_type,
+                'confidence': 1.0,
+                'raw_message': f"import: {operation} {description}".strip(),
+                'date': date,
+                'external_id': self._external_id(date, amount, operation, description)
+            }
+
+    def _external_id(self, date, amount: float, operation: str, description: str) -> str:
+        """Стабильный идентификатор строки: повторный импорт той же выписки ничего не дублирует"""
+        key = f"{self.bank}|{date.isoformat()}|{amount:.2f}|{operation}|{description}"
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+        return hashlib.sha1(f"{key}|{occurrence}".encode('utf-8')).hexdigest()
+
+
+def import_statement(db, path: str, user_id: int, bank: Optional[str] = None,
+                     chunk_size: int = 1000) -> Dict:
+    """Импортировать выписку в базу, вернуть статистику"""
+    # Банк из параметра, иначе из имени файла ("kaspi_2025.csv")
+    bank = normalize_bank_name(bank or os.path.basename(path))
+    if bank == 'другое':
+        bank = None
+
+    mapper = StatementMapper(user_id, bank)
+    inserted = db.add_transactions_bulk(mapper.map(read_rows(path)), chunk_size=chunk_size)
+
+    return {
+        'bank': bank,
+        'read': mapper.rows_read,
+        'inserted': inserted,
+        'duplicates': mapper.rows_read - mapper.rows_skipped - inserted,
+        'skipped': mapper.rows_skipped
+    }
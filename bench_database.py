@@ -0,0 +1,112 @@
+"""Бенчмарк слоя соединений FinanceDatabase.
+
+Сравнивает задержку одного вызова при старом подходе (новое соединение
+на каждый вызов), с постоянными соединениями SQLiteConnectionManager и
+с кэшем известных пользователей в add_user при нескольких одновременных
+обработчиках.
+
+    python bench_database.py [потоков] [вызовов_на_поток]
+"""
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from database_extended import FinanceDatabase
+
+
+class ClosingConnection(sqlite3.Connection):
+    """Соединение, которое блок with не только фиксирует, но и закрывает"""
+
+    def __exit__(self, *exc):
+        result = super().__exit__(*exc)
+        self.close()
+        return result
+
+
+class PerCallConnectionDatabase(FinanceDatabase):
+    """Старое поведение: sqlite3.connect() на каждый вызов"""
+
+    def _connect(self, user_id: Optional[int] = None) -> sqlite3.Connection:
+        shard = self.shard_of(user_id) if user_id is not None else 0
+        return sqlite3.connect(self.shard_paths[shard], factory=ClosingConnection)
+
+
+def handler_workload(db, user_id: int, iteration: int):
+    """То, что делает handle_message на одно сообщение"""
+    db.add_user(user_id, f"user{user_id}", "Bench")
+    db.add_transaction({
+        'user_id': user_id,
+        'amount': 800 + iteration,
+        'category': 'еда',
+        'description': 'кофе',
+        'type': 'expense'
+    })
+    db.get_account_balances(user_id)
+
+
+def run(db_factory, threads: int, calls: int):
+    tmp_dir = tempfile.mkdtemp()
+    db = db_factory(os.path.join(tmp_dir, "bench.db"))
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(user_id):
+        local = []
+        failed = 0
+        for i in range(calls):
+            started = time.perf_counter()
+            try:
+                handler_workload(db, user_id, i)
+            except sqlite3.OperationalError:
+                # "database is locked" - так старый подход ведет себя под нагрузкой
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=worker, args=(1000 + n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    latencies.sort()
+    return {
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'throughput': len(latencies) / elapsed,
+        'errors': sum(errors)
+    }
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"🧪 {threads} потоков × {calls} сообщений")
+    # known_users_size=0 - add_user пишет в базу на каждое сообщение, как раньше
+    variants = (
+        ("соединение на вызов", lambda path: PerCallConnectionDatabase(path, known_users_size=0)),
+        ("постоянные соединения", lambda path: FinanceDatabase(path, known_users_size=0)),
+        ("+ кэш пользователей", FinanceDatabase),
+    )
+    for title, db_factory in variants:
+        result = run(db_factory, threads, calls)
+        print(f"   {title:24} p50 {result['p50']:.3f} мс  "
+              f"p95 {result['p95']:.3f} мс  {result['throughput']:.0f} сообщ/с  "
+              f"ошибок: {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Бенчмарк выгрузки транзакций.
+
+Создает синтетическую базу с одним пользователем (по умолчанию миллион
+транзакций) и меряет скорость и пик памяти export_transactions для
+CSV и Parquet (если установлен pyarrow).
+
+    python bench_export.py [строк]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from database_extended import FinanceDatabase
+from transaction_export import EXPORT_FORMATS, ExportError, export_transactions
+
+CATEGORIES = ["еда", "транспорт", "развлечения", "покупки", "жилье", "здоровье"]
+
+
+def fill(db: FinanceDatabase, user_id: int, rows: int):
+    start = date(2020, 1, 1)
+    db.add_transactions_bulk(
+        (
+            {
+                'user_id': user_id,
+                'amount': random.randint(100, 50000),
+                'category': random.choice(CATEGORIES),
+                'description': f'операция {i}',
+                'bank': random.choice(['kaspi', 'halyk']),
+                'date': start + timedelta(days=i % 2000)
+            }
+            for i in range(rows)
+        ),
+        chunk_size=10000
+    )
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "export.db"))
+
+    started = time.perf_counter()
+    fill(db, 1, rows)
+    print(f"📦 База: {rows:,} транзакций за {time.perf_counter() - started:.1f} с")
+
+    for export_format in EXPORT_FORMATS:
+        path = os.path.join(directory, f"out.{export_format}")
+        try:
+            started = time.perf_counter()
+            export_transactions(db, 1, path, export_format)
+            elapsed = time.perf_counter() - started
+        except ExportError as e:
+            print(f"⚠️ {export_format}: {e}")
+            continue
+
+        # Пик памяти - отдельным прогоном, tracemalloc замедляет код
+        tracemalloc.start()
+        export_transactions(db, 1, path, export_format)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"📤 {export_format}: {rows / elapsed:,.0f} строк/с ({elapsed:.2f} с, "
+              f"файл {size:.1f} МБ, пик памяти {peak / 1024 / 1024:.1f} МБ)")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
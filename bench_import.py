@@ -0,0 +1,97 @@
+"""Бенчмарк импорта выписок.
+
+Генерирует синтетическую выписку и сравнивает построчную вставку через
+add_transaction (по транзакции на строку) с потоковым импортом
+import_statement (executemany порциями в одной транзакции).
+
+    python bench_import.py [строк]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from bank_import import StatementMapper, import_statement, read_rows
+from database_extended import FinanceDatabase
+
+DESCRIPTIONS = ["Magnum Cash&Carry", "Яндекс Такси", "Small", "Аптека Europharma",
+                "Kaspi Магазин", "Кофейня Starbucks", "Кинотеатр Chaplin"]
+
+
+def write_statement(path: str, rows: int):
+    start = date(2024, 1, 1)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("Дата;Сумма;Операция;Детали\n")
+        for i in range(rows):
+            day = start + timedelta(days=i % 365)
+            amount = random.randint(100, 50000)
+            f.write(f"{day:%d.%m.%y};- {amount:,}".replace(',', ' ') +
+                    f",00 ₸;Покупка;{random.choice(DESCRIPTIONS)}\n")
+
+
+def bench_row_by_row(path: str, db_path: str) -> float:
+    db = FinanceDatabase(db_path)
+    mapper = StatementMapper(1, 'kaspi')
+    started = time.perf_counter()
+    for transaction in mapper.map(read_rows(path)):
+        db.add_transaction(transaction)
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed
+
+
+def bench_bulk(path: str, db_path: str) -> float:
+    db = FinanceDatabase(db_path)
+    started = time.perf_counter()
+    import_statement(db, path, 1, bank='kaspi')
+    elapsed = time.perf_counter() - started
+    db.close()
+    return elapsed
+
+
+def peak_memory(path: str, db_path: str) -> int:
+    """Пик памяти Python при импорте (отдельный прогон: tracemalloc замедляет код)"""
+    db = FinanceDatabase(db_path)
+    tracemalloc.start()
+    import_statement(db, path, 1, bank='kaspi')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "kaspi.csv")
+    write_statement(path, rows)
+    print(f"📄 Выписка: {rows:,} строк")
+
+    # Построчная вставка медленная, меряем на части файла
+    sample = min(rows, 5_000)
+    sample_path = os.path.join(directory, "kaspi_sample.csv")
+    with open(path, encoding='utf-8') as src, open(sample_path, 'w', encoding='utf-8') as dst:
+        for i, line in enumerate(src):
+            if i > sample:
+                break
+            dst.write(line)
+
+    per_row = bench_row_by_row(sample_path, os.path.join(directory, "row.db"))
+    print(f"🐢 add_transaction: {sample / per_row:,.0f} строк/с ({sample:,} строк за {per_row:.2f} с)")
+
+    elapsed = bench_bulk(path, os.path.join(directory, "bulk.db"))
+    peak = peak_memory(path, os.path.join(directory, "memory.db"))
+    print(f"🚀 import_statement: {rows / elapsed:,.0f} строк/с ({rows:,} строк за {elapsed:.2f} с, "
+          f"пик памяти {peak / 1024 / 1024:.1f} МБ)")
+
+    # Повторный импорт - только дедупликация
+    started = time.perf_counter()
+    again = import_statement(FinanceDatabase(os.path.join(directory, "bulk.db")), path, 1, bank='kaspi')
+    print(f"♻️ Повторный импорт: {again['duplicates']:,} дубликатов за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
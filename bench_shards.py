@@ -0,0 +1,62 @@
+"""Бенчмарк шардирования базы по user_id.
+
+Потоки-обработчики пишут транзакции разных пользователей через
+add_transaction (коммит на строку) в базу из 1, 2, 4 и 8 файлов.
+У каждого шарда свой писатель, поэтому коммиты разных шардов не ждут
+друг друга.
+
+    python bench_shards.py [строк] [потоков] [synchronous]
+
+synchronous=FULL - каждый коммит ждет fsync (по умолчанию NORMAL, как в боте).
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from database_extended import FinanceDatabase
+
+
+def make_db(shards: int, synchronous: str) -> FinanceDatabase:
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "bench.db"), shards=shards)
+    for shard in db.shards:
+        shard.pragmas['synchronous'] = synchronous
+    db.close()
+    return db
+
+
+def run(db: FinanceDatabase, rows: int, threads: int) -> tuple:
+    per_thread = rows // threads
+    errors = []
+
+    def worker(user_id: int):
+        for i in range(per_thread):
+            if not db.add_transaction({'user_id': user_id, 'amount': 100 + i,
+                                       'category': 'еда', 'description': 'кофе'}):
+                errors.append(user_id)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started, len(errors)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    synchronous = sys.argv[3] if len(sys.argv) > 3 else 'NORMAL'
+    print(f"🧪 {rows:,} транзакций из {threads} потоков, synchronous={synchronous}")
+
+    for shards in (1, 2, 4, 8):
+        db = make_db(shards, synchronous)
+        elapsed, errors = run(db, rows, threads)
+        print(f"   {f'шардов: {shards}':12} {rows / elapsed:>10,.0f} строк/с  ошибок: {errors}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
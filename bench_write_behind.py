@@ -0,0 +1,72 @@
+"""Бенчмарк отложенной записи транзакций.
+
+Несколько потоков-обработчиков пишут транзакции напрямую через
+add_transaction (коммит на строку) и через WriteBehindQueue с разным
+размером пакета. Время считается до момента, когда все строки в базе.
+
+    python bench_write_behind.py [строк] [потоков] [synchronous]
+
+synchronous=FULL показывает, как это выглядит, когда каждый коммит
+ждет fsync (по умолчанию NORMAL, как в боте).
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from database_extended import FinanceDatabase
+from write_behind import WriteBehindQueue
+
+
+def make_db(synchronous: str) -> FinanceDatabase:
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    db.connections.pragmas['synchronous'] = synchronous
+    db.close()
+    return db
+
+
+def run(store, rows: int, threads: int) -> float:
+    per_thread = rows // threads
+
+    def worker(user_id: int):
+        for i in range(per_thread):
+            store({'user_id': user_id, 'amount': 100 + i, 'category': 'еда', 'description': 'кофе'})
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return started
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    synchronous = sys.argv[3] if len(sys.argv) > 3 else 'NORMAL'
+    print(f"🧪 {rows:,} транзакций из {threads} потоков, synchronous={synchronous}")
+
+    db = make_db(synchronous)
+    started = run(db.add_transaction, rows, threads)
+    elapsed = time.perf_counter() - started
+    print(f"   {'add_transaction':22} {rows / elapsed:>10,.0f} строк/с")
+    db.close()
+
+    for batch_size in (1, 10, 100, 1000):
+        db = make_db(synchronous)
+        queue = WriteBehindQueue(db, batch_size=batch_size, flush_interval=0.05)
+        queue.start()
+        started = run(queue.add_transaction, rows, threads)
+        queue.flush()
+        elapsed = time.perf_counter() - started
+        stats = queue.stats()
+        queue.stop()
+        print(f"   {f'очередь, пакет {batch_size}':22} {rows / elapsed:>10,.0f} строк/с  "
+              f"(коммитов: {stats['flushes']}, средний пакет {stats['avg_batch_size']:.0f})")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
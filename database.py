@@ -3,6 +3,15 @@ import os
 from datetime import datetime
 from typing import List, Dict, Optional
 
+def month_range(month: int, year: int) -> tuple:
+    """Полуинтервал [начало месяца, начало следующего) для условий по дате"""
+    start = f"{year:04d}-{month:02d}-01"
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
 class FinanceDatabase:
     def __init__(self, db_path: str = "finance.db"):
         """Инициализация базы данных"""
@@ -42,6 +51,16 @@ class FinanceDatabase:
                 )
             ''')
             
+            # Индекс для выборок по месяцу и статистики по категориям
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date
+                ON transactions (user_id, type, date)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+                ON transactions (user_id, date)
+            ''')
+            
             # Таблица категорий
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS categories (
@@ -118,9 +137,9 @@ class FinanceDatabase:
             if month and year:
                 cursor.execute('''
                     SELECT * FROM transactions 
-                    WHERE user_id = ? AND strftime('%m', date) = ? AND strftime('%Y', date) = ?
+                    WHERE user_id = ? AND date >= ? AND date < ?
                     ORDER BY date DESC
-                ''', (user_id, f"{month:02d}", str(year)))
+                ''', (user_id, *month_range(month, year)))
             else:
                 cursor.execute('''
                     SELECT * FROM transactions 
@@ -139,10 +158,10 @@ class FinanceDatabase:
                 SELECT category, SUM(amount) as total, COUNT(*) as count
                 FROM transactions 
                 WHERE user_id = ? AND type = ? 
-                AND strftime('%m', date) = ? AND strftime('%Y', date) = ?
+                AND date >= ? AND date < ?
                 GROUP BY category
                 ORDER BY total DESC
-            ''', (user_id, transaction_type, f"{month:02d}", str(year)))
+            ''', (user_id, transaction_type, *month_range(month, year)))
             
             columns = [description[0] for description in cursor.description]
             return [dict(zip(columns, row)) for row in cursor.fetchall()]
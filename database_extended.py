@@ -1,15 +1,220 @@
+import os
 import sqlite3
-from typing import Dict, List, Optional
+import threading
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
 from datetime import datetime, timedelta
+from db_connection import SQLiteConnectionManager
+from storage import Storage, day_range, to_date, transfer_accounts, transfer_bank
+from cache import LRUCache
 
-class FinanceDatabase:
-    def __init__(self, db_path: str = "finance_bot.db"):
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Файлы шардов: finance_bot.db -> finance_bot.shard0.db, finance_bot.shard1.db, ...
+
+    Без шардирования (shards=1) - сам db_path, как раньше.
+    """
+    if shards == 1:
+        return [db_path]
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.shard{number}{ext}" for number in range(shards)]
+
+class _ShardWrite:
+    """Незакоммиченная пакетная запись в один шард (add_transactions_bulk)"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.changes_before = conn.total_changes
+        # Приращения дневных итогов: (user_id, день, тип, категория) -> [сумма, количество]
+        self.deltas = {}
+        # Порции с пропущенными дубликатами: user_id -> [первый день, последний день],
+        # итоги за эти дни пересчитываются из transactions
+        self.rebuild = {}
+        self.users = set()
+        # Версии данных после записи: user_id -> версия (в кэш - после коммита)
+        self.versions = {}
+
+class FinanceDatabase(Storage):
+    """Хранилище в SQLite: один файл или несколько шардов по user_id"""
+
+    # Миграции схемы. Номер миграции = индекс + 1, текущая версия
+    # хранится в PRAGMA user_version. Новые миграции только дописываются в конец.
+    MIGRATIONS = [
+        # 1: индексы для истории и статистики
+        [
+            """CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+               ON transactions (user_id, transaction_date, transaction_type, category, amount)""",
+            """CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+               ON transactions (user_id, created_at)""",
+        ],
+        # 2: дневные итоги по пользователю, категории и типу + заполнение из transactions
+        [
+            """CREATE TABLE IF NOT EXISTS daily_rollups (
+                   user_id INTEGER NOT NULL,
+                   day DATE NOT NULL,
+                   transaction_type TEXT NOT NULL,
+                   category TEXT NOT NULL,
+                   total REAL NOT NULL DEFAULT 0,
+                   count INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (user_id, day, transaction_type, category)
+               ) WITHOUT ROWID""",
+            """INSERT OR REPLACE INTO daily_rollups
+                   (user_id, day, transaction_type, category, total, count)
+               SELECT user_id, substr(transaction_date, 1, 10), transaction_type, category,
+                      SUM(amount), COUNT(*)
+               FROM transactions
+               GROUP BY user_id, substr(transaction_date, 1, 10), transaction_type, category""",
+        ],
+        # 3: внешний идентификатор операции для дедупликации импорта выписок
+        [
+            "ALTER TABLE transactions ADD COLUMN external_id TEXT",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_external
+               ON transactions (user_id, external_id) WHERE external_id IS NOT NULL""",
+        ],
+        # 4: постраничная история с фильтрами (поиск по курсору created_at, id)
+        [
+            """CREATE INDEX IF NOT EXISTS idx_transactions_user_category_created
+               ON transactions (user_id, category, created_at)""",
+            """CREATE INDEX IF NOT EXISTS idx_transactions_user_type_created
+               ON transactions (user_id, transaction_type, created_at)""",
+            """CREATE INDEX IF NOT EXISTS idx_transactions_user_bank_created
+               ON transactions (user_id, bank, created_at)""",
+        ],
+        # 5: версия данных пользователя для инвалидации кэшей
+        [
+            "ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0",
+        ],
+    ]
+
+    def __init__(self, db_path: str = "finance_bot.db", balance_cache_size: int = 10000,
+                 known_users_size: int = 100000, shards: int = 1):
+        if shards < 1:
+            raise ValueError(f"Число шардов должно быть положительным: {shards}")
         self.db_path = db_path
+        # Данные пользователя целиком лежат в одном файле-шарде (user_id % shards),
+        # у каждого шарда свой писатель, свой WAL и свои соединения
+        self.shard_count = shards
+        self.shard_paths = shard_paths(db_path, shards)
+        self.shards = [SQLiteConnectionManager(path) for path in self.shard_paths]
+        self.connections = self.shards[0]
+        # Пользователи, уже записанные в users: user_id -> (username, first_name)
+        self.known_users = LRUCache(maxsize=known_users_size)
+        # Балансы счетов: user_id -> (версия данных, список балансов).
+        # Обновляется при записи балансов (write-through)
+        self.balance_cache = LRUCache(maxsize=balance_cache_size)
+        self._balance_lock = threading.Lock()
+        # Версии данных: user_id -> версия. Пишет только этот процесс (пользователи
+        # закреплены за процессами), поэтому база читается лишь при промахе
+        self.data_versions = LRUCache(maxsize=known_users_size)
+        self._version_lock = threading.Lock()
         self.init_database()
     
+    def shard_of(self, user_id: int) -> int:
+        """Номер шарда пользователя. Не меняется, пока не меняется число шардов"""
+        return user_id % self.shard_count
+    
+    def _connect(self, user_id: Optional[int] = None) -> sqlite3.Connection:
+        """Постоянное соединение текущего потока с шардом пользователя.
+
+        Используется как `with self._connect(user_id) as conn:` - блок with
+        фиксирует транзакцию (или откатывает при исключении), но не
+        закрывает соединение. Без user_id - первый шард (единственный,
+        если шардирования нет).
+        """
+        shard = self.shard_of(user_id) if user_id is not None else 0
+        return self.shards[shard].connection()
+
+    def close(self):
+        """Закрыть все соединения с базой"""
+        for shard in self.shards:
+            shard.close_all()
+
+    # Таблицы с данными пользователей (у каждой строки есть user_id)
+    USER_TABLES = ('users', 'transactions', 'account_balances', 'daily_rollups')
+
+    def split_from(self, source_path: str) -> List[int]:
+        """Разложить по шардам данные обычной базы (без шардирования).
+
+        Строки копируются с теми же id, поэтому ссылки на транзакции в
+        кнопках уже отправленных сообщений остаются рабочими. Повторный
+        запуск перезаписывает те же строки. Возвращает число транзакций в
+        каждом шарде.
+        """
+        if os.path.abspath(source_path) in map(os.path.abspath, self.shard_paths):
+            raise ValueError(f"Исходная база совпадает с шардом: {source_path}")
+        
+        # Схему исходной базы доводим до текущей версии
+        FinanceDatabase(source_path).close()
+        
+        counts = []
+        for number, shard in enumerate(self.shards):
+            conn = shard.connection()
+            conn.create_function('shard_of', 1, self.shard_of, deterministic=True)
+            conn.execute("ATTACH DATABASE ? AS source", (source_path,))
+            try:
+                with conn:
+                    for table in self.USER_TABLES:
+                        columns = ', '.join(
+                            row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")
+                        )
+                        conn.execute(f"""
+                            INSERT OR REPLACE INTO main.{table} ({columns})
+                            SELECT {columns} FROM source.{table}
+                            WHERE user_id IS NOT NULL AND shard_of(user_id) = ?
+                        """, (number,))
+                    conn.commit()
+            finally:
+                conn.execute("DETACH DATABASE source")
+            counts.append(conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0])
+        
+        return counts
+
+    def get_data_version(self, user_id: int) -> int:
+        """Версия данных пользователя (0 - изменений не было).
+
+        Растет при каждой записи транзакций и балансов, поэтому кэши экранов
+        и балансов могут использовать ее как часть ключа. Берется из памяти:
+        записи обновляют ее после коммита, база читается только при промахе.
+        """
+        version = self.data_versions.get(user_id)
+        if version is not None:
+            return version
+        
+        with self._connect(user_id) as conn:
+            version = self._read_version(conn.cursor(), user_id)
+        return self._store_version(user_id, version)
+
+    def _bump_version(self, cursor: sqlite3.Cursor, user_id: int) -> int:
+        """Увеличить версию данных в той же транзакции, что и сама запись; новая версия.
+
+        В кэш версий новое значение кладется только после коммита
+        (_store_version): иначе параллельный читатель закэшировал бы старые
+        данные под новой версией.
+        """
+        return cursor.execute("""
+            INSERT INTO users (user_id, data_version) VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET data_version = data_version + 1
+            RETURNING data_version
+        """, (user_id,)).fetchone()[0]
+
+    def _store_version(self, user_id: int, version: int) -> int:
+        """Запомнить версию, если она не старше уже известной; вернуть актуальную"""
+        with self._version_lock:
+            cached = self.data_versions.get(user_id)
+            if cached is None or cached < version:
+                self.data_versions.set(user_id, version)
+                return version
+            return cached
+    
     def init_database(self):
-        """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Инициализация базы данных (всех шардов)"""
+        for shard in self.shards:
+            self._init_shard(shard.connection())
+        print("✅ База данных инициализирована")
+
+    def _init_shard(self, conn: sqlite3.Connection):
+        """Таблицы и миграции одного файла базы"""
+        with conn:
             cursor = conn.cursor()
             
             # Таблица пользователей
@@ -58,59 +263,146 @@ class FinanceDatabase:
                 )
             """)
             
+            self._apply_migrations(cursor)
+            
             conn.commit()
-            print("✅ База данных инициализирована")
 
-    def get_user_transactions_history(self, user_id: int, limit: int = 10) -> List[Dict]:
-        """Получить историю транзакций пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+    def _apply_migrations(self, cursor: sqlite3.Cursor):
+        """Применить миграции, которых еще нет в базе"""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(self.MIGRATIONS, 1):
+            if number <= version:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {number}")
+
+    def get_transactions_page(self, user_id: int, cursor: Optional[tuple] = None,
+                              direction: str = 'older', limit: int = 10,
+                              filters: Optional[Dict] = None) -> Dict:
+        """Страница истории от курсора (created_at, id), новые сверху.
+
+        direction='older' - транзакции старше курсора, 'newer' - новее.
+        Страница выбирается поиском по индексу от курсора, а не OFFSET,
+        поэтому стоит одинаково на любой глубине истории.
+        Возвращает {'transactions', 'has_older', 'has_newer'}.
+        """
+        if direction not in ('older', 'newer'):
+            raise ValueError(f"Неизвестное направление: {direction}")
+        
+        conditions, params = ["user_id = ?"], [user_id]
+        for name, value in (filters or {}).items():
+            if name not in self.HISTORY_FILTERS:
+                raise ValueError(f"Неизвестный фильтр: {name}")
+            conditions.append(f"{self.HISTORY_FILTERS[name]} = ?")
+            params.append(value)
+        
+        order = "DESC"
+        if cursor is not None:
+            if direction == 'older':
+                conditions.append("(created_at, id) < (?, ?)")
+            else:
+                conditions.append("(created_at, id) > (?, ?)")
+                order = "ASC"
+            params.extend(cursor)
+        
+        with self._connect(user_id) as conn:
+            cursor_db = conn.cursor()
+            # Лишняя строка показывает, есть ли что-то дальше
+            cursor_db.execute(f"""
                 SELECT id, amount, currency, category, description, bank, 
                        transaction_type, transaction_date, created_at
                 FROM transactions 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC 
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at {order}, id {order}
                 LIMIT ?
-            """, (user_id, limit))
-            
-            transactions = []
-            for row in cursor.fetchall():
-                transactions.append({
-                    'id': row[0],
-                    'amount': row[1],
-                    'currency': row[2],
-                    'category': row[3],
-                    'description': row[4],
-                    'bank': row[5],
-                    'type': row[6],
-                    'date': row[7],
-                    'created_at': row[8]
-                })
+            """, (*params, limit + 1))
+            rows = cursor_db.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+        
+        transactions = []
+        for row in rows:
+            transactions.append({
+                'id': row[0],
+                'amount': row[1],
+                'currency': row[2],
+                'category': row[3],
+                'description': row[4],
+                'bank': row[5],
+                'type': row[6],
+                'date': row[7],
+                'created_at': row[8]
+            })
+        
+        return {
+            'transactions': transactions,
+            'has_older': has_more if direction == 'older' else cursor is not None,
+            'has_newer': has_more if direction == 'newer' else cursor is not None
+        }
+
+    def iter_user_transactions(self, user_id: int, chunk_size: int = 1000) -> Iterator[List[tuple]]:
+        """Все транзакции пользователя порциями по chunk_size строк (в порядке добавления).
+
+        Один SELECT читается через fetchmany, поэтому в памяти держится только
+        текущая порция, а все порции видят один снимок базы (WAL).
+        """
+        cursor = self._connect(user_id).cursor()
+        try:
+            cursor.execute(f"""
+                SELECT {', '.join(self.EXPORT_COLUMNS)}
+                FROM transactions
+                WHERE user_id = ?
+                ORDER BY created_at, id
+            """, (user_id,))
             
-            return transactions
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
 
     def add_user(self, user_id: int, username: str = None, first_name: str = None):
-        """Добавляет нового пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Добавляет нового пользователя или обновляет его имя"""
+        # Вызывается на каждое сообщение: пишем в базу только нового
+        # пользователя или изменившееся имя
+        if self.known_users.get(user_id) == (username, first_name):
+            return
+        
+        with self._connect(user_id) as conn:
             cursor = conn.cursor()
+            # Строку пользователя могла создать запись транзакции (версия данных) -
+            # тогда дописываем имя, не трогая остальное
             cursor.execute("""
-                INSERT OR IGNORE INTO users (user_id, username, first_name)
+                INSERT INTO users (user_id, username, first_name)
                 VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    username = COALESCE(excluded.username, username),
+                    first_name = COALESCE(excluded.first_name, first_name)
             """, (user_id, username, first_name))
             conn.commit()
+        
+        self.known_users.set(user_id, (username, first_name))
 
     def add_transaction(self, transaction_data: Dict) -> bool:
         """Добавляет новую транзакцию"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            transaction_date = transaction_data.get('date', datetime.now().date())
+            
+            with self._connect(transaction_data['user_id']) as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
                     INSERT INTO transactions 
                     (user_id, amount, currency, category, description, bank, 
-                     transaction_type, confidence, raw_message, transaction_date)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     transaction_type, confidence, raw_message, transaction_date, external_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT DO NOTHING
                 """, (
                     transaction_data['user_id'],
                     transaction_data['amount'],
@@ -121,19 +413,198 @@ class FinanceDatabase:
                     transaction_data.get('type', 'expense'),
                     transaction_data.get('confidence', 1.0),
                     transaction_data.get('raw_message', ''),
-                    transaction_data.get('date', datetime.now().date())
+                    transaction_date,
+                    transaction_data.get('external_id')
                 ))
                 
+                if cursor.rowcount == 0:
+                    # Транзакция с этим external_id уже записана (повтор после сбоя)
+                    conn.rollback()
+                    return True
+                
+                self._apply_rollup(
+                    cursor, transaction_data['user_id'], transaction_date,
+                    transaction_data.get('type', 'expense'), transaction_data['category'],
+                    transaction_data['amount'], 1
+                )
+                
+                version = self._bump_version(cursor, transaction_data['user_id'])
                 conn.commit()
-                return True
+            
+            self._store_version(transaction_data['user_id'], version)
+            return True
                 
         except Exception as e:
             print(f"❌ Ошибка добавления транзакции: {e}")
             return False
 
+    def _apply_rollup(self, cursor: sqlite3.Cursor, user_id: int, date,
+                      transaction_type: str, category: str, amount: float, count: int):
+        """Изменить дневной итог в той же транзакции, что и запись в transactions"""
+        day = to_date(date).isoformat()
+        cursor.execute("""
+            INSERT INTO daily_rollups (user_id, day, transaction_type, category, total, count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, day, transaction_type, category) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+        """, (user_id, day, transaction_type, category, amount, count))
+        
+        if count < 0:
+            cursor.execute("""
+                DELETE FROM daily_rollups
+                WHERE user_id = ? AND day = ? AND transaction_type = ? AND category = ?
+                  AND count <= 0
+            """, (user_id, day, transaction_type, category))
+
+    def rebuild_rollups(self, user_id: Optional[int] = None) -> int:
+        """Пересчитать дневные итоги из transactions (для всех или одного пользователя)"""
+        if user_id is not None:
+            connections = [self._connect(user_id)]
+        else:
+            connections = [shard.connection() for shard in self.shards]
+        
+        rows = 0
+        for conn in connections:
+            with conn:
+                cursor = conn.cursor()
+                rows += self._rebuild_rollups(cursor, user_id)
+                conn.commit()
+        
+        return rows
+
+    def _rebuild_rollups(self, cursor: sqlite3.Cursor, user_id: Optional[int] = None,
+                         start=None, end=None) -> int:
+        """Пересчитать итоги пользователя (или всех) за период [start, end) или целиком"""
+        rollup_conditions, source_conditions, params = [], [], []
+        if user_id is not None:
+            rollup_conditions.append("user_id = ?")
+            source_conditions.append("user_id = ?")
+            params.append(user_id)
+        if start is not None and end is not None:
+            rollup_conditions.append("day >= ? AND day < ?")
+            source_conditions.append("transaction_date >= ? AND transaction_date < ?")
+            params.extend([to_date(start).isoformat(), to_date(end).isoformat()])
+        
+        rollup_where = f"WHERE {' AND '.join(rollup_conditions)}" if rollup_conditions else ""
+        source_where = f"WHERE {' AND '.join(source_conditions)}" if source_conditions else ""
+        
+        cursor.execute(f"DELETE FROM daily_rollups {rollup_where}", params)
+        cursor.execute(f"""
+            INSERT INTO daily_rollups (user_id, day, transaction_type, category, total, count)
+            SELECT user_id, substr(transaction_date, 1, 10), transaction_type, category,
+                   SUM(amount), COUNT(*)
+            FROM transactions
+            {source_where}
+            GROUP BY user_id, substr(transaction_date, 1, 10), transaction_type, category
+        """, params)
+        
+        return cursor.rowcount
+
+    def add_transactions_bulk(self, transactions: Iterable[Dict], chunk_size: int = 1000) -> int:
+        """Добавить много транзакций одной транзакцией SQLite на каждый шард.
+
+        Принимает любой итерируемый источник (в том числе генератор) и
+        пишет его порциями через executemany, не держа все строки в памяти.
+        Строки с уже известным external_id пропускаются, а строки, нарушающие
+        NOT NULL или CHECK, - ошибка. Возвращает число добавленных строк;
+        при ошибке откатывает все и пробрасывает исключение.
+        Если строки попали в несколько шардов, коммиты шардов независимы -
+        повторная запись тех же строк с external_id ничего не дублирует.
+        """
+        iterator = iter(transactions)
+        # Открытые пакетные записи: номер шарда -> _ShardWrite
+        writes = {}
+        
+        try:
+            while True:
+                chunk = []
+                for data in islice(iterator, chunk_size):
+                    transaction_date = to_date(data.get('date', datetime.now().date()))
+                    chunk.append((
+                        data['user_id'],
+                        data['amount'],
+                        data.get('currency', 'KZT'),
+                        data['category'],
+                        data.get('description', ''),
+                        data.get('bank'),
+                        data.get('type', 'expense'),
+                        data.get('confidence', 1.0),
+                        data.get('raw_message', ''),
+                        transaction_date,
+                        data.get('external_id')
+                    ))
+                
+                if not chunk:
+                    break
+                
+                by_shard = {}
+                for row in chunk:
+                    by_shard.setdefault(self.shard_of(row[0]), []).append(row)
+                for shard, rows in by_shard.items():
+                    if shard not in writes:
+                        writes[shard] = _ShardWrite(self.shards[shard].connection())
+                    self._insert_bulk(writes[shard], rows)
+            
+            inserted = 0
+            for write in writes.values():
+                inserted += write.conn.total_changes - write.changes_before
+                self._finish_bulk(write)
+            for write in writes.values():
+                write.conn.commit()
+                for user_id, version in write.versions.items():
+                    self._store_version(user_id, version)
+            return inserted
+        except Exception:
+            for write in writes.values():
+                write.conn.rollback()
+            raise
+
+    def _insert_bulk(self, write: '_ShardWrite', chunk: List[tuple]):
+        """Вставить порцию строк одного шарда и запомнить, как менять итоги"""
+        chunk_before = write.conn.total_changes
+        write.cursor.executemany("""
+            INSERT INTO transactions 
+            (user_id, amount, currency, category, description, bank, 
+             transaction_type, confidence, raw_message, transaction_date, external_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, chunk)
+        all_inserted = write.conn.total_changes - chunk_before == len(chunk)
+        
+        for row in chunk:
+            user_id, amount, category, transaction_type, transaction_date = \
+                row[0], row[1], row[3], row[6], row[9]
+            write.users.add(user_id)
+            if all_inserted:
+                delta = write.deltas.setdefault(
+                    (user_id, transaction_date, transaction_type, category), [0, 0]
+                )
+                delta[0] += amount
+                delta[1] += 1
+            else:
+                period = write.rebuild.setdefault(user_id, [transaction_date, transaction_date])
+                period[0] = min(period[0], transaction_date)
+                period[1] = max(period[1], transaction_date)
+
+    def _finish_bulk(self, write: '_ShardWrite'):
+        """Обновить дневные итоги и версии данных перед коммитом шарда"""
+        cursor = write.cursor
+        # Где были дубликаты - пересчет за затронутые дни, иначе приращения
+        for user_id, (first_day, last_day) in write.rebuild.items():
+            self._rebuild_rollups(cursor, user_id, first_day, last_day + timedelta(days=1))
+        for (user_id, day, transaction_type, category), (amount, count) in write.deltas.items():
+            period = write.rebuild.get(user_id)
+            if period and period[0] <= day <= period[1]:
+                continue
+            self._apply_rollup(cursor, user_id, day, transaction_type, category, amount, count)
+        
+        for user_id in write.users:
+            write.versions[user_id] = self._bump_version(cursor, user_id)
+
     def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Dict]:
         """Получить транзакцию по ID"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect(user_id) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, amount, currency, category, description, bank, 
@@ -158,17 +629,48 @@ class FinanceDatabase:
             return None
 
     def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
-        """Удалить транзакцию"""
+        """Удалить транзакцию.
+
+        Удаление перевода возвращает деньги на счет списания и снимает их со
+        счета зачисления - в той же транзакции BEGIN IMMEDIATE, что и удаление.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(user_id) as conn:
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("""
+                    SELECT amount, category, transaction_type, transaction_date, bank
+                    FROM transactions
+                    WHERE id = ? AND user_id = ?
+                """, (transaction_id, user_id))
+                row = cursor.fetchone()
+                if not row:
+                    conn.rollback()
+                    return False
+                
                 cursor.execute("""
                     DELETE FROM transactions 
                     WHERE id = ? AND user_id = ?
                 """, (transaction_id, user_id))
-                conn.commit()
                 
-                return cursor.rowcount > 0
+                amount, category, transaction_type, transaction_date, bank = row
+                self._apply_rollup(cursor, user_id, transaction_date,
+                                   transaction_type, category, -amount, -1)
+                
+                accounts = transfer_accounts(bank) if transaction_type == 'transfer' else None
+                if accounts:
+                    from_account, to_account = accounts
+                    self._change_balance(cursor, user_id, from_account, amount)
+                    self._change_balance(cursor, user_id, to_account, -amount)
+                
+                version = self._bump_version(cursor, user_id)
+                balances = self._select_balances(cursor, user_id)
+                conn.commit()
+            
+            self._store_version(user_id, version)
+            if accounts:
+                self._store_balances(user_id, version, balances)
+            return True
         except Exception as e:
             print(f"❌ Ошибка удаления транзакции: {e}")
             return False
@@ -177,7 +679,7 @@ class FinanceDatabase:
         """Получить статистику пользователя за период"""
         start_date = (datetime.now() - timedelta(days=period_days)).date()
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect(user_id) as conn:
             cursor = conn.cursor()
             
             # Статистика по категориям
@@ -218,15 +720,15 @@ class FinanceDatabase:
 
     def get_transactions_by_date(self, user_id: int, date) -> List[Dict]:
         """Получить транзакции за конкретную дату"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect(user_id) as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, amount, currency, category, description, bank, 
                        transaction_type, transaction_date, created_at
                 FROM transactions 
-                WHERE user_id = ? AND DATE(transaction_date) = DATE(?)
+                WHERE user_id = ? AND transaction_date >= ? AND transaction_date < ?
                 ORDER BY created_at DESC
-            """, (user_id, date))
+            """, (user_id, *day_range(date)))
             
             transactions = []
             for row in cursor.fetchall():
@@ -244,12 +746,31 @@ class FinanceDatabase:
             
             return transactions
 
+    def _select_aggregates(self, user_id: int, start, end, group_by: tuple) -> List[tuple]:
+        select = ", ".join(("transaction_type",) + group_by)
+        with self._connect(user_id) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {select}, SUM(total), SUM(count)
+                FROM daily_rollups
+                WHERE user_id = ? AND day >= ? AND day < ?
+                GROUP BY {select}
+            """, (user_id, start.isoformat(), end.isoformat()))
+            return cursor.fetchall()
+
     def add_transfer(self, user_id: int, amount: float, from_account: str, 
                      to_account: str, description: str = "", raw_message: str = "") -> bool:
-        """Добавить перевод между счетами"""
+        """Добавить перевод между счетами и изменить балансы обоих счетов.
+
+        Запись перевода и оба изменения баланса идут одной транзакцией
+        BEGIN IMMEDIATE: либо применяется все, либо ничего.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            transaction_date = datetime.now().date()
+            
+            with self._connect(user_id) as conn:
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
                 
                 # Добавляем запись о переводе
                 cursor.execute("""
@@ -263,94 +784,144 @@ class FinanceDatabase:
                     'KZT',
                     'перевод',
                     description or f"Перевод с {from_account} на {to_account}",
-                    f"{from_account} → {to_account}",
+                    transfer_bank(from_account, to_account),
                     'transfer',
                     1.0,
                     raw_message,
-                    datetime.now().date()
+                    transaction_date
                 ))
                 
+                self._apply_rollup(cursor, user_id, transaction_date,
+                                   'transfer', 'перевод', amount, 1)
+                
+                # Деньги уходят с одного счета и приходят на другой
+                self._change_balance(cursor, user_id, from_account, -amount)
+                self._change_balance(cursor, user_id, to_account, amount)
+                
+                version = self._bump_version(cursor, user_id)
+                balances = self._select_balances(cursor, user_id)
                 conn.commit()
-                return True
+            
+            self._store_version(user_id, version)
+            self._store_balances(user_id, version, balances)
+            return True
                 
         except Exception as e:
             print(f"❌ Ошибка добавления перевода: {e}")
             return False
 
+    def _change_balance(self, cursor: sqlite3.Cursor, user_id: int, account_name: str,
+                        amount_change: float):
+        """Изменить баланс одним выражением (счет создается, если его нет)"""
+        cursor.execute("""
+            INSERT INTO account_balances (user_id, account_name, balance, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id, account_name) DO UPDATE SET
+                balance = balance + excluded.balance,
+                updated_at = CURRENT_TIMESTAMP
+        """, (user_id, account_name, amount_change))
+
     def update_account_balance(self, user_id: int, account_name: str, amount_change: float) -> bool:
         """Обновить баланс счета"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(user_id) as conn:
                 cursor = conn.cursor()
                 
-                # Получаем текущий баланс
-                cursor.execute("""
-                    SELECT balance FROM account_balances 
-                    WHERE user_id = ? AND account_name = ?
-                """, (user_id, account_name))
-                
-                result = cursor.fetchone()
-                if result:
-                    # Обновляем существующий баланс
-                    new_balance = result[0] + amount_change
-                    cursor.execute("""
-                        UPDATE account_balances 
-                        SET balance = ?, updated_at = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND account_name = ?
-                    """, (new_balance, user_id, account_name))
-                else:
-                    # Создаем новый счет с начальным балансом
-                    cursor.execute("""
-                        INSERT INTO account_balances 
-                        (user_id, account_name, balance, updated_at)
-                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    """, (user_id, account_name, amount_change))
+                # Чтение и запись баланса в одном UPSERT: параллельные
+                # обновления не затирают друг друга
+                self._change_balance(cursor, user_id, account_name, amount_change)
                 
+                version = self._bump_version(cursor, user_id)
+                balances = self._select_balances(cursor, user_id)
                 conn.commit()
-                return True
+            
+            self._store_version(user_id, version)
+            self._store_balances(user_id, version, balances)
+            return True
         except Exception as e:
             print(f"❌ Ошибка обновления баланса: {e}")
             return False
 
     def get_account_balances(self, user_id: int) -> List[Dict]:
         """Получить все балансы счетов пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        cached = self.balance_cache.get(user_id)
+        if cached is not None:
+            return [dict(balance) for balance in cached[1]]
+        
+        with self._connect(user_id) as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT account_name, account_type, balance, currency, updated_at
-                FROM account_balances 
-                WHERE user_id = ?
-                ORDER BY account_name
-            """, (user_id,))
-            
-            balances = []
-            for row in cursor.fetchall():
-                balances.append({
-                    'account_name': row[0],
-                    'account_type': row[1],
-                    'balance': row[2],
-                    'currency': row[3],
-                    'updated_at': row[4]
-                })
-            
-            return balances
+            # Версию читаем до балансов: балансы не старше этой версии
+            version = self._read_version(cursor, user_id)
+            balances = self._select_balances(cursor, user_id)
+        
+        self._store_balances(user_id, version, balances)
+        return [dict(balance) for balance in balances]
+
+    def _read_version(self, cursor: sqlite3.Cursor, user_id: int) -> int:
+        row = cursor.execute(
+            "SELECT data_version FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _select_balances(self, cursor: sqlite3.Cursor, user_id: int) -> List[Dict]:
+        cursor.execute("""
+            SELECT account_name, account_type, balance, currency, updated_at
+            FROM account_balances 
+            WHERE user_id = ?
+            ORDER BY account_name
+        """, (user_id,))
+        
+        balances = []
+        for row in cursor.fetchall():
+            balances.append({
+                'account_name': row[0],
+                'account_type': row[1],
+                'balance': row[2],
+                'currency': row[3],
+                'updated_at': row[4]
+            })
+        
+        return balances
+
+    def _store_balances(self, user_id: int, version: int, balances: List[Dict]):
+        """Положить балансы в кэш, если они не старше уже закэшированных"""
+        with self._balance_lock:
+            cached = self.balance_cache.get(user_id)
+            if cached is None or cached[0] <= version:
+                self.balance_cache.set(user_id, (version, balances))
 
     def add_account_balance(self, user_id: int, account_name: str, balance: float, 
                            account_type: str = 'card') -> bool:
         """Добавить или обновить баланс счета"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect(user_id) as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     INSERT OR REPLACE INTO account_balances 
                     (user_id, account_name, account_type, balance, updated_at)
                     VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
                 """, (user_id, account_name, account_type, balance))
+                version = self._bump_version(cursor, user_id)
+                balances = self._select_balances(cursor, user_id)
                 conn.commit()
-                return True
+            
+            self._store_version(user_id, version)
+            self._store_balances(user_id, version, balances)
+            return True
         except Exception as e:
             print(f"❌ Ошибка добавления баланса: {e}")
             return False
 
+def create_database(url: Optional[str] = None) -> Storage:
+    """Хранилище по DATABASE_URL: postgresql://... - PostgreSQL, sqlite:///файл или пусто - SQLite"""
+    url = url if url is not None else os.getenv('DATABASE_URL', '')
+    if url.startswith(('postgres://', 'postgresql://')):
+        from postgres_storage import PostgresStorage
+        return PostgresStorage(url, pool_size=int(os.getenv('DB_POOL_SIZE', '10')))
+    if url and not url.startswith('sqlite:///'):
+        raise ValueError(f"Неподдерживаемый DATABASE_URL: {url}")
+    db_path = url[len('sqlite:///'):] or "finance_bot.db"
+    return FinanceDatabase(db_path, shards=int(os.getenv('DB_SHARDS', '1')))
+
 # Создаем экземпляр базы данных
-db = FinanceDatabase()
\ No newline at end of file
+db = create_database()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from datetime import datetime
+from telegram import Update
+from telegram.ext import CallbackContext
+from database_extended import db
+from transaction_export import EXPORT_FORMATS, ExportError, export_transactions
+
+# Bot API принимает от бота файлы не больше 50 МБ
+MAX_EXPORT_SIZE = 50 * 1024 * 1024
+
+def export_command(update: Update, context: CallbackContext):
+    """Команда /export [csv|parquet] - выгрузка всех транзакций файлом"""
+    
+    user_id = update.effective_user.id
+    export_format = context.args[0].lower() if context.args else 'csv'
+    
+    if export_format not in EXPORT_FORMATS:
+        update.message.reply_text(
+            f"❌ Неизвестный формат. Доступны: {', '.join(EXPORT_FORMATS)}\n"
+            "Например: /export csv"
+        )
+        return
+    
+    update.message.reply_text("⏳ Готовлю выгрузку...")
+    
+    file_name = f"transactions_{datetime.now():%Y%m%d}.{export_format}"
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, file_name)
+        
+        try:
+            stats = export_transactions(db, user_id, path, export_format)
+        except ExportError as e:
+            update.message.reply_text(f"❌ {e}")
+            return
+        except Exception as e:
+            print(f"❌ Ошибка выгрузки транзакций: {e}")
+            update.message.reply_text("❌ Ошибка при выгрузке. Попробуйте еще раз.")
+            return
+        
+        if not stats['rows']:
+            update.message.reply_text("📝 У вас пока нет транзакций для выгрузки.")
+            return
+        
+        if os.path.getsize(path) > MAX_EXPORT_SIZE:
+            update.message.reply_text(
+                "❌ Файл больше 50 МБ, Telegram его не примет. Попробуйте /export parquet"
+            )
+            return
+        
+        with open(path, 'rb') as f:
+            update.message.reply_document(
+                document=f,
+                filename=file_name,
+                caption=f"📤 Выгружено транзакций: {stats['rows']:,}"
+            )
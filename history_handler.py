@@ -1,17 +1,182 @@
+import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 from database_extended import db
+from local_parser import DEFAULT_CATEGORIES, normalize_bank_name
+from renderer import format_history, renderer
+from message_edits import message_editor
 from datetime import datetime
 
+# Транзакций на одной странице истории
+PAGE_SIZE = 10
+
+# Слова для фильтра по типу в /history
+TYPE_FILTERS = {
+    'доход': 'income', 'доходы': 'income', 'income': 'income',
+    'расход': 'expense', 'расходы': 'expense', 'траты': 'expense', 'expense': 'expense',
+    'перевод': 'transfer', 'переводы': 'transfer', 'transfer': 'transfer',
+}
+
+TYPE_NAMES = {'income': 'доходы', 'expense': 'расходы', 'transfer': 'переводы'}
+
+# Фильтр едет в callback_data кнопок вместе с курсором (лимит Telegram - 64 байта),
+# поэтому тип - буквой, банк и известная категория - номером в списке
+TYPE_CODES = {'income': 'i', 'expense': 'e', 'transfer': 't'}
+FILTER_BANKS = ['kaspi', 'halyk', 'sber', 'forte', 'наличные']
+FILTER_CATEGORIES = sorted(set(DEFAULT_CATEGORIES['expense']) | set(DEFAULT_CATEGORIES['income']))
+FILTER_CODE_RE = re.compile(r'^([iet])?(?:b(\d+))?(?:c(\d+)|w(.+))?$')
+CALLBACK_DATA_LIMIT = 64
+
+def encode_filters(filters: dict) -> str:
+    """Фильтр для callback_data: {'type': 'income', 'bank': 'halyk', 'category': 'еда'} -> 'ib1c1'"""
+    code = TYPE_CODES.get(filters.get('type'), '')
+    if filters.get('bank') in FILTER_BANKS:
+        code += f"b{FILTER_BANKS.index(filters['bank'])}"
+    category = filters.get('category')
+    if category in FILTER_CATEGORIES:
+        code += f"c{FILTER_CATEGORIES.index(category)}"
+    elif category:
+        # Своя категория - словом как есть
+        code += f"w{category}"
+    return code
+
+def decode_filters(code: str) -> dict:
+    """Обратно в фильтр для get_transactions_page"""
+    match = FILTER_CODE_RE.match(code)
+    if not match:
+        raise ValueError(f"Некорректный фильтр: {code}")
+    type_code, bank, category, word = match.groups()
+    filters = {}
+    if type_code:
+        filters['type'] = next(name for name, value in TYPE_CODES.items() if value == type_code)
+    # Номера из старой или подделанной кнопки могут выйти за списки
+    if bank:
+        if int(bank) >= len(FILTER_BANKS):
+            raise ValueError(f"Неизвестный банк в фильтре: {code}")
+        filters['bank'] = FILTER_BANKS[int(bank)]
+    if category:
+        if int(category) >= len(FILTER_CATEGORIES):
+            raise ValueError(f"Неизвестная категория в фильтре: {code}")
+        filters['category'] = FILTER_CATEGORIES[int(category)]
+    elif word:
+        filters['category'] = word
+    return filters
+
+def history_callback(prefix: str, filters: dict) -> str:
+    """callback_data кнопки истории: префикс и код фильтра (без фильтра - только префикс)"""
+    code = encode_filters(filters)
+    data = f"{prefix}_{code}" if code else prefix
+    if len(data.encode('utf-8')) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"Фильтр не помещается в callback_data: {filters}")
+    return data
+
+def encode_cursor(transaction: dict) -> str:
+    """Курсор страницы для callback_data: '2025-03-01 12:00:00', id 42 -> '20250301120000_42'"""
+    return f"{re.sub(r'[^0-9]', '', str(transaction['created_at']))}_{transaction['id']}"
+
+def decode_cursor(value: str) -> tuple:
+    """Обратно в (created_at, id) для get_transactions_page"""
+    digits, transaction_id = value.split('_')
+    if len(digits) != 14:
+        raise ValueError(f"Некорректный курсор: {value}")
+    created_at = (f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} "
+                  f"{digits[8:10]}:{digits[10:12]}:{digits[12:14]}")
+    return created_at, int(transaction_id)
+
+def parse_history_filters(args: list) -> dict:
+    """Фильтры из аргументов /history: тип, банк или категория"""
+    filters = {}
+    for arg in args:
+        word = arg.lower()
+        if word in TYPE_FILTERS:
+            filters['type'] = TYPE_FILTERS[word]
+        elif normalize_bank_name(word) != 'другое':
+            filters['bank'] = normalize_bank_name(word)
+        else:
+            filters['category'] = word
+    return filters
+
+def build_history_page(user_id: int, filters: dict, cursor: tuple = None,
+                       direction: str = 'older'):
+    """Текст и клавиатура страницы истории или (None, None), если транзакций нет.
+
+    Пока данные пользователя не менялись, страница берется из кэша рендерера.
+    """
+    args = (tuple(sorted(filters.items())), cursor, direction)
+    return renderer.render(
+        'history', user_id, args,
+        lambda: _build_history_page(user_id, filters, cursor, direction)
+    )
+
+def _build_history_page(user_id: int, filters: dict, cursor: tuple, direction: str):
+    page = db.get_transactions_page(user_id, cursor=cursor, direction=direction,
+                                    limit=PAGE_SIZE, filters=filters)
+    history = page['transactions']
+    
+    if not history:
+        return None, None
+    
+    title = "📋 *Ваши последние транзакции:*" if cursor is None else "📋 *Ваши транзакции:*"
+    filter_label = None
+    if filters:
+        labels = [TYPE_NAMES.get(filters.get('type'), ''), filters.get('bank', ''),
+                  filters.get('category', '')]
+        filter_label = ', '.join(label for label in labels if label)
+    message = format_history(history, title, filter_label)
+    
+    # Кнопки для каждой транзакции
+    keyboard = [
+        [
+            InlineKeyboardButton(f"✏️ Редактировать #{i}", callback_data=f"edit_{trans['id']}"),
+            InlineKeyboardButton(f"🗑️ Удалить #{i}", callback_data=f"delete_{trans['id']}")
+        ]
+        for i, trans in enumerate(history, 1)
+    ]
+    
+    # Листание: курсоры первой и последней транзакции страницы и фильтр -
+    # кнопки старого сообщения листают с его фильтром, в том числе после перезапуска
+    pages = []
+    try:
+        if page['has_newer']:
+            pages.append(InlineKeyboardButton(
+                "⬅️ Новее", callback_data=history_callback(f"hist_n_{encode_cursor(history[0])}", filters)
+            ))
+        if page['has_older']:
+            pages.append(InlineKeyboardButton(
+                "Старше ➡️", callback_data=history_callback(f"hist_o_{encode_cursor(history[-1])}", filters)
+            ))
+        refresh = history_callback("refresh_history", filters)
+    except ValueError:
+        # Слишком длинное слово-категория: без кнопок, чем листать без фильтра
+        pages, refresh = [], "refresh_history"
+    if pages:
+        keyboard.append(pages)
+    
+    # Добавляем кнопки навигации
+    keyboard.append([
+        InlineKeyboardButton("🔄 Обновить", callback_data=refresh),
+        InlineKeyboardButton("📊 Статистика", callback_data="show_stats")
+    ])
+    
+    return message, InlineKeyboardMarkup(keyboard)
+
 def history_command(update: Update, context: CallbackContext):
-    """Команда /history - показать последние транзакции"""
+    """Команда /history [фильтр] - показать последние транзакции"""
     
     user_id = update.effective_user.id
     
-    # Получаем историю транзакций
-    history = db.get_user_transactions_history(user_id, limit=10)
+    # Фильтр: /history еда, /history kaspi, /history доходы - кнопки страницы несут его с собой
+    filters = parse_history_filters(context.args or [])
     
-    if not history:
+    message, reply_markup = build_history_page(user_id, filters)
+    
+    if message is None:
+        if filters:
+            update.message.reply_text(
+                "📋 Нет транзакций по этому фильтру.\n\n"
+                "Используйте /history без параметров, чтобы увидеть все."
+            )
+            return
         update.message.reply_text(
             "📋 История транзакций пуста.\n\n"
             "Начните добавлять транзакции, просто написав:\n"
@@ -20,122 +185,73 @@ def history_command(update: Update, context: CallbackContext):
         )
         return
     
-    # Формируем сообщение с историей
-    message = "📋 *Ваши последние транзакции:*\n\n"
-    
-    keyboard = []
-    
-    for i, trans in enumerate(history, 1):
-        # Форматируем дату
-        if isinstance(trans['date'], str):
-            date_str = trans['date']
-        else:
-            date_str = str(trans['date'])
-        
-        # Эмодзи для типа транзакции
-        emoji = "💰" if trans['type'] == 'income' else "💸"
-        
-        # Добавляем строку транзакции
-        message += f"{i}. {emoji} *{trans['amount']:,.0f} {trans['currency']}*\n"
-        message += f"   📅 {date_str} • 🏷️ {trans['category']}\n"
-        message += f"   📝 {trans['description']}\n"
-        
-        if trans['bank']:
-            message += f"   🏦 {trans['bank']}\n"
-        
-        message += "\n"
-        
-        # Добавляем кнопки для каждой транзакции
-        keyboard.append([
-            InlineKeyboardButton(
-                f"✏️ Редактировать #{i}", 
-                callback_data=f"edit_{trans['id']}"
-            ),
-            InlineKeyboardButton(
-                f"🗑️ Удалить #{i}", 
-                callback_data=f"delete_{trans['id']}"
-            )
-        ])
-    
-    # Добавляем кнопки навигации
-    keyboard.append([
-        InlineKeyboardButton("🔄 Обновить", callback_data="refresh_history"),
-        InlineKeyboardButton("📊 Статистика", callback_data="show_stats")
-    ])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    update.message.reply_text(
+    sent = update.message.reply_text(
         message, 
         reply_markup=reply_markup,
         parse_mode='Markdown'
     )
+    message_editor.remember(sent, message, reply_markup)
 
 def refresh_history_callback(update: Update, context: CallbackContext):
-    """Обновить историю транзакций"""
+    """Обновить историю транзакций (первая страница): refresh_history[_<фильтр>]"""
     
     query = update.callback_query
     query.answer()
     
     user_id = update.effective_user.id
-    
-    # Получаем обновленную историю
-    history = db.get_user_transactions_history(user_id, limit=10)
-    
-    if not history:
-        query.edit_message_text(
+    code = query.data[len("refresh_history_"):] if query.data != "refresh_history" else ''
+    try:
+        filters = decode_filters(code)
+    except ValueError:
+        # Старая или чужая кнопка - показываем историю без фильтра
+        filters = {}
+    
+    message, reply_markup = build_history_page(user_id, filters)
+    
+    if message is None:
+        message_editor.edit(
+            query,
             "📋 История транзакций пуста.\n\n"
             "Начните добавлять транзакции, просто написав:\n"
             "💡 \"купил кофе 800 тг\""
         )
         return
     
-    # Формируем обновленное сообщение
-    message = "📋 *Ваши последние транзакции:* _(обновлено)_\n\n"
-    
-    keyboard = []
-    
-    for i, trans in enumerate(history, 1):
-        # Форматируем дату
-        if isinstance(trans['date'], str):
-            date_str = trans['date']
-        else:
-            date_str = str(trans['date'])
-        
-        # Эмодзи для типа транзакции
-        emoji = "💰" if trans['type'] == 'income' else "💸"
-        
-        # Добавляем строку транзакции
-        message += f"{i}. {emoji} *{trans['amount']:,.0f} {trans['currency']}*\n"
-        message += f"   📅 {date_str} • 🏷️ {trans['category']}\n"
-        message += f"   📝 {trans['description']}\n"
-        
-        if trans['bank']:
-            message += f"   🏦 {trans['bank']}\n"
-        
-        message += "\n"
-        
-        # Добавляем кнопки для каждой транзакции
-        keyboard.append([
-            InlineKeyboardButton(
-                f"✏️ Редактировать #{i}", 
-                callback_data=f"edit_{trans['id']}"
-            ),
-            InlineKeyboardButton(
-                f"🗑️ Удалить #{i}", 
-                callback_data=f"delete_{trans['id']}"
-            )
-        ])
+    message_editor.edit(
+        query,
+        message, 
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+def history_page_callback(update: Update, context: CallbackContext):
+    """Листание истории: hist_o_<курсор>[_<фильтр>] - старше, hist_n_<курсор>[_<фильтр>] - новее"""
     
-    # Добавляем кнопки навигации
-    keyboard.append([
-        InlineKeyboardButton("🔄 Обновить", callback_data="refresh_history"),
-        InlineKeyboardButton("📊 Статистика", callback_data="show_stats")
-    ])
+    query = update.callback_query
+    query.answer()
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    user_id = update.effective_user.id
     
-    query.edit_message_text(
+    parts = query.data.split('_', 4)
+    direction = 'older' if parts[1] == 'o' else 'newer'
+    try:
+        cursor = decode_cursor(f"{parts[2]}_{parts[3]}")
+        filters = decode_filters(parts[4] if len(parts) > 4 else '')
+    except ValueError:
+        # Старая или чужая кнопка - первая страница без фильтра
+        cursor, filters = None, {}
+    
+    message, reply_markup = build_history_page(user_id, filters, cursor, direction)
+    
+    if message is None:
+        # Соседние транзакции удалили - возвращаемся к началу
+        message, reply_markup = build_history_page(user_id, filters)
+        if message is None:
+            message_editor.edit(query, "📋 История транзакций пуста.")
+            return
+    
+    message_editor.edit(
+        query,
         message, 
         reply_markup=reply_markup,
         parse_mode='Markdown'
@@ -155,7 +271,8 @@ def edit_transaction_callback(update: Update, context: CallbackContext):
     transaction = db.get_transaction_by_id(transaction_id, user_id)
     
     if not transaction:
-        query.edit_message_text(
+        message_editor.edit(
+            query,
             "❌ Транзакция не найдена или была удалена."
         )
         return
@@ -185,7 +302,8 @@ def edit_transaction_callback(update: Update, context: CallbackContext):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    query.edit_message_text(
+    message_editor.edit(
+        query,
         message,
         reply_markup=reply_markup,
         parse_mode='Markdown'
@@ -205,7 +323,8 @@ def delete_transaction_callback(update: Update, context: CallbackContext):
     transaction = db.get_transaction_by_id(transaction_id, user_id)
     
     if not transaction:
-        query.edit_message_text(
+        message_editor.edit(
+            query,
             "❌ Транзакция не найдена или была удалена."
         )
         return
@@ -227,7 +346,8 @@ def delete_transaction_callback(update: Update, context: CallbackContext):
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    query.edit_message_text(
+    message_editor.edit(
+        query,
         message,
         reply_markup=reply_markup,
         parse_mode='Markdown'
@@ -245,12 +365,14 @@ def confirm_delete_callback(update: Update, context: CallbackContext):
     
     # Удаляем транзакцию
     if db.delete_transaction(transaction_id, user_id):
-        query.edit_message_text(
+        message_editor.edit(
+            query,
             "✅ Транзакция успешно удалена!\n\n"
             "Используйте /history чтобы посмотреть обновленную историю."
         )
     else:
-        query.edit_message_text(
+        message_editor.edit(
+            query,
             "❌ Ошибка при удалении транзакции.\n\n"
             "Попробуйте еще раз или обратитесь в поддержку."
         )
\ No newline at end of file
@@ -0,0 +1,67 @@
+import os
+import tempfile
+from telegram import Update
+from telegram.ext import CallbackContext
+from database_extended import db
+from bank_import import import_statement, StatementError
+
+# Bot API отдает боту файлы не больше 20 МБ
+MAX_IMPORT_SIZE = 20 * 1024 * 1024
+
+def import_command(update: Update, context: CallbackContext):
+    """Команда /import - как загрузить выписку"""
+    
+    update.message.reply_text(
+        "📥 *Импорт банковской выписки*\n\n"
+        "Отправьте файл выписки в формате CSV или XLSX (Kaspi, Halyk и др.).\n"
+        "В подписи к файлу можно указать банк, например: _kaspi_\n\n"
+        "Нужны колонки с датой и суммой; операции и описание необязательны.\n"
+        "Повторная загрузка той же выписки не создаст дубликатов.",
+        parse_mode='Markdown'
+    )
+
+def import_document(update: Update, context: CallbackContext):
+    """Импорт присланного файла выписки"""
+    
+    document = update.message.document
+    user = update.effective_user
+    file_name = document.file_name or "statement.csv"
+    
+    if not file_name.lower().endswith(('.csv', '.xlsx')):
+        update.message.reply_text("❌ Поддерживаются только файлы CSV и XLSX.")
+        return
+    
+    if document.file_size and document.file_size > MAX_IMPORT_SIZE:
+        update.message.reply_text("❌ Файл слишком большой (максимум 20 МБ).")
+        return
+    
+    update.message.reply_text("⏳ Импортирую выписку...")
+    
+    db.add_user(user.id, user.username, user.first_name)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, os.path.basename(file_name))
+        context.bot.get_file(document.file_id).download(custom_path=path)
+        
+        try:
+            stats = import_statement(db, path, user.id, bank=update.message.caption)
+        except StatementError as e:
+            update.message.reply_text(f"❌ Не удалось разобрать выписку: {e}")
+            return
+        except Exception as e:
+            print(f"❌ Ошибка импорта выписки: {e}")
+            update.message.reply_text("❌ Ошибка при импорте выписки. Попробуйте еще раз.")
+            return
+    
+    message = "✅ *Выписка импортирована!*\n\n"
+    if stats['bank']:
+        message += f"🏦 Банк: {stats['bank']}\n"
+    message += f"📄 Строк в файле: {stats['read']:,}\n"
+    message += f"➕ Добавлено: {stats['inserted']:,}\n"
+    if stats['duplicates']:
+        message += f"♻️ Уже были в базе: {stats['duplicates']:,}\n"
+    if stats['skipped']:
+        message += f"⚠️ Пропущено (нет даты или суммы): {stats['skipped']:,}\n"
+    message += "\n📋 Используйте /history для просмотра"
+    
+    update.message.reply_text(message, parse_mode='Markdown')
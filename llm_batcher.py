@@ -0,0 +1,73 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+
+
+class MicroBatcher:
+    """Собирает сообщения, пришедшие за короткое окно, и разбирает их одним запросом.
+
+    Первое сообщение в пустой очереди запускает таймер на window секунд;
+    пакет отправляется по таймеру или сразу при достижении max_size.
+    Каждый вызывающий получает свой элемент ответа. Работает внутри
+    одного цикла событий, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, send_batch: Callable[[List[str]], Awaitable[List[Dict]]],
+                 window: float = 0.05, max_size: int = 8):
+        self.send_batch = send_batch
+        self.window = window
+        self.max_size = max_size
+
+        self.batches = 0
+        self.messages = 0
+
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, message: str) -> Dict:
+        """Добавить сообщение в текущий пакет и дождаться его результата"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Отправить накопленный пакет"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: list):
+        self.batches += 1
+        self.messages += len(batch)
+        try:
+            results = await self.send_batch([message for message, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Ожидалось {len(batch)} результатов, получено {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Сколько запросов сэкономлено пакетированием"""
+        return {
+            'batches': self.batches,
+            'messages': self.messages,
+            'avg_batch_size': self.messages / self.batches if self.batches else 0.0,
+            'requests_saved': self.messages - self.batches
+        }
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import aiohttp
+
+
+class LLMError(Exception):
+    """Ошибка обращения к API модели"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncChatClient:
+    """Асинхронный клиент Chat Completions API поверх aiohttp.
+
+    Одна сессия с пулом keep-alive соединений на весь процесс: запросы
+    не платят за TCP/TLS-рукопожатие, а лимит соединений ограничивает
+    число одновременных запросов к API.
+    """
+
+    API_URL = "https://api.openai.com/v1/chat/completions"
+
+    def __init__(self, api_key: Optional[str], model: str = "gpt-3.5-turbo",
+                 timeout: float = 15.0, max_connections: int = 100):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Сессия создается лениво внутри работающего цикла событий"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    async def create(self, messages: List[Dict], **params) -> Dict:
+        """Запрос к Chat Completions, возвращает JSON ответа"""
+        session = await self._get_session()
+        payload = {"model": self.model, "messages": messages, **params}
+
+        try:
+            async with session.post(self.API_URL, json=payload) as response:
+                data = await response.json(content_type=None)
+                if response.status >= 400:
+                    error = (data or {}).get("error", {}).get("message", response.reason)
+                    raise LLMError(f"OpenAI API {response.status}: {error}", response.status)
+                return data
+        except asyncio.TimeoutError:
+            raise LLMError(f"OpenAI API не ответил за {self.timeout:.0f} с")
+        except aiohttp.ClientError as e:
+            raise LLMError(f"Сетевая ошибка OpenAI API: {e}")
+
+    async def complete(self, messages: List[Dict], **params) -> str:
+        """Текст первого варианта ответа"""
+        data = await self.create(messages, **params)
+        return data["choices"][0]["message"]["content"].strip()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
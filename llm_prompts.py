@@ -0,0 +1,143 @@
+import json
+from typing import Dict, List, Optional
+
+CURRENCIES = ["KZT", "USD", "EUR", "RUB"]
+
+
+def transaction_schema(categories: Dict[str, List[str]], banks: List[str]) -> Dict:
+    """JSON-схема одной транзакции: списки категорий и банков - в enum, а не в тексте запроса"""
+    return {
+        "type": "object",
+        "properties": {
+            "success": {"type": "boolean"},
+            "amount": {"type": "number"},
+            "currency": {"type": "string", "enum": CURRENCIES},
+            "category": {
+                "type": "string",
+                "enum": sorted(set(categories["expense"]) | set(categories["income"]))
+            },
+            "description": {"type": "string"},
+            "bank": {"type": ["string", "null"], "enum": banks + [None]},
+            "type": {"type": "string", "enum": ["income", "expense"]},
+            "confidence": {"type": "number"},
+            "error": {"type": "string"}
+        },
+        "required": ["success"]
+    }
+
+
+# Поля, без которых успешный результат нельзя записать и показать пользователю
+TRANSACTION_FIELDS = ("amount", "currency", "category", "description", "type", "confidence")
+TRANSFER_FIELDS = ("amount", "currency", "from_account", "to_account", "description", "confidence")
+
+
+def result_problem(result: Dict, fields: tuple) -> Optional[str]:
+    """Что не так с успешным ответом модели (None - все поля на месте).
+
+    В схеме обязательно только success - при отказе модель остальные поля
+    не заполняет, - поэтому полноту успешного ответа проверяем здесь.
+    """
+    missing = [field for field in fields if result.get(field) in (None, "")]
+    if missing:
+        return f"В ответе модели нет полей: {', '.join(missing)}"
+    amount = result["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or amount <= 0:
+        return f"Некорректная сумма в ответе модели: {amount}"
+    if "type" in fields and result["type"] not in ("income", "expense"):
+        return f"Некорректный тип операции в ответе модели: {result['type']}"
+    return None
+
+
+def transaction_function(categories: Dict[str, List[str]], banks: List[str]) -> Dict:
+    """Функция для разбора одного сообщения (function calling)"""
+    return {
+        "name": "save_transaction",
+        "description": "Финансовая операция из сообщения",
+        "parameters": transaction_schema(categories, banks)
+    }
+
+
+def transaction_batch_function(categories: Dict[str, List[str]], banks: List[str]) -> Dict:
+    """Функция для разбора пакета сообщений: массив результатов в порядке сообщений"""
+    return {
+        "name": "save_transactions",
+        "description": "Финансовые операции из пронумерованных сообщений, по одной на сообщение",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "results": {"type": "array", "items": transaction_schema(categories, banks)}
+            },
+            "required": ["results"]
+        }
+    }
+
+
+def transfer_function(accounts: List[str]) -> Dict:
+    """Функция для разбора перевода между счетами"""
+    return {
+        "name": "save_transfer",
+        "description": "Перевод денег между счетами",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "success": {"type": "boolean"},
+                "amount": {"type": "number"},
+                "currency": {"type": "string", "enum": CURRENCIES},
+                "from_account": {"type": "string", "enum": accounts},
+                "to_account": {"type": "string", "enum": accounts},
+                "description": {"type": "string"},
+                "confidence": {"type": "number"},
+                "error": {"type": "string"}
+            },
+            "required": ["success"]
+        }
+    }
+
+
+# Инструкции короткие: форму ответа задает схема функции
+TRANSACTION_PROMPT = (
+    "Извлеки финансовую операцию из сообщения пользователя. "
+    "Валюта по умолчанию KZT, confidence 0-1. "
+    "Если операции нет: success=false и error с причиной."
+)
+TRANSACTION_BATCH_PROMPT = (
+    "Извлеки финансовую операцию из каждого пронумерованного сообщения, "
+    "results в том же порядке. Валюта по умолчанию KZT, confidence 0-1. "
+    "Если в сообщении нет операции: success=false и error."
+)
+TRANSFER_PROMPT = (
+    "Извлеки перевод между счетами. "
+    "\"снял наличными\" - to_account \"наличные\", \"пополнил X\" - from_account \"наличные\". "
+    "Если перевода нет: success=false и error."
+)
+
+
+def function_messages(system_prompt: str, user_content: str) -> List[Dict]:
+    """Сообщения запроса: постоянная инструкция и текст пользователя"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+
+def numbered(messages: List[str]) -> str:
+    """Пакет сообщений одним текстом: "1. кофе 800" по строке на сообщение"""
+    return "\n".join(f"{i}. {message}" for i, message in enumerate(messages, 1))
+
+
+def function_arguments(response: Dict) -> Dict:
+    """Аргументы вызова функции из ответа Chat Completions.
+
+    Модель обязана вызвать функцию (function_call задан явно), поэтому
+    ответ - JSON без обертки в ``` и без пояснений вокруг.
+    """
+    message = response["choices"][0]["message"]
+    call = message.get("function_call")
+    if not call:
+        raise ValueError("Модель не вызвала функцию")
+    return json.loads(call["arguments"])
+
+
+def schema_tokens(function: Dict) -> int:
+    """Оценка токенов, которые добавляет описание функции к запросу"""
+    return len(json.dumps(function, ensure_ascii=False)) // 3
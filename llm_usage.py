@@ -0,0 +1,56 @@
+import threading
+from typing import Dict, Optional
+
+
+class TokenUsage:
+    """Учет токенов и времени запросов к модели по видам запросов.
+
+    record() вызывается после каждого ответа с полем usage из ответа API;
+    stats() и report() показывают, сколько токенов уходит на запрос и
+    ответ в среднем - по ним видно, во что обходится каждый вид запросов.
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, usage: Optional[Dict], elapsed: float = 0.0, items: int = 1):
+        """Учесть один запрос; items - сколько сообщений он разобрал (для пакетов)"""
+        usage = usage or {}
+        with self._lock:
+            totals = self._totals.setdefault(kind, {
+                'calls': 0, 'items': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'seconds': 0.0
+            })
+            totals['calls'] += 1
+            totals['items'] += items
+            totals['prompt_tokens'] += usage.get('prompt_tokens', 0)
+            totals['completion_tokens'] += usage.get('completion_tokens', 0)
+            totals['seconds'] += elapsed
+
+    def stats(self) -> Dict[str, Dict]:
+        """Итоги и средние на запрос и на сообщение по каждому виду запросов"""
+        with self._lock:
+            result = {}
+            for kind, totals in self._totals.items():
+                calls, items = totals['calls'], totals['items'] or 1
+                tokens = totals['prompt_tokens'] + totals['completion_tokens']
+                result[kind] = dict(
+                    totals,
+                    prompt_per_call=totals['prompt_tokens'] / calls,
+                    completion_per_call=totals['completion_tokens'] / calls,
+                    tokens_per_item=tokens / items,
+                    avg_latency_ms=totals['seconds'] / calls * 1000
+                )
+            return result
+
+    def report(self) -> str:
+        """Отчет для журнала: по строке на вид запросов"""
+        lines = []
+        for kind, stats in sorted(self.stats().items()):
+            lines.append(
+                f"{kind}: {stats['calls']} запросов, {stats['items']} сообщений, "
+                f"prompt {stats['prompt_per_call']:.0f} + completion "
+                f"{stats['completion_per_call']:.0f} токенов на запрос, "
+                f"{stats['tokens_per_item']:.0f} на сообщение, {stats['avg_latency_ms']:.0f} мс"
+            )
+        return "\n".join(lines) or "запросов к модели не было"
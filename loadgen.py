@@ -0,0 +1,126 @@
+"""Нагрузочный тест режима webhook.
+
+Запускает webhook.py --dry-run с разным числом процессов, отправляет
+приемнику синтетические обновления Telegram (сообщения о тратах от
+нескольких пользователей) и считает, сколько обновлений в секунду
+обработано - от первого запроса до записи последней транзакции.
+
+    python loadgen.py [обновлений] [пользователей] [процессы через запятую]
+
+Число шардов базы равно числу процессов: каждый процесс пишет в свой файл.
+"""
+import http.client
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from database_extended import shard_paths
+
+MESSAGES = ["купил кофе 800 тг", "потратил 2500 на обед", "такси 1200",
+            "продукты в магнуме 15000", "получил зарплату 350000"]
+PATH = "/telegram/load"
+
+
+def make_update(update_id: int, user_id: int) -> bytes:
+    """Обновление с текстовым сообщением, как его присылает Telegram"""
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"},
+            'text': MESSAGES[update_id % len(MESSAGES)]
+        }
+    }).encode('utf-8')
+
+
+def wait_for(port: int, condition, timeout: float = 60.0) -> dict:
+    """Опрашивать /stats приемника, пока condition(stats) не станет истинным"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/stats')
+            stats = json.loads(conn.getresponse().read())
+            conn.close()
+            if condition(stats):
+                return stats
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("Приемник не ответил вовремя")
+
+
+def send(port: int, bodies: list):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for body in bodies:
+        conn.request('POST', PATH, body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Приемник ответил {response.status}")
+    conn.close()
+
+
+def count_transactions(db_path: str, shards: int) -> int:
+    total = 0
+    for path in shard_paths(db_path, shards):
+        with sqlite3.connect(path) as conn:
+            total += conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    return total
+
+
+def run(workers: int, updates: int, users: int, port: int) -> float:
+    db_path = os.path.join(tempfile.mkdtemp(), "load.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_SHARDS=str(workers))
+    front = subprocess.Popen(
+        [sys.executable, "webhook.py", "--dry-run", "--workers", str(workers),
+         "--port", str(port), "--listen", "127.0.0.1", "--path", PATH],
+        env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_for(port, lambda stats: True)
+
+        # Прогрев: процессы-обработчики открывают базу
+        send(port, [make_update(n, user_id) for n, user_id in enumerate(range(1, workers + 1))])
+        wait_for(port, lambda stats: sum(stats['forwarded']) == workers)
+
+        bodies = [make_update(workers + n, 1 + n % users) for n in range(updates)]
+        senders = 8
+        threads = [threading.Thread(target=send, args=(port, bodies[i::senders]))
+                   for i in range(senders)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = wait_for(port, lambda stats: sum(stats['forwarded']) == workers + updates, 300)
+        elapsed = time.perf_counter() - started
+
+        stored = count_transactions(db_path, workers)
+        print(f"   процессов: {workers}  {updates / elapsed:>8,.0f} обновлений/с  "
+              f"транзакций в базе: {stored}  по процессам: {stats['routed']}")
+        return updates / elapsed
+    finally:
+        front.terminate()
+        front.wait(60)
+
+
+def main():
+    updates = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    worker_counts = [int(n) for n in sys.argv[3].split(',')] if len(sys.argv) > 3 else [1, 2, 4]
+    print(f"🧪 {updates:,} обновлений от {users} пользователей, ядер: {os.cpu_count()}")
+
+    for index, workers in enumerate(worker_counts):
+        run(workers, updates, users, 18500 + index * 100)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import re
+from typing import Dict, List, Optional
+
+# Стандартные категории
+DEFAULT_CATEGORIES = {
+    "expense": ["еда", "транспорт", "развлечения", "покупки", "жилье", "здоровье", "другое"],
+    "income": ["зарплата", "инвестиции", "подарки", "подработка", "другое"]
+}
+
+# Ключевые слова (начала слов) для категорий. В работу попадают только
+# категории, которые есть в списке категорий парсера.
+CATEGORY_KEYWORDS = {
+    "expense": {
+        "еда": ["кофе", "обед", "ужин", "завтрак", "продукт", "еда", "кафе", "ресторан",
+                "пицц", "бургер", "шаурм", "магнум", "magnum", "small", "смолл", "чай", "булк",
+                "хлеб", "молок", "доставк", "перекус", "фастфуд", "суши", "coffee"],
+        "транспорт": ["такси", "автобус", "метро", "бензин", "заправк", "парковк",
+                      "проезд", "транспорт", "каршеринг", "поезд", "самолет", "билет", "uber"],
+        "развлечения": ["кино", "театр", "концерт", "игр", "клуб", "развлечен",
+                        "подписк", "netflix", "spotify", "боулинг", "караоке"],
+        "покупки": ["одежд", "обув", "покупк", "техник", "телефон", "наушник",
+                    "wildberries", "ozon", "маркетплейс", "кроссовк", "куртк"],
+        "жилье": ["аренд", "квартир", "коммуналк", "интернет", "жилье",
+                  "ремонт", "электричеств"],
+        "здоровье": ["аптек", "лекарств", "врач", "стоматолог", "анализ", "здоровье",
+                     "спортзал", "фитнес", "таблетк", "клиник"],
+    },
+    "income": {
+        "зарплата": ["зарплат", "зп", "аванс", "оклад", "преми"],
+        "инвестиции": ["дивиденд", "инвестиц", "купон", "вклад", "депозит", "процент"],
+        "подарки": ["подарил", "подарок", "подарк"],
+        "подработка": ["подработк", "фриланс", "заказ", "халтур"],
+    }
+}
+
+# Слова, по которым операция считается доходом
+INCOME_KEYWORDS = ["получил", "пришл", "пришел", "зарплат", "зп", "аванс", "доход",
+                   "заработал", "вернули", "кэшбэк", "кешбек", "дивиденд", "подарил"]
+
+# Переводы между счетами разбирает parse_transfer, а не быстрый путь
+TRANSFER_KEYWORDS = ["перевел", "перевёл", "перевод", "снял", "пополнил", "перекинул",
+                     "перебросил"]
+
+CURRENCY_PATTERNS = [
+    ("KZT", re.compile(r'(₸|\bтг\b|\bтенге\b|\bkzt\b)')),
+    ("USD", re.compile(r'(\$|\bдолл\w*|\busd\b|\bбакс\w*)')),
+    ("EUR", re.compile(r'(€|\bевро\b|\beur\b)')),
+    ("RUB", re.compile(r'(₽|\bруб\w*|\brub\b)')),
+]
+
+# Сумма: "800", "1 200", "1200.50", "5к", "5 тыс"
+AMOUNT_RE = re.compile(
+    r'(?<![\w.,])(\d{1,3}(?:[  ]\d{3})+|\d+)(?:[.,](\d{1,2}))?'
+    r'(?:(?:(к|k)|\s?(тыс)\w*)(?!\w))?(?![\w.,]?\d)'
+)
+WORD_RE = re.compile(r'[a-zа-яё]+')
+
+# Служебные слова, которые не несут описания
+FILLER_WORDS = {"купил", "купила", "потратил", "потратила", "заплатил", "заплатила",
+                "оплатил", "оплатила", "на", "за", "с", "со", "в", "во", "по", "и",
+                "получил", "получила", "тг", "тенге", "руб", "рублей", "долларов",
+                "евро", "к", "тыс", "карты", "картой", "карта", "банк"}
+
+
+def normalize_bank_name(bank_name: str) -> str:
+    """Нормализация названий банков"""
+    if not bank_name:
+        return 'другое'
+
+    bank_name_lower = bank_name.lower()
+
+    if any(word in bank_name_lower for word in ['каспи', 'kaspi']):
+        return 'kaspi'
+    elif any(word in bank_name_lower for word in ['халык', 'halyk']):
+        return 'halyk'
+    elif any(word in bank_name_lower for word in ['сбер', 'sber']):
+        return 'sber'
+    elif any(word in bank_name_lower for word in ['форте', 'forte']):
+        return 'forte'
+    elif any(word in bank_name_lower for word in ['наличные', 'наличка', 'кэш', 'cash']):
+        return 'наличные'
+    else:
+        return 'другое'
+
+
+def detect_bank(words: List[str]) -> Optional[str]:
+    """Первый банк, упомянутый в словах сообщения"""
+    for word in words:
+        bank = normalize_bank_name(word)
+        if bank != 'другое':
+            return bank
+    return None
+
+
+class LocalParser:
+    """Разбор простых сообщений о тратах без обращения к OpenAI"""
+
+    def __init__(self, categories: Dict[str, List[str]], threshold: float = 0.85):
+        self.threshold = threshold
+        self.attempts = 0
+        self.accepted = 0
+
+        # Словарь "начало слова -> категория" только для известных категорий
+        self.keywords = {}
+        for transaction_type, names in categories.items():
+            known = CATEGORY_KEYWORDS.get(transaction_type, {})
+            self.keywords[transaction_type] = [
+                (stem, name)
+                for name in names
+                for stem in known.get(name, [name])
+            ]
+
+    def categorize(self, text: str, transaction_type: str = 'expense') -> Optional[str]:
+        """Категория по ключевым словам или None"""
+        words = text if isinstance(text, list) else WORD_RE.findall(text.lower())
+        for word in words:
+            for stem, category in self.keywords.get(transaction_type, []):
+                if word.startswith(stem):
+                    return category
+        return None
+
+    def parse(self, message: str) -> Dict:
+        """Разобрать сообщение; confidence показывает, можно ли доверять результату"""
+        self.attempts += 1
+        text = message.lower().replace('ё', 'е')
+        words = WORD_RE.findall(text)
+
+        if any(word.startswith(keyword) for word in words for keyword in TRANSFER_KEYWORDS):
+            return {"success": False, "error": "Похоже на перевод", "confidence": 0.0}
+
+        amounts = list(AMOUNT_RE.finditer(text))
+        if not amounts:
+            return {"success": False, "error": "Сумма не найдена", "confidence": 0.0}
+
+        match = amounts[-1]
+        amount = float(re.sub(r'\s', '', match.group(1)))
+        if match.group(2):
+            amount += float(f"0.{match.group(2)}")
+        if match.group(3) or match.group(4):
+            amount *= 1000
+
+        is_income = any(word.startswith(keyword) for word in words for keyword in INCOME_KEYWORDS)
+        transaction_type = 'income' if is_income else 'expense'
+        category = self.categorize(words, transaction_type)
+
+        currency = 'KZT'
+        currency_found = False
+        for code, pattern in CURRENCY_PATTERNS:
+            if pattern.search(text):
+                currency, currency_found = code, True
+                break
+
+        bank = detect_bank(words)
+
+        confidence = 0.5
+        if category:
+            confidence += 0.4
+        if currency_found:
+            confidence += 0.05
+        if len(amounts) > 1:
+            # Несколько чисел - непонятно, какое из них сумма
+            confidence -= 0.3
+
+        description_words = [
+            word for word in WORD_RE.findall(message.lower())
+            if word not in FILLER_WORDS and normalize_bank_name(word) == 'другое'
+        ]
+        description = " ".join(description_words) or category or "операция"
+
+        result = {
+            "success": True,
+            "amount": amount,
+            "currency": currency,
+            "category": category or "другое",
+            "description": description[:1].upper() + description[1:],
+            "bank": bank,
+            "type": transaction_type,
+            "confidence": round(min(confidence, 1.0), 2),
+            "source": "local"
+        }
+        if result["confidence"] >= self.threshold:
+            self.accepted += 1
+        return result
+
+    def stats(self) -> Dict:
+        """Доля сообщений, разобранных без OpenAI"""
+        return {
+            'attempts': self.attempts,
+            'accepted': self.accepted,
+            'fast_path_share': self.accepted / self.attempts if self.attempts else 0.0
+        }
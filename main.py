@@ -1,20 +1,31 @@
 import os
 import logging
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler
 from dotenv import load_dotenv
+
+# Загружаем переменные из .env до импорта модулей, которые читают настройки
+load_dotenv()
+
 from database_extended import db
 from ai_parser import ai_parser
+from async_runtime import runtime, coroutine_handler
+from write_behind import write_behind
+from parse_queue import parse_queue
+from scheduler import scheduler, scheduled
+from renderer import renderer
+from message_edits import message_editor
 from history_handler import (
     history_command, 
     refresh_history_callback,
+    history_page_callback,
     edit_transaction_callback,
     delete_transaction_callback,
     confirm_delete_callback
 )
-
-# Загружаем переменные из .env
-load_dotenv()
+from import_handler import import_command, import_document
+from export_handler import export_command
 
 # Настройка логирования
 logging.basicConfig(
@@ -45,6 +56,8 @@ def start(update: Update, context: CallbackContext):
 
 🆕 **Новые команды:**
 - /history - посмотреть историю транзакций
+- /import - загрузить выписку банка
+- /export - выгрузить все транзакции
 - /help - справка
 
 Я автоматически распознаю суммы, категории и банки!
@@ -63,7 +76,9 @@ def help_command(update: Update, context: CallbackContext):
 - "получил зарплату 350000"
 
 📋 **Команды:**
-- /history - история транзакций
+- /history [фильтр] - история транзакций (например: /history еда, /history kaspi, /history доходы)
+- /import - загрузить выписку банка (CSV/XLSX)
+- /export [csv|parquet] - выгрузить все транзакции файлом
 - /help - эта справка
 
 ✏️ **В /history можете редактировать записи**
@@ -71,61 +86,47 @@ def help_command(update: Update, context: CallbackContext):
     
     update.message.reply_text(help_text, parse_mode='Markdown')
 
-def handle_message(update: Update, context: CallbackContext):
-    """Обработка текстовых сообщений"""
-    
-    message_text = update.message.text
-    user_id = update.effective_user.id
-    user_name = update.effective_user.first_name
-    
-    print(f"📩 Получено сообщение от {user_name}: {message_text}")
-    
-    # Добавляем пользователя в базу
-    db.add_user(user_id, update.effective_user.username, user_name)
-    
-    # Парсим сообщение через ИИ
-    ai_result = ai_parser.parse_transaction(message_text)
+def build_transaction(user_id: int, ai_result: dict, message_text: str) -> dict:
+    """Данные транзакции для записи в базу из результата парсера"""
+    return {
+        'user_id': user_id,
+        'amount': ai_result['amount'],
+        'currency': ai_result.get('currency', 'KZT'),
+        'category': ai_result['category'],
+        'description': ai_result['description'],
+        'bank': ai_result.get('bank'),
+        'type': ai_result['type'],
+        'confidence': ai_result['confidence'],
+        'raw_message': message_text
+    }
+
+def store_transaction(transaction_data: dict) -> bool:
+    """Сохранить в базу данных (или в очередь отложенной записи)"""
+    store = write_behind.add_transaction if write_behind is not None else db.add_transaction
+    return store(transaction_data)
+
+def transaction_reply(ai_result: dict) -> str:
+    """Ответ пользователю о добавленной транзакции"""
+    emoji = "💰" if ai_result['type'] == 'income' else "💸"
     
-    if ai_result["success"]:
-        # Подготавливаем данные для сохранения
-        transaction_data = {
-            'user_id': user_id,
-            'amount': ai_result['amount'],
-            'currency': ai_result.get('currency', 'KZT'),
-            'category': ai_result['category'],
-            'description': ai_result['description'],
-            'bank': ai_result.get('bank'),
-            'type': ai_result['type'],
-            'confidence': ai_result['confidence'],
-            'raw_message': message_text
-        }
-        
-        # Сохраняем в базу данных
-        if db.add_transaction(transaction_data):
-            # Формируем ответ пользователю
-            emoji = "💰" if ai_result['type'] == 'income' else "💸"
-            
-            response = f"""
+    response = f"""
 {emoji} **Транзакция добавлена!**
 
 💰 Сумма: {ai_result['amount']:,.0f} {ai_result['currency']}
 🏷️ Категория: {ai_result['category']}
 📝 Описание: {ai_result['description']}
 """
-            
-            if ai_result.get('bank'):
-                response += f"🏦 Банк: {ai_result['bank']}\n"
-            
-            response += f"🎯 Уверенность: {ai_result['confidence']:.0%}\n"
-            response += f"\n📋 Используйте /history для просмотра всех записей"
-            
-            update.message.reply_text(response, parse_mode='Markdown')
-            
-        else:
-            update.message.reply_text("❌ Ошибка при сохранении транзакции.")
-    else:
-        # ИИ не смог распознать транзакцию
-        response = f"""
+    
+    if ai_result.get('bank'):
+        response += f"🏦 Банк: {ai_result['bank']}\n"
+    
+    response += f"🎯 Уверенность: {ai_result['confidence']:.0%}\n"
+    response += f"\n📋 Используйте /history для просмотра всех записей"
+    return response
+
+def failure_reply(ai_result: dict) -> str:
+    """Ответ, если ИИ не смог распознать транзакцию"""
+    return f"""
 🤔 Не удалось распознать финансовую операцию.
 
 💡 **Попробуйте написать так:**
@@ -134,46 +135,213 @@ def handle_message(update: Update, context: CallbackContext):
 
 ❌ **Ошибка:** {ai_result.get('error', 'Неизвестная ошибка')}
 """
-        
-        update.message.reply_text(response, parse_mode='Markdown')
+
+async def handle_message(update: Update, context: CallbackContext):
+    """Обработка текстовых сообщений (корутина: ожидание OpenAI не занимает поток)"""
+    
+    message_text = update.message.text
+    user_id = update.effective_user.id
+    user_name = update.effective_user.first_name
+    
+    print(f"📩 Получено сообщение от {user_name}: {message_text}")
+    
+    # Добавляем пользователя в базу
+    await runtime.run_blocking(db.add_user, user_id, update.effective_user.username, user_name)
+    
+    # Простые и уже знакомые сообщения разбираем сразу, без OpenAI
+    ai_result = ai_parser.parse_without_llm(message_text)
+    
+    if ai_result is None and parse_queue is not None:
+        # Остальные сохраняем в очередь и отвечаем сразу: результат придет
+        # отдельным сообщением, даже если OpenAI сейчас медленный или недоступен
+        job_id = await runtime.run_blocking(
+            parse_queue.enqueue, user_id, update.effective_chat.id, message_text
+        )
+        if job_id is not None:
+            await runtime.run_blocking(
+                update.message.reply_text, "📥 Сообщение принято, распознаю и пришлю результат."
+            )
+            return
+    
+    if ai_result is None:
+        # Парсим сообщение через ИИ (локальный парсер и кэш уже проверены)
+        ai_result = await ai_parser.parse_transaction_llm_async(message_text)
+    
+    if ai_result["success"]:
+        transaction_data = build_transaction(user_id, ai_result, message_text)
+        if await runtime.run_blocking(store_transaction, transaction_data):
+            await runtime.run_blocking(
+                update.message.reply_text, transaction_reply(ai_result), parse_mode='Markdown'
+            )
+        else:
+            await runtime.run_blocking(update.message.reply_text, "❌ Ошибка при сохранении транзакции.")
+    elif ai_result.get('unavailable'):
+        # OpenAI недоступен: ничего не записываем и не угадываем
+        await runtime.run_blocking(
+            update.message.reply_text,
+            "⏳ Распознавание временно недоступно. Отправьте сообщение еще раз через пару минут."
+        )
+    else:
+        await runtime.run_blocking(update.message.reply_text, failure_reply(ai_result),
+                                   parse_mode='Markdown')
+
+def start_parse_queue(bot):
+    """Запустить фоновый разбор сообщений из очереди с ответом через bot"""
+    
+    def parse(message_text: str) -> dict:
+        # Через цикл событий: работают пакетирование и общий пул соединений.
+        # Локальный парсер и кэш уже проверил handle_message перед постановкой в очередь
+        return runtime.submit(ai_parser.parse_transaction_llm_async(message_text)).result()
+    
+    def save(job: dict, ai_result: dict) -> bool:
+        transaction_data = build_transaction(job['user_id'], ai_result, job['message'])
+        # Дата - когда пришло сообщение; ключ задачи защищает от повторной записи
+        # (номер задачи уникален только в одном файле очереди)
+        transaction_data['date'] = datetime.fromtimestamp(job['created_at']).date()
+        transaction_data['external_id'] = f"pq:{job['key']}"
+        return store_transaction(transaction_data)
+    
+    def notify(job: dict, ai_result: dict):
+        if ai_result['success']:
+            bot.send_message(job['chat_id'], transaction_reply(ai_result), parse_mode='Markdown')
+        elif ai_result.get('unavailable'):
+            bot.send_message(job['chat_id'], f"⏳ Не удалось распознать «{job['message']}»: "
+                                             f"сервис недоступен. Отправьте сообщение еще раз позже.")
+        else:
+            bot.send_message(job['chat_id'], f"«{job['message']}»\n" + failure_reply(ai_result),
+                             parse_mode='Markdown')
+    
+    parse_queue.start(parse, save, notify)
 
 def error_handler(update: Update, context: CallbackContext):
     """Логирует ошибки"""
     logger.warning(f'Update {update} caused error {context.error}')
 
-def main():
-    """Запуск бота"""
+def register_handlers(dp):
+    """Подключить обработчики бота к диспетчеру (long polling или webhook.py).
+
+    Все обработчики идут через планировщик: обновления одного пользователя
+    выполняются по порядку, разных пользователей - параллельно.
+    """
+    
+    # Добавляем обработчики команд
+    dp.add_handler(CommandHandler("start", scheduled(start)))
+    dp.add_handler(CommandHandler("help", scheduled(help_command)))
+    dp.add_handler(CommandHandler("history", scheduled(history_command)))  # НОВАЯ КОМАНДА
+    dp.add_handler(CommandHandler("import", scheduled(import_command)))
+    # Выгрузка и импорт долгие, но поток диспетчера они не держат: их тоже
+    # выполняет планировщик
+    dp.add_handler(CommandHandler("export", scheduled(export_command)))
+    
+    # Добавляем обработчики сообщений
+    dp.add_handler(MessageHandler(Filters.text & ~Filters.command,
+                                  scheduled(coroutine_handler(handle_message))))
+    dp.add_handler(MessageHandler(Filters.document, scheduled(import_document)))
+    
+    # НОВЫЕ обработчики для истории
+    dp.add_handler(CallbackQueryHandler(scheduled(refresh_history_callback), pattern="^refresh_history(_.+)?$"))
+    dp.add_handler(CallbackQueryHandler(scheduled(history_page_callback), pattern=r"^hist_[on]_\d{14}_\d+(_.+)?$"))
+    dp.add_handler(CallbackQueryHandler(scheduled(edit_transaction_callback), pattern="^edit_\d+$"))
+    dp.add_handler(CallbackQueryHandler(scheduled(delete_transaction_callback), pattern="^delete_\d+$"))
+    dp.add_handler(CallbackQueryHandler(scheduled(confirm_delete_callback), pattern="^confirm_delete_\d+$"))
+    
+    # Добавляем обработчик ошибок
+    dp.add_error_handler(error_handler)
+
+def start_services(bot):
+    """Запустить фоновые службы процесса: цикл asyncio, отложенную запись и очередь разбора"""
+    
+    # Цикл событий для корутинных обработчиков
+    runtime.add_shutdown_hook(ai_parser.async_client.close)
+    runtime.start()
+    
+    if write_behind is not None:
+        write_behind.start()
+    
+    if parse_queue is not None:
+        start_parse_queue(bot)
+
+def service_stats() -> dict:
+    """Счетчики всех служб процесса: для журнала при остановке и для /stats в webhook.py"""
+    
+    stats = {
+        'scheduler': scheduler.stats(),
+        'local_parser': ai_parser.local_parser.stats(),
+        'parse_cache': ai_parser.cache.stats(),
+        'openai': ai_parser.guard.stats(),
+        'openai_tokens': ai_parser.usage.stats(),
+        'renderer': renderer.stats(),
+        'message_edits': message_editor.stats()
+    }
+    if ai_parser.batcher is not None:
+        stats['llm_batcher'] = ai_parser.batcher.stats()
+    if parse_queue is not None:
+        stats['parse_queue'] = parse_queue.stats()
+    if write_behind is not None:
+        stats['write_behind'] = write_behind.stats()
+    return stats
+
+STATS_TITLES = {
+    'scheduler': "Планировщик",
+    'local_parser': "Локальный парсер",
+    'parse_cache': "Кэш парсинга",
+    'llm_batcher': "Пакетирование OpenAI",
+    'openai': "OpenAI",
+    'parse_queue': "Очередь разбора",
+    'renderer': "Экраны",
+    'message_edits': "Правки сообщений",
+    'write_behind': "Отложенная запись"
+}
+
+def stop_services():
+    """Остановить фоновые службы после остановки диспетчера"""
+    
+    # Дожидаемся очередей пользователей
+    scheduler.stop()
+    
+    # Невыполненные задачи разбора остаются в базе очереди до следующего запуска
+    if parse_queue is not None:
+        parse_queue.stop()
+    
+    # Дожидаемся начатых обработчиков и закрываем HTTP-сессию OpenAI
+    runtime.stop()
+    
+    # Дописываем в базу очередь отложенной записи
+    if write_behind is not None:
+        write_behind.stop()
+    
+    stats = service_stats()
+    for name, title in STATS_TITLES.items():
+        if name in stats:
+            print(f"📊 {title}: {stats[name]}")
+    print(f"📊 Токены OpenAI:\n{ai_parser.usage.report()}")
+
+def check_settings() -> bool:
+    """Проверить, что токены заданы"""
     
     if not TELEGRAM_TOKEN:
         print("❌ Токен не найден! Проверьте .env файл")
-        return
+        return False
     
     if not OPENAI_API_KEY:
         print("❌ OpenAI API ключ не найден! Проверьте .env файл")
+        return False
+    
+    return True
+
+def main():
+    """Запуск бота (long polling, один процесс; несколько процессов - webhook.py)"""
+    
+    if not check_settings():
         return
     
     print("🚀 Запускаю финансового бота с историей...")
     
     # Создаем бота
     updater = Updater(token=TELEGRAM_TOKEN, use_context=True)
-    dp = updater.dispatcher
-    
-    # Добавляем обработчики команд
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CommandHandler("help", help_command))
-    dp.add_handler(CommandHandler("history", history_command))  # НОВАЯ КОМАНДА
-    
-    # Добавляем обработчики сообщений
-    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
+    register_handlers(updater.dispatcher)
     
-    # НОВЫЕ обработчики для истории
-    dp.add_handler(CallbackQueryHandler(refresh_history_callback, pattern="^refresh_history$"))
-    dp.add_handler(CallbackQueryHandler(edit_transaction_callback, pattern="^edit_\d+$"))
-    dp.add_handler(CallbackQueryHandler(delete_transaction_callback, pattern="^delete_\d+$"))
-    dp.add_handler(CallbackQueryHandler(confirm_delete_callback, pattern="^confirm_delete_\d+$"))
-    
-    # Добавляем обработчик ошибок
-    dp.add_error_handler(error_handler)
+    start_services(updater.bot)
     
     # Запускаем
     updater.start_polling()
@@ -182,6 +350,8 @@ def main():
     print("   ❓ /help - справка")
     print("   🛑 Нажмите Ctrl+C для остановки")
     updater.idle()
+    
+    stop_services()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""Служебные команды для базы бота.
+
+    python manage.py rebuild-rollups [--user-id ID]
+    python manage.py import --user-id ID [--bank kaspi] выписка.csv
+    python manage.py export --user-id ID [--format parquet] файл
+    python manage.py --shards 4 split-shards
+
+--shards (по умолчанию DB_SHARDS) - на сколько файлов разбита база.
+"""
+import argparse
+import os
+import time
+
+from bank_import import import_statement
+from database_extended import FinanceDatabase
+from transaction_export import EXPORT_FORMATS, export_transactions
+
+
+def rebuild_rollups(args):
+    """Пересчитать дневные итоги из сырых транзакций"""
+    db = FinanceDatabase(args.db, shards=args.shards)
+    rows = db.rebuild_rollups(args.user_id)
+    target = f"пользователя {args.user_id}" if args.user_id is not None else "всех пользователей"
+    print(f"✅ Дневные итоги для {target} пересчитаны: {rows} строк")
+    db.close()
+
+
+def import_file(args):
+    """Импортировать банковскую выписку"""
+    db = FinanceDatabase(args.db, shards=args.shards)
+    db.add_user(args.user_id)
+    started = time.perf_counter()
+    stats = import_statement(db, args.path, args.user_id, bank=args.bank, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Импорт завершен за {elapsed:.2f} с: прочитано {stats['read']}, "
+          f"добавлено {stats['inserted']}, дубликатов {stats['duplicates']}, "
+          f"пропущено {stats['skipped']}")
+    db.close()
+
+
+def export_file(args):
+    """Выгрузить все транзакции пользователя в файл"""
+    db = FinanceDatabase(args.db, shards=args.shards)
+    started = time.perf_counter()
+    stats = export_transactions(db, args.user_id, args.path, args.format, args.chunk_size)
+    elapsed = time.perf_counter() - started
+    rate = stats['rows'] / elapsed if elapsed else 0
+    print(f"✅ Выгружено {stats['rows']} транзакций в {args.path} за {elapsed:.2f} с "
+          f"({rate:,.0f} строк/с)")
+    db.close()
+
+
+def split_shards(args):
+    """Разложить обычную базу --db по --shards файлам"""
+    if args.shards < 2:
+        raise SystemExit("❌ Укажите число шардов: --shards N (N >= 2)")
+    db = FinanceDatabase(args.db, shards=args.shards)
+    started = time.perf_counter()
+    counts = db.split_from(args.db)
+    elapsed = time.perf_counter() - started
+    for path, count in zip(db.shard_paths, counts):
+        print(f"   {path}: {count} транзакций")
+    print(f"✅ База {args.db} разложена на {args.shards} шардов за {elapsed:.2f} с. "
+          f"Запускайте бота с DB_SHARDS={args.shards}")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды финансового бота")
+    parser.add_argument("--db", default="finance_bot.db", help="путь к файлу базы")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("DB_SHARDS", "1")),
+                        help="число файлов-шардов базы")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-rollups", help="пересчитать таблицу daily_rollups")
+    rebuild.add_argument("--user-id", type=int, help="только для одного пользователя")
+    rebuild.set_defaults(handler=rebuild_rollups)
+
+    importer = commands.add_parser("import", help="импортировать выписку CSV/XLSX")
+    importer.add_argument("path", help="файл выписки")
+    importer.add_argument("--user-id", type=int, required=True, help="владелец транзакций")
+    importer.add_argument("--bank", help="банк (по умолчанию - из имени файла)")
+    importer.add_argument("--chunk-size", type=int, default=1000, help="строк в одном executemany")
+    importer.set_defaults(handler=import_file)
+
+    exporter = commands.add_parser("export", help="выгрузить транзакции в CSV/Parquet")
+    exporter.add_argument("path", help="файл выгрузки")
+    exporter.add_argument("--user-id", type=int, required=True, help="чьи транзакции")
+    exporter.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="формат файла")
+    exporter.add_argument("--chunk-size", type=int, help="строк в одной порции fetchmany")
+    exporter.set_defaults(handler=export_file)
+
+    splitter = commands.add_parser("split-shards", help="разложить базу по файлам-шардам")
+    splitter.set_defaults(handler=split_shards)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
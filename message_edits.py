@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+from typing import Dict
+
+from cache import LRUCache
+
+
+def content_hash(text: str, reply_markup=None) -> str:
+    """Хэш текста и клавиатуры сообщения"""
+    markup = reply_markup.to_json() if hasattr(reply_markup, 'to_json') else repr(reply_markup)
+    return hashlib.sha1(f"{text}\x00{markup}".encode('utf-8')).hexdigest()
+
+
+class MessageEditor:
+    """Пропускает editMessageText, если сообщение уже выглядит так же.
+
+    Хранит хэш последнего содержимого каждого сообщения (chat_id, message_id)
+    в LRU-кэше. Повторный показ того же экрана (например, "🔄 Обновить" без
+    новых транзакций) не делает запрос к Bot API и не вызывает ошибку
+    "Message is not modified".
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.hashes = LRUCache(maxsize=maxsize)
+        self.edits = 0
+        self.skipped = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def remember(self, message, text: str, reply_markup=None):
+        """Запомнить содержимое только что отправленного сообщения"""
+        if message is not None:
+            self.hashes.set((message.chat_id, message.message_id), content_hash(text, reply_markup))
+
+    def edit(self, query, text: str, reply_markup=None, **kwargs) -> bool:
+        """Изменить сообщение кнопки, если содержимое другое. True - запрос отправлен"""
+        message = query.message
+        key = (message.chat_id, message.message_id) if message is not None else None
+        digest = content_hash(text, reply_markup)
+
+        if key is not None and self.hashes.get(key) == digest:
+            self._count('skipped')
+            return False
+
+        try:
+            query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+        except Exception as e:
+            # telegram.error.BadRequest: текст и клавиатура совпадают с текущими
+            if 'message is not modified' not in str(e).lower():
+                raise
+            self._count('not_modified')
+        else:
+            self._count('edits')
+
+        if key is not None:
+            self.hashes.set(key, digest)
+        return True
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict:
+        """Сколько запросов к Bot API сэкономлено"""
+        return {
+            'edits': self.edits,
+            'skipped': self.skipped,
+            'not_modified': self.not_modified,
+            'saved_calls': self.skipped
+        }
+
+
+message_editor = MessageEditor(maxsize=int(os.getenv('EDIT_CACHE_SIZE', '10000')))
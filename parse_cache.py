@@ -0,0 +1,160 @@
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cache import LRUCache
+from db_connection import SQLiteConnectionManager
+
+# Числа в сообщении: "800", "1200.50", "2,5"
+NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)?')
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_message(message: str) -> Tuple[str, List[float]]:
+    """Нормализованный шаблон сообщения и числа из него.
+
+    "Кофе  800 тг!" -> ("кофе # тг", [800.0]). Регистр, пробелы и
+    завершающая пунктуация не влияют на ключ кэша.
+    """
+    text = SPACES_RE.sub(' ', message.lower().replace('ё', 'е')).strip(' .!?')
+    numbers = [float(n.replace(',', '.')) for n in NUMBER_RE.findall(text)]
+    return NUMBER_RE.sub('#', text), numbers
+
+
+class ParseCache:
+    """Кэш результатов парсинга сообщений.
+
+    Если сумма транзакции - одно из чисел сообщения, результат хранится
+    под шаблоном с плейсхолдерами: "кофе 800" и "кофе 650" дают один ключ,
+    а сумма подставляется из нового сообщения. Иначе ключ - точный
+    нормализованный текст. Второй уровень (db_path) - таблица SQLite,
+    которая переживает перезапуск бота; просроченные строки удаляются при
+    обращении к ним, при запуске и каждые PURGE_EVERY записей.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, maxsize: int = 2048, ttl: Optional[float] = 7 * 24 * 3600,
+                 db_path: Optional[str] = None):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.purged = 0
+        self._writes = 0
+
+        self.connections = SQLiteConnectionManager(db_path) if db_path else None
+        if self.connections:
+            with self.connections.connection() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS parse_cache (
+                        key TEXT PRIMARY KEY,
+                        result TEXT NOT NULL,
+                        amount_index INTEGER,
+                        created_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_parse_cache_created
+                    ON parse_cache (created_at)
+                """)
+            self.purge_expired()
+
+    def get(self, message: str) -> Optional[Dict]:
+        """Закэшированный результат для сообщения или None"""
+        template, numbers = normalize_message(message)
+
+        for key in (f"t:{template}", f"x:{template}:{numbers}"):
+            entry = self._lookup(key)
+            if entry is None:
+                continue
+
+            result, amount_index = entry
+            result = dict(result)
+            if amount_index is not None:
+                if amount_index >= len(numbers):
+                    continue
+                result['amount'] = numbers[amount_index]
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        return None
+
+    def set(self, message: str, result: Dict):
+        """Сохранить успешный результат парсинга"""
+        if not result.get('success'):
+            return
+
+        template, numbers = normalize_message(message)
+        amount_index = None
+        amount = result.get('amount')
+        if amount is not None and numbers.count(float(amount)) == 1:
+            amount_index = numbers.index(float(amount))
+
+        if amount_index is not None:
+            key = f"t:{template}"
+        else:
+            key = f"x:{template}:{numbers}"
+
+        entry = (dict(result), amount_index)
+        self.memory.set(key, entry)
+
+        if self.connections:
+            with self.connections.connection() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO parse_cache (key, result, amount_index, created_at)
+                    VALUES (?, ?, ?, ?)
+                """, (key, json.dumps(result, ensure_ascii=False), amount_index, time.time()))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Удалить с диска просроченные записи; сколько удалено"""
+        if not self.connections or not self.ttl:
+            return 0
+        with self.connections.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM parse_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+        self.purged += deleted
+        return deleted
+
+    def _lookup(self, key: str) -> Optional[Tuple[Dict, Optional[int]]]:
+        """Найти запись в памяти, затем на диске"""
+        entry = self.memory.get(key)
+        if entry is not None or not self.connections:
+            return entry
+
+        with self.connections.connection() as conn:
+            row = conn.execute("""
+                SELECT result, amount_index, created_at FROM parse_cache WHERE key = ?
+            """, (key,)).fetchone()
+        if not row:
+            return None
+        if self.ttl and row[2] + self.ttl < time.time():
+            # Просроченная запись больше не пригодится - не держим ее в файле
+            with self.connections.connection() as conn:
+                conn.execute("DELETE FROM parse_cache WHERE key = ? AND created_at = ?", (key, row[2]))
+            self.purged += 1
+            return None
+
+        entry = (json.loads(row[0]), row[1])
+        self.memory.set(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'purged': self.purged,
+            'hit_rate': self.hits / total if total else 0.0,
+            'memory_size': len(self.memory)
+        }
@@ -0,0 +1,287 @@
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from db_connection import SQLiteConnectionManager
+
+
+class ParseJobQueue:
+    """Надежная очередь разбора сообщений в SQLite.
+
+    enqueue() сразу сохраняет исходное сообщение и возвращает номер задачи -
+    пользователь получает подтверждение, не дожидаясь OpenAI. Фоновые
+    потоки берут задачи по очереди, разбирают их через parse и сохраняют
+    транзакцию через save, затем сообщают результат через notify.
+
+    Если API недоступен (результат с unavailable или исключение), задача
+    откладывается с экспоненциальной задержкой и случайным разбросом; после
+    max_attempts попыток она помечается как failed. Задачи одного
+    пользователя не выполняются одновременно. Задачи, прерванные падением
+    процесса, при следующем запуске возвращаются в очередь; save получает
+    ключ задачи (job['key'], случайный UUID), чтобы повторная запись не
+    дублировала транзакцию. Номер задачи для этого не годится: он уникален
+    только в одном файле очереди и повторяется, если файл пересоздан или
+    пользователь попал в другой файл после смены числа процессов.
+    """
+
+    PENDING, RUNNING, FAILED = 'pending', 'running', 'failed'
+
+    def __init__(self, db_path: str, workers: int = 2, max_attempts: int = 8,
+                 base_delay: float = 5.0, max_delay: float = 600.0, poll_interval: float = 5.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+
+        self.enqueued = 0
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+
+        self.connections = SQLiteConnectionManager(db_path)
+        self._threads = []
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._init_table()
+
+    def _init_table(self):
+        with self.connections.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS parse_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    job_key TEXT
+                )
+            """)
+            # Очереди, созданные до появления ключа задачи
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(parse_jobs)")}
+            if 'job_key' not in columns:
+                conn.execute("ALTER TABLE parse_jobs ADD COLUMN job_key TEXT")
+            conn.execute(
+                "UPDATE parse_jobs SET job_key = lower(hex(randomblob(16))) WHERE job_key IS NULL"
+            )
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_parse_jobs_due
+                ON parse_jobs (status, next_attempt_at)
+            """)
+            # Задачи, которые выполнялись при падении процесса
+            recovered = conn.execute(
+                "UPDATE parse_jobs SET status = ? WHERE status = ?", (self.PENDING, self.RUNNING)
+            ).rowcount
+        if recovered:
+            print(f"♻️ Возвращено в очередь разбора: {recovered} сообщений")
+
+    def enqueue(self, user_id: int, chat_id: int, message: str) -> Optional[int]:
+        """Сохранить сообщение для разбора. Номер задачи или None при ошибке"""
+        now = time.time()
+        try:
+            with self.connections.connection() as conn:
+                job_id = conn.execute("""
+                    INSERT INTO parse_jobs (user_id, chat_id, message, next_attempt_at, created_at, job_key)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (user_id, chat_id, message, now, now, uuid.uuid4().hex)).lastrowid
+        except Exception as e:
+            print(f"❌ Ошибка постановки сообщения в очередь разбора: {e}")
+            return None
+
+        with self._cond:
+            self.enqueued += 1
+            self._cond.notify()
+        return job_id
+
+    def _claim(self) -> Optional[Dict]:
+        """Взять самую раннюю готовую задачу пользователя, у которого ничего не выполняется"""
+        # Один UPDATE ... RETURNING: два потока не возьмут одну задачу
+        with self.connections.connection() as conn:
+            row = conn.execute("""
+                UPDATE parse_jobs SET status = ?
+                WHERE id = (
+                    SELECT id FROM parse_jobs
+                    WHERE status = ? AND next_attempt_at <= ?
+                      AND user_id NOT IN (SELECT user_id FROM parse_jobs WHERE status = ?)
+                    ORDER BY next_attempt_at, id
+                    LIMIT 1
+                )
+                RETURNING id, user_id, chat_id, message, attempts, created_at, job_key
+            """, (self.RUNNING, self.PENDING, time.time(), self.RUNNING)).fetchone()
+        if row is None:
+            return None
+
+        return {
+            'id': row[0],
+            'user_id': row[1],
+            'chat_id': row[2],
+            'message': row[3],
+            'attempts': row[4],
+            'created_at': row[5],
+            'key': row[6]
+        }
+
+    def _next_due(self) -> Optional[float]:
+        """Когда наступит срок ближайшей отложенной задачи"""
+        row = self.connections.connection().execute(
+            "SELECT MIN(next_attempt_at) FROM parse_jobs WHERE status = ?", (self.PENDING,)
+        ).fetchone()
+        return row[0]
+
+    def retry_delay(self, attempts: int) -> float:
+        """Задержка после attempts неудачных попыток: растет вдвое, со случайным разбросом"""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    def run_once(self, parse: Callable[[str], Dict], save: Callable[[Dict, Dict], bool],
+                 notify: Callable[[Dict, Dict], None]) -> bool:
+        """Выполнить одну готовую задачу в текущем потоке. False - готовых задач нет"""
+        job = self._claim()
+        if job is None:
+            return False
+
+        try:
+            result = parse(job['message'])
+        except Exception as e:
+            result = {"success": False, "error": str(e), "unavailable": True}
+
+        if result.get('success'):
+            try:
+                saved = save(job, result)
+            except Exception as e:
+                # Результат, который нельзя записать, не станет лучше от повторов;
+                # задача не должна остаться в running и заблокировать пользователя
+                print(f"❌ Ошибка сохранения результата разбора: {e}")
+                result = {"success": False, "error": f"Ошибка при сохранении транзакции: {e}"}
+            else:
+                if not saved:
+                    # База недоступна - это повод попробовать позже
+                    result = {"success": False, "error": "Ошибка при сохранении транзакции",
+                              "unavailable": True}
+
+        attempts = job['attempts'] + 1
+        if result.get('unavailable') and attempts < self.max_attempts:
+            self._reschedule(job['id'], attempts, result.get('error'))
+            return True
+
+        with self.connections.connection() as conn:
+            if result.get('success'):
+                conn.execute("DELETE FROM parse_jobs WHERE id = ?", (job['id'],))
+            else:
+                # Неудачные задачи остаются в таблице для разбора вручную
+                conn.execute("""
+                    UPDATE parse_jobs SET status = ?, attempts = ?, last_error = ? WHERE id = ?
+                """, (self.FAILED, attempts, result.get('error'), job['id']))
+        with self._cond:
+            if result.get('success'):
+                self.done += 1
+            else:
+                self.failed += 1
+            # Освободился пользователь - его следующая задача может быть готова
+            self._cond.notify()
+
+        try:
+            notify(job, result)
+        except Exception as e:
+            print(f"❌ Ошибка отправки результата разбора: {e}")
+        return True
+
+    def _reschedule(self, job_id: int, attempts: int, error: Optional[str]):
+        with self.connections.connection() as conn:
+            conn.execute("""
+                UPDATE parse_jobs SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?
+                WHERE id = ?
+            """, (self.PENDING, attempts, error, time.time() + self.retry_delay(attempts), job_id))
+        with self._cond:
+            self.retried += 1
+            self._cond.notify()
+
+    def start(self, parse: Callable[[str], Dict], save: Callable[[Dict, Dict], bool],
+              notify: Callable[[Dict, Dict], None]):
+        """Запустить фоновые потоки разбора.
+
+        parse(message) -> результат AIParser, save(job, result) -> записана ли
+        транзакция, notify(job, result) - сообщить пользователю.
+        """
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, args=(parse, save, notify),
+                                 name=f"parse-queue-{index}", daemon=True)
+                for index in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self, parse, save, notify):
+        while not self._stopping:
+            try:
+                if self.run_once(parse, save, notify):
+                    continue
+                due = self._next_due()
+            except Exception as e:
+                print(f"❌ Ошибка очереди разбора: {e}")
+                due = None
+
+            # Ждем новую задачу или срок ближайшей отложенной
+            timeout = self.poll_interval
+            if due is not None:
+                timeout = min(timeout, max(due - time.time(), 0.01))
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Остановить потоки; невыполненные задачи остаются в базе до следующего запуска"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self.connections.close_all()
+
+    def stats(self) -> Dict:
+        """Размер очереди и исходы задач"""
+        counts = dict(self.connections.connection().execute(
+            "SELECT status, COUNT(*) FROM parse_jobs GROUP BY status"
+        ).fetchall())
+        with self._cond:
+            return {
+                'pending': counts.get(self.PENDING, 0) + counts.get(self.RUNNING, 0),
+                'failed_total': counts.get(self.FAILED, 0),
+                'enqueued': self.enqueued,
+                'done': self.done,
+                'retried': self.retried,
+                'failed': self.failed
+            }
+
+
+def create_parse_queue() -> Optional[ParseJobQueue]:
+    """Очередь из настроек окружения или None, если она выключена"""
+    if os.getenv('PARSE_QUEUE', '1') != '1':
+        return None
+    db_path = os.getenv('PARSE_QUEUE_DB', 'parse_queue.db')
+    worker = os.getenv('WEB_WORKER_INDEX')
+    if worker is not None:
+        # У каждого процесса webhook.py своя очередь: при запуске процесс
+        # возвращает в работу "зависшие" задачи, чужие трогать нельзя
+        db_path = f"{db_path}.{worker}"
+    return ParseJobQueue(
+        db_path,
+        workers=int(os.getenv('PARSE_QUEUE_WORKERS', '4')),
+        max_attempts=int(os.getenv('PARSE_QUEUE_MAX_ATTEMPTS', '8')),
+        base_delay=float(os.getenv('PARSE_QUEUE_RETRY_DELAY', '5'))
+    )
+
+
+parse_queue = create_parse_queue()
@@ -0,0 +1,549 @@
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from cache import LRUCache
+from storage import Storage, day_range, to_date, transfer_accounts, transfer_bank
+
+
+class PostgresStorage(Storage):
+    """Хранилище в PostgreSQL с пулом соединений.
+
+    Та же схема и те же методы, что у FinanceDatabase, но писатели разных
+    пользователей не ждут друг друга, а итоги считаются на сервере.
+    Нужен пакет psycopg2 (pip install psycopg2-binary).
+    """
+
+    # Схема создается сразу в текущем виде (соответствует миграциям SQLite).
+    # Внешних ключей на users нет, как и в SQLite, где они не включены:
+    # строку пользователя может создать сама запись транзакции.
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS users (
+               user_id BIGINT PRIMARY KEY,
+               username TEXT,
+               first_name TEXT,
+               created_at TIMESTAMP(0) DEFAULT (now() AT TIME ZONE 'utc'),
+               initial_setup_completed BOOLEAN DEFAULT FALSE,
+               data_version BIGINT NOT NULL DEFAULT 0
+           )""",
+        """CREATE TABLE IF NOT EXISTS transactions (
+               id BIGSERIAL PRIMARY KEY,
+               user_id BIGINT,
+               amount DOUBLE PRECISION NOT NULL,
+               currency TEXT DEFAULT 'KZT',
+               category TEXT NOT NULL,
+               description TEXT,
+               bank TEXT,
+               transaction_type TEXT DEFAULT 'expense'
+                   CHECK (transaction_type IN ('income', 'expense', 'transfer')),
+               confidence DOUBLE PRECISION DEFAULT 1.0,
+               raw_message TEXT,
+               created_at TIMESTAMP(0) DEFAULT (now() AT TIME ZONE 'utc'),
+               transaction_date DATE DEFAULT CURRENT_DATE,
+               external_id TEXT
+           )""",
+        """CREATE TABLE IF NOT EXISTS account_balances (
+               id BIGSERIAL PRIMARY KEY,
+               user_id BIGINT,
+               account_name TEXT NOT NULL,
+               account_type TEXT DEFAULT 'card',
+               balance DOUBLE PRECISION DEFAULT 0,
+               currency TEXT DEFAULT 'KZT',
+               created_at TIMESTAMP(0) DEFAULT (now() AT TIME ZONE 'utc'),
+               updated_at TIMESTAMP(0) DEFAULT (now() AT TIME ZONE 'utc'),
+               UNIQUE (user_id, account_name)
+           )""",
+        """CREATE TABLE IF NOT EXISTS daily_rollups (
+               user_id BIGINT NOT NULL,
+               day DATE NOT NULL,
+               transaction_type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total DOUBLE PRECISION NOT NULL DEFAULT 0,
+               count BIGINT NOT NULL DEFAULT 0,
+               PRIMARY KEY (user_id, day, transaction_type, category)
+           )""",
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+           ON transactions (user_id, transaction_date, transaction_type, category, amount)""",
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_created
+           ON transactions (user_id, created_at, id)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_external
+           ON transactions (user_id, external_id) WHERE external_id IS NOT NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_category_created
+           ON transactions (user_id, category, created_at, id)""",
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_type_created
+           ON transactions (user_id, transaction_type, created_at, id)""",
+        """CREATE INDEX IF NOT EXISTS idx_transactions_user_bank_created
+           ON transactions (user_id, bank, created_at, id)""",
+    ]
+
+    # Колонки транзакции для истории, даты - строками, как в SQLite
+    TRANSACTION_SELECT = """
+        id, amount, currency, category, description, bank, transaction_type,
+        transaction_date::text, to_char(created_at, 'YYYY-MM-DD HH24:MI:SS')
+    """
+    TRANSACTION_FIELDS = ('id', 'amount', 'currency', 'category', 'description', 'bank',
+                          'type', 'date', 'created_at')
+
+    def __init__(self, dsn: str, pool_size: int = 10, schema: Optional[str] = None,
+                 known_users_size: int = 100000):
+        try:
+            import psycopg2
+            import psycopg2.extras
+            import psycopg2.pool
+        except ImportError:
+            raise RuntimeError("Для PostgreSQL нужен пакет psycopg2: pip install psycopg2-binary")
+        self._extras = psycopg2.extras
+        self._pool_class = psycopg2.pool.ThreadedConnectionPool
+
+        self.dsn = dsn
+        self.schema = schema
+        self.pool_size = pool_size
+        self._open_pool()
+        # Пользователи, уже записанные в users: user_id -> (username, first_name)
+        self.known_users = LRUCache(maxsize=known_users_size)
+        # Версии данных: user_id -> версия; база читается только при промахе
+        self.data_versions = LRUCache(maxsize=known_users_size)
+        self._version_lock = threading.Lock()
+        # Версии, измененные незакоммиченной транзакцией текущего потока
+        self._local = threading.local()
+        self.init_database()
+
+    def _open_pool(self):
+        options = {'options': f"-c search_path={self.schema}"} if self.schema else {}
+        self._pid = os.getpid()
+        self.pool = self._pool_class(1, self.pool_size, self.dsn, **options)
+        # ThreadedConnectionPool не ждет свободного соединения, а бросает
+        # исключение - ограничиваем число одновременных запросов сами
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    @contextmanager
+    def _transaction(self):
+        """Курсор в транзакции на соединении из пула: коммит в конце, откат при исключении"""
+        if self._pid != os.getpid():
+            # После fork соединения родителя не трогаем - у процесса свой пул
+            self._open_pool()
+        with self._slots:
+            conn = self.pool.getconn()
+            versions = self._local.versions = {}
+            try:
+                with conn:
+                    with conn.cursor() as cursor:
+                        yield cursor
+            finally:
+                self._local.versions = None
+                self.pool.putconn(conn)
+        # Транзакция закоммичена - новые версии можно отдавать читателям
+        for user_id, version in versions.items():
+            self._store_version(user_id, version)
+
+    def close(self):
+        """Закрыть все соединения пула"""
+        self.pool.closeall()
+
+    def init_database(self):
+        """Создать схему, если ее еще нет"""
+        with self._transaction() as cursor:
+            if self.schema:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+            for statement in self.SCHEMA:
+                cursor.execute(statement)
+        print("✅ База данных PostgreSQL инициализирована")
+
+    def get_data_version(self, user_id: int) -> int:
+        """Версия данных пользователя (0 - изменений не было); из памяти, база - при промахе"""
+        version = self.data_versions.get(user_id)
+        if version is not None:
+            return version
+
+        with self._transaction() as cursor:
+            cursor.execute("SELECT data_version FROM users WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone()
+        return self._store_version(user_id, row[0] if row else 0)
+
+    def _bump_version(self, cursor, user_ids):
+        """Увеличить версию данных в той же транзакции, что и сама запись.
+
+        Новые версии попадают в кэш после коммита (в _transaction).
+        """
+        rows = self._extras.execute_values(cursor, """
+            INSERT INTO users (user_id, data_version) VALUES %s
+            ON CONFLICT (user_id) DO UPDATE SET data_version = users.data_version + 1
+            RETURNING user_id, data_version
+        """, [(user_id, 1) for user_id in sorted(user_ids)], fetch=True)
+        self._local.versions.update(rows)
+
+    def _store_version(self, user_id: int, version: int) -> int:
+        """Запомнить версию, если она не старше уже известной; вернуть актуальную"""
+        with self._version_lock:
+            cached = self.data_versions.get(user_id)
+            if cached is None or cached < version:
+                self.data_versions.set(user_id, version)
+                return version
+            return cached
+
+    def add_user(self, user_id: int, username: str = None, first_name: str = None):
+        """Добавляет нового пользователя или обновляет его имя"""
+        if self.known_users.get(user_id) == (username, first_name):
+            return
+
+        with self._transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO users (user_id, username, first_name)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    username = COALESCE(excluded.username, users.username),
+                    first_name = COALESCE(excluded.first_name, users.first_name)
+            """, (user_id, username, first_name))
+
+        self.known_users.set(user_id, (username, first_name))
+
+    def add_transaction(self, transaction_data: Dict) -> bool:
+        """Добавляет новую транзакцию"""
+        try:
+            # 0 добавленных - транзакция с этим external_id уже записана
+            self.add_transactions_bulk([transaction_data])
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка добавления транзакции: {e}")
+            return False
+
+    def add_transactions_bulk(self, transactions: Iterable[Dict], chunk_size: int = 1000) -> int:
+        """Добавить много транзакций одной транзакцией.
+
+        Строки с уже известным external_id пропускаются: INSERT ... RETURNING
+        возвращает только добавленные строки, и по ним же меняются дневные
+        итоги. Возвращает число добавленных строк; при ошибке откатывает все
+        и пробрасывает исключение.
+        """
+        iterator = iter(transactions)
+        inserted = 0
+        # Приращения дневных итогов: (user_id, день, тип, категория) -> [сумма, количество]
+        deltas = {}
+
+        with self._transaction() as cursor:
+            while True:
+                chunk = []
+                for data in islice(iterator, chunk_size):
+                    chunk.append((
+                        data['user_id'],
+                        data['amount'],
+                        data.get('currency', 'KZT'),
+                        data['category'],
+                        data.get('description', ''),
+                        data.get('bank'),
+                        data.get('type', 'expense'),
+                        data.get('confidence', 1.0),
+                        data.get('raw_message', ''),
+                        to_date(data.get('date', datetime.now().date())),
+                        data.get('external_id')
+                    ))
+
+                if not chunk:
+                    break
+
+                rows = self._extras.execute_values(cursor, """
+                    INSERT INTO transactions
+                    (user_id, amount, currency, category, description, bank,
+                     transaction_type, confidence, raw_message, transaction_date, external_id)
+                    VALUES %s
+                    ON CONFLICT (user_id, external_id) WHERE external_id IS NOT NULL DO NOTHING
+                    RETURNING user_id, transaction_date, transaction_type, category, amount
+                """, chunk, page_size=len(chunk), fetch=True)
+
+                inserted += len(rows)
+                for user_id, day, transaction_type, category, amount in rows:
+                    delta = deltas.setdefault((user_id, day, transaction_type, category), [0, 0])
+                    delta[0] += amount
+                    delta[1] += 1
+
+            if deltas:
+                self._apply_rollups(cursor, [(*key, amount, count)
+                                             for key, (amount, count) in sorted(deltas.items())])
+                self._bump_version(cursor, {key[0] for key in deltas})
+
+        return inserted
+
+    def _apply_rollups(self, cursor, rows: List[tuple]):
+        """Изменить дневные итоги: строки (user_id, день, тип, категория, сумма, количество)"""
+        self._extras.execute_values(cursor, """
+            INSERT INTO daily_rollups (user_id, day, transaction_type, category, total, count)
+            VALUES %s
+            ON CONFLICT (user_id, day, transaction_type, category) DO UPDATE SET
+                total = daily_rollups.total + excluded.total,
+                count = daily_rollups.count + excluded.count
+        """, rows)
+
+        if any(row[5] < 0 for row in rows):
+            cursor.execute("DELETE FROM daily_rollups WHERE user_id = %s AND count <= 0",
+                           (rows[0][0],))
+
+    def rebuild_rollups(self, user_id: Optional[int] = None) -> int:
+        """Пересчитать дневные итоги из transactions (для всех или одного пользователя)"""
+        where, params = ("WHERE user_id = %s", (user_id,)) if user_id is not None else ("", ())
+        with self._transaction() as cursor:
+            cursor.execute(f"DELETE FROM daily_rollups {where}", params)
+            cursor.execute(f"""
+                INSERT INTO daily_rollups (user_id, day, transaction_type, category, total, count)
+                SELECT user_id, transaction_date, transaction_type, category, SUM(amount), COUNT(*)
+                FROM transactions
+                {where}
+                GROUP BY user_id, transaction_date, transaction_type, category
+            """, params)
+            return cursor.rowcount
+
+    def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Dict]:
+        """Получить транзакцию по ID"""
+        with self._transaction() as cursor:
+            cursor.execute(f"""
+                SELECT {self.TRANSACTION_SELECT}
+                FROM transactions
+                WHERE id = %s AND user_id = %s
+            """, (transaction_id, user_id))
+            row = cursor.fetchone()
+            return dict(zip(self.TRANSACTION_FIELDS, row)) if row else None
+
+    def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удалить транзакцию (удаление перевода возвращает балансы обоих счетов)"""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    DELETE FROM transactions
+                    WHERE id = %s AND user_id = %s
+                    RETURNING transaction_date, transaction_type, category, amount, bank
+                """, (transaction_id, user_id))
+                row = cursor.fetchone()
+                if not row:
+                    return False
+
+                day, transaction_type, category, amount, bank = row
+                self._apply_rollups(cursor, [(user_id, day, transaction_type, category, -amount, -1)])
+                accounts = transfer_accounts(bank) if transaction_type == 'transfer' else None
+                if accounts:
+                    from_account, to_account = accounts
+                    self._change_balance(cursor, user_id, from_account, amount)
+                    self._change_balance(cursor, user_id, to_account, -amount)
+                self._bump_version(cursor, {user_id})
+                return True
+        except Exception as e:
+            print(f"❌ Ошибка удаления транзакции: {e}")
+            return False
+
+    def get_transactions_page(self, user_id: int, cursor: Optional[tuple] = None,
+                              direction: str = 'older', limit: int = 10,
+                              filters: Optional[Dict] = None) -> Dict:
+        """Страница истории от курсора (created_at, id), новые сверху"""
+        if direction not in ('older', 'newer'):
+            raise ValueError(f"Неизвестное направление: {direction}")
+
+        conditions, params = ["user_id = %s"], [user_id]
+        for name, value in (filters or {}).items():
+            if name not in self.HISTORY_FILTERS:
+                raise ValueError(f"Неизвестный фильтр: {name}")
+            conditions.append(f"{self.HISTORY_FILTERS[name]} = %s")
+            params.append(value)
+
+        order = "DESC"
+        if cursor is not None:
+            if direction == 'older':
+                conditions.append("(created_at, id) < (%s::timestamp, %s)")
+            else:
+                conditions.append("(created_at, id) > (%s::timestamp, %s)")
+                order = "ASC"
+            params.extend(cursor)
+
+        with self._transaction() as cursor_db:
+            # Лишняя строка показывает, есть ли что-то дальше
+            cursor_db.execute(f"""
+                SELECT {self.TRANSACTION_SELECT}
+                FROM transactions
+                WHERE {' AND '.join(conditions)}
+                ORDER BY created_at {order}, id {order}
+                LIMIT %s
+            """, (*params, limit + 1))
+            rows = cursor_db.fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+
+        return {
+            'transactions': [dict(zip(self.TRANSACTION_FIELDS, row)) for row in rows],
+            'has_older': has_more if direction == 'older' else cursor is not None,
+            'has_newer': has_more if direction == 'newer' else cursor is not None
+        }
+
+    def iter_user_transactions(self, user_id: int, chunk_size: int = 1000) -> Iterator[List[tuple]]:
+        """Все транзакции пользователя порциями по chunk_size строк (в порядке добавления).
+
+        Читается через именованный (серверный) курсор: строки приходят с
+        сервера порциями, а не все сразу.
+        """
+        columns = ', '.join(
+            "transaction_date::text" if column == 'transaction_date' else
+            "to_char(created_at, 'YYYY-MM-DD HH24:MI:SS')" if column == 'created_at' else column
+            for column in self.EXPORT_COLUMNS
+        )
+        with self._transaction() as plain_cursor:
+            with plain_cursor.connection.cursor(name=f"export_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(f"""
+                    SELECT {columns}
+                    FROM transactions
+                    WHERE user_id = %s
+                    ORDER BY created_at, id
+                """, (user_id,))
+
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    def get_user_statistics(self, user_id: int, period_days: int = 30) -> Dict:
+        """Получить статистику пользователя за период"""
+        start_date = (datetime.now() - timedelta(days=period_days)).date()
+
+        with self._transaction() as cursor:
+            cursor.execute("""
+                SELECT category, SUM(amount) AS total, COUNT(*) AS count
+                FROM transactions
+                WHERE user_id = %s AND transaction_date >= %s AND transaction_type = 'expense'
+                GROUP BY category
+                ORDER BY total DESC
+            """, (user_id, start_date))
+            expenses_by_category = [
+                {'category': row[0], 'amount': row[1], 'count': row[2]}
+                for row in cursor.fetchall()
+            ]
+
+            cursor.execute("""
+                SELECT SUM(amount)
+                FROM transactions
+                WHERE user_id = %s AND transaction_date >= %s AND transaction_type = 'income'
+            """, (user_id, start_date))
+            total_income = cursor.fetchone()[0] or 0
+
+        return {
+            'expenses_by_category': expenses_by_category,
+            'total_expenses': sum(stat['amount'] for stat in expenses_by_category),
+            'total_income': total_income,
+            'period_days': period_days
+        }
+
+    def get_transactions_by_date(self, user_id: int, date) -> List[Dict]:
+        """Получить транзакции за конкретную дату"""
+        with self._transaction() as cursor:
+            cursor.execute(f"""
+                SELECT {self.TRANSACTION_SELECT}
+                FROM transactions
+                WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
+                ORDER BY created_at DESC, id DESC
+            """, (user_id, *day_range(date)))
+            return [dict(zip(self.TRANSACTION_FIELDS, row)) for row in cursor.fetchall()]
+
+    def _select_aggregates(self, user_id: int, start, end, group_by: tuple) -> List[tuple]:
+        select = ", ".join(("transaction_type",) + group_by)
+        columns = ", ".join(("transaction_type",) + tuple(
+            "day::text" if column == 'day' else column for column in group_by
+        ))
+        with self._transaction() as cursor:
+            cursor.execute(f"""
+                SELECT {columns}, SUM(total), SUM(count)::bigint
+                FROM daily_rollups
+                WHERE user_id = %s AND day >= %s AND day < %s
+                GROUP BY {select}
+            """, (user_id, start, end))
+            return cursor.fetchall()
+
+    def add_transfer(self, user_id: int, amount: float, from_account: str,
+                     to_account: str, description: str = "", raw_message: str = "") -> bool:
+        """Добавить перевод между счетами и изменить балансы обоих счетов (одной транзакцией)"""
+        try:
+            transaction_date = datetime.now().date()
+
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO transactions
+                    (user_id, amount, currency, category, description, bank,
+                     transaction_type, confidence, raw_message, transaction_date)
+                    VALUES (%s, %s, 'KZT', 'перевод', %s, %s, 'transfer', 1.0, %s, %s)
+                """, (
+                    user_id,
+                    amount,
+                    description or f"Перевод с {from_account} на {to_account}",
+                    transfer_bank(from_account, to_account),
+                    raw_message,
+                    transaction_date
+                ))
+                self._apply_rollups(cursor, [(user_id, transaction_date, 'transfer', 'перевод', amount, 1)])
+
+                # Деньги уходят с одного счета и приходят на другой
+                self._change_balance(cursor, user_id, from_account, -amount)
+                self._change_balance(cursor, user_id, to_account, amount)
+                self._bump_version(cursor, {user_id})
+            return True
+
+        except Exception as e:
+            print(f"❌ Ошибка добавления перевода: {e}")
+            return False
+
+    def _change_balance(self, cursor, user_id: int, account_name: str, amount_change: float):
+        """Изменить баланс одним выражением (счет создается, если его нет)"""
+        cursor.execute("""
+            INSERT INTO account_balances (user_id, account_name, balance)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, account_name) DO UPDATE SET
+                balance = account_balances.balance + excluded.balance,
+                updated_at = now() AT TIME ZONE 'utc'
+        """, (user_id, account_name, amount_change))
+
+    def update_account_balance(self, user_id: int, account_name: str, amount_change: float) -> bool:
+        """Обновить баланс счета"""
+        try:
+            with self._transaction() as cursor:
+                self._change_balance(cursor, user_id, account_name, amount_change)
+                self._bump_version(cursor, {user_id})
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка обновления баланса: {e}")
+            return False
+
+    def get_account_balances(self, user_id: int) -> List[Dict]:
+        """Получить все балансы счетов пользователя"""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                SELECT account_name, account_type, balance, currency,
+                       to_char(updated_at, 'YYYY-MM-DD HH24:MI:SS')
+                FROM account_balances
+                WHERE user_id = %s
+                ORDER BY account_name
+            """, (user_id,))
+            return [
+                {'account_name': row[0], 'account_type': row[1], 'balance': row[2],
+                 'currency': row[3], 'updated_at': row[4]}
+                for row in cursor.fetchall()
+            ]
+
+    def add_account_balance(self, user_id: int, account_name: str, balance: float,
+                            account_type: str = 'card') -> bool:
+        """Добавить или обновить баланс счета"""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO account_balances (user_id, account_name, account_type, balance)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (user_id, account_name) DO UPDATE SET
+                        account_type = excluded.account_type,
+                        balance = excluded.balance,
+                        updated_at = now() AT TIME ZONE 'utc'
+                """, (user_id, account_name, account_type, balance))
+                self._bump_version(cursor, {user_id})
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка добавления баланса: {e}")
+            return False
@@ -0,0 +1,256 @@
+"""Тексты экранов истории и статистики и кэш готовых экранов.
+
+Шаблоны строк собраны заранее (bound-методы str.format), текст экрана
+собирается списком частей и одним ''.join. Renderer запоминает готовый
+экран по (пользователь, экран, аргументы, версия данных): пока данные
+пользователя не менялись, повторный показ не ходит в SQLite и не
+форматирует текст заново.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from typing import Callable, Dict, Hashable, List
+
+from cache import LRUCache
+from database_extended import db
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+# Шаблоны строк
+TRANSACTION_ENTRY = (
+    "{index}. {emoji} *{amount:,.0f} {currency}*\n"
+    "   📅 {date} • 🏷️ {category}\n"
+    "   📝 {description}\n"
+).format
+BANK_LINE = "   🏦 {}\n".format
+FILTER_LINE = "🔎 Фильтр: {}\n".format
+BALANCE_LINE = "{emoji} {account_name}: {balance:,.0f} {currency}\n".format
+DETAIL_LINE = "• {description}: {amount:,.0f} тг{bank}\n".format
+TRANSFER_LINE = "• {description}: {amount:,.0f} тг\n".format
+CATEGORY_SHARE_LINE = "• {category}: {amount:,.0f} тг ({percentage:.1f}%)\n".format
+WEEKDAY_LINE = "• {weekday} {date:%d.%m}: {amount:,.0f} тг\n".format
+PERIOD_TOTALS = (
+    "💰 Доходы: {income:,.0f} тг\n"
+    "💸 Расходы: {expense:,.0f} тг\n"
+    "📈 Баланс: {balance:+,.0f} тг\n\n"
+).format
+
+
+def format_history(transactions: List[Dict], title: str, filter_label: str = None) -> str:
+    """Текст страницы истории"""
+    parts = [title, "\n"]
+    if filter_label:
+        parts.append(FILTER_LINE(filter_label))
+    parts.append("\n")
+
+    for index, trans in enumerate(transactions, 1):
+        parts.append(TRANSACTION_ENTRY(
+            index=index,
+            emoji="💰" if trans['type'] == 'income' else "💸",
+            amount=trans['amount'],
+            currency=trans['currency'],
+            date=trans['date'],
+            category=trans['category'],
+            description=trans['description']
+        ))
+        if trans['bank']:
+            parts.append(BANK_LINE(trans['bank']))
+        parts.append("\n")
+
+    return "".join(parts)
+
+
+def _details(title: str, transactions: List[Dict]) -> List[str]:
+    parts = [title]
+    for trans in transactions:
+        parts.append(DETAIL_LINE(
+            description=trans['description'],
+            amount=trans['amount'],
+            bank=f" ({trans['bank']})" if trans['bank'] else ""
+        ))
+    parts.append("\n")
+    return parts
+
+
+def format_day_statistics(date, transactions: List[Dict], balances: List[Dict]) -> str:
+    """Текст статистики за день"""
+    expenses = [t for t in transactions if t['type'] == 'expense']
+    income = [t for t in transactions if t['type'] == 'income']
+    transfers = [t for t in transactions if t['type'] == 'transfer']
+    total_expenses = sum(t['amount'] for t in expenses)
+    total_income = sum(t['amount'] for t in income)
+
+    parts = [f"📊 *Статистика за {WEEKDAYS[date.weekday()]}, {date:%d.%m.%Y}:*\n\n"]
+
+    # Балансы карт
+    if balances:
+        parts.append("💳 *Текущие балансы:*\n")
+        for balance in balances:
+            name = balance['account_name'].lower()
+            parts.append(BALANCE_LINE(
+                emoji="💳" if "kaspi" in name or "halyk" in name else "💵",
+                account_name=balance['account_name'],
+                balance=balance['balance'],
+                currency=balance['currency']
+            ))
+        parts.append("\n")
+
+    # Доходы и расходы
+    if total_income > 0:
+        parts.append(f"💰 *Доходы:* {total_income:,.0f} тг\n")
+    if total_expenses > 0:
+        parts.append(f"💸 *Расходы:* {total_expenses:,.0f} тг\n")
+    if total_income > 0 or total_expenses > 0:
+        day_balance = total_income - total_expenses
+        emoji = "📈" if day_balance >= 0 else "📉"
+        parts.append(f"{emoji} *Баланс дня:* {day_balance:+,.0f} тг\n\n")
+
+    # Переводы
+    if transfers:
+        parts.append("🔄 *Переводы:*\n")
+        for transfer in transfers:
+            parts.append(TRANSFER_LINE(description=transfer['description'], amount=transfer['amount']))
+        parts.append("\n")
+
+    # Детализация
+    if transactions:
+        if expenses:
+            parts.extend(_details("💸 *Детализация расходов:*\n", expenses))
+        if income:
+            parts.extend(_details("💰 *Детализация доходов:*\n", income))
+    else:
+        parts.append("📝 *Операций за этот день не было*\n\n")
+
+    return "".join(parts)
+
+
+def _category_shares(categories: List[Dict], total: float) -> List[str]:
+    return [
+        CATEGORY_SHARE_LINE(
+            category=stat['category'],
+            amount=stat['amount'],
+            percentage=stat['amount'] / total * 100 if total > 0 else 0
+        )
+        for stat in categories
+    ]
+
+
+def format_week_statistics(week_start, stats: Dict) -> str:
+    """Текст статистики за неделю из get_range_aggregates"""
+    income = stats['totals']['income']
+    expense = stats['totals']['expense']
+
+    parts = [
+        "📊 *Статистика за неделю*\n",
+        f"({week_start:%d.%m} - {week_start + timedelta(days=6):%d.%m})\n\n",
+        PERIOD_TOTALS(income=income, expense=expense, balance=income - expense)
+    ]
+
+    # Расходы по категориям
+    categories = stats['by_category']['expense']
+    if categories:
+        parts.append("🏷️ *По категориям:*\n")
+        parts.extend(_category_shares(categories, expense))
+        parts.append("\n")
+
+    # Расходы по дням
+    if stats['by_day']:
+        parts.append("📅 *По дням:*\n")
+        for i in range(7):
+            day = week_start + timedelta(days=i)
+            day_stats = stats['by_day'].get(day.isoformat())
+            if day_stats and day_stats['expense'] > 0:
+                parts.append(WEEKDAY_LINE(weekday=WEEKDAYS[day.weekday()], date=day,
+                                          amount=day_stats['expense']))
+
+    return "".join(parts)
+
+
+def format_month_statistics(month_start, stats: Dict) -> str:
+    """Текст статистики за месяц из get_range_aggregates"""
+    income = stats['totals']['income']
+    expense = stats['totals']['expense']
+
+    parts = [
+        f"📊 *Статистика за {month_start:%B %Y}*\n\n",
+        PERIOD_TOTALS(income=income, expense=expense, balance=income - expense)
+    ]
+
+    if stats['by_category']['expense']:
+        parts.append("🏷️ *Расходы по категориям:*\n")
+        parts.extend(_category_shares(stats['by_category']['expense'], expense))
+
+    return "".join(parts)
+
+
+class RenderHistogram:
+    """Гистограмма времени построения экрана в миллисекундах"""
+
+    BOUNDS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.total_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.total_ms += ms
+
+    def snapshot(self) -> Dict:
+        buckets = {f"≤{bound}ms": n for bound, n in zip(self.BOUNDS_MS, self.counts)}
+        buckets["больше"] = self.counts[-1]
+        return buckets
+
+
+class Renderer:
+    """Кэш готовых экранов с гистограммами времени построения по экранам"""
+
+    def __init__(self, version_of: Callable[[int], int], maxsize: int = 4096):
+        self.version_of = version_of
+        self.cache = LRUCache(maxsize=maxsize)
+        self.histograms = {}
+        self.cached = {}
+        self._lock = threading.Lock()
+
+    def render(self, view: str, user_id: int, args: Hashable, build: Callable):
+        """Готовый экран из кэша или результат build() (который кэшируется).
+
+        Устаревшие версии не удаляются явно - их вытесняет LRU.
+        """
+        key = (user_id, view, args, self.version_of(user_id))
+        result = self.cache.get(key)
+        if result is not None:
+            with self._lock:
+                self.cached[view] = self.cached.get(view, 0) + 1
+            return result
+
+        started = time.perf_counter()
+        result = build()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self.histograms.setdefault(view, RenderHistogram()).observe(elapsed_ms)
+        self.cache.set(key, result)
+        return result
+
+    def stats(self) -> Dict:
+        """Построения, попадания в кэш и гистограмма времени по каждому экрану"""
+        with self._lock:
+            result = {}
+            for view in set(self.histograms) | set(self.cached):
+                histogram = self.histograms.get(view, RenderHistogram())
+                built = sum(histogram.counts)
+                cached = self.cached.get(view, 0)
+                result[view] = {
+                    'built': built,
+                    'cached': cached,
+                    'hit_rate': cached / (built + cached) if built + cached else 0.0,
+                    'avg_ms': histogram.total_ms / built if built else 0.0,
+                    'histogram': histogram.snapshot()
+                }
+            return result
+
+
+renderer = Renderer(db.get_data_version, maxsize=int(os.getenv('RENDER_CACHE_SIZE', '4096')))
@@ -0,0 +1,281 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+class LLMUnavailable(Exception):
+    """Запрос к модели не отправлен: API деградировал или исчерпан лимит"""
+
+
+class CircuitOpenError(LLMUnavailable):
+    """Предохранитель разомкнут после серии ошибок"""
+
+
+class RateLimitedError(LLMUnavailable):
+    """Ожидание квоты или свободного места дольше допустимого"""
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int = 0) -> int:
+    """Грубая оценка токенов запроса: ~3 символа кириллицы на токен плюс ответ"""
+    return sum(len(message.get("content") or "") for message in messages) // 3 + max_tokens
+
+
+def is_retryable(error: Exception) -> bool:
+    """Повторять таймауты, сетевые ошибки, 429 и 5xx; 4xx (ключ, запрос) - нет"""
+    if isinstance(error, LLMUnavailable):
+        return False
+    status = getattr(error, 'status', None) or getattr(error, 'http_status', None)
+    return status is None or status == 429 or status >= 500
+
+
+class TokenBucket:
+    """Ведро токенов: rate единиц в минуту, не больше capacity сразу.
+
+    reserve() сразу списывает единицы (баланс может уйти в минус) и
+    возвращает, сколько секунд подождать, пока долг не погасится. Так
+    одно ведро работает и для потоков (time.sleep), и для корутин
+    (asyncio.sleep).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount: float) -> float:
+        """Сколько ждать, если списать amount сейчас (без списания)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (min(amount, self.capacity) - self._level) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """Списать amount и вернуть время ожидания в секундах"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Запрос больше емкости ведра иначе не прошел бы никогда
+            self._level -= min(amount, self.capacity)
+            return max(0.0, -self._level / self.rate)
+
+
+class CircuitBreaker:
+    """Предохранитель: после failure_threshold ошибок подряд запросы не отправляются.
+
+    Через reset_timeout секунд пропускается один пробный запрос: успех
+    замыкает предохранитель, ошибка снова размыкает его.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+            # Полуоткрыт: один пробный запрос за раз
+            if self._probe:
+                return False
+            self._probe = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe = False
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Запрос не дошел до API (лимит) - вернуть право пробы"""
+        with self._lock:
+            self._probe = False
+
+
+class LLMGuard:
+    """Защита обращений к OpenAI: квоты, параллельность, повторы, предохранитель.
+
+    - requests_per_minute и tokens_per_minute - два ведра токенов; запрос
+      ждет квоту, но не дольше max_wait, иначе RateLimitedError;
+    - одновременно выполняется не больше max_concurrency запросов (отдельно
+      для потоков и для цикла событий);
+    - таймауты, сетевые ошибки, 429 и 5xx повторяются с экспоненциальной
+      задержкой со случайным разбросом, пока укладываются в deadline;
+    - после серии неудач предохранитель размыкается, и запросы сразу
+      получают CircuitOpenError - вызывающий переходит на локальный разбор.
+    """
+
+    def __init__(self, requests_per_minute: float = 500, tokens_per_minute: float = 90000,
+                 max_concurrency: int = 16, max_retries: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, max_wait: float = 5.0, deadline: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.deadline = deadline
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphore = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    def retry_delay(self, attempt: int) -> float:
+        """Задержка перед повтором attempt (с нуля): случайная в [0, base * 2^attempt]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _admit(self, tokens: int) -> float:
+        """Проверить предохранитель и квоты; вернуть время ожидания квоты"""
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise CircuitOpenError("OpenAI временно недоступен")
+
+        wait = max(self.requests.delay(1), self.tokens.delay(tokens))
+        if wait > self.max_wait:
+            self.breaker.release()
+            self._count('rate_limited')
+            raise RateLimitedError(f"Лимит запросов к OpenAI, ожидание {wait:.1f} с")
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _failed(self, error: Exception, attempt: int, started: float) -> Optional[float]:
+        """Учесть ошибку; вернуть задержку перед повтором или None, если повторять нельзя"""
+        if not is_retryable(error):
+            # Ошибка запроса, а не API: предохранитель не трогаем
+            self.breaker.release()
+            return None
+
+        self._count('failures')
+        self.breaker.record_failure()
+        delay = self.retry_delay(attempt)
+        if attempt >= self.max_retries or time.monotonic() - started + delay > self.deadline:
+            return None
+        self._count('retries')
+        return delay
+
+    def call(self, func: Callable, tokens: int = 0):
+        """Выполнить блокирующий запрос func() под защитой"""
+        self._count('calls')
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            time.sleep(self._admit(tokens))
+            if not self._semaphore.acquire(timeout=self.max_wait):
+                self.breaker.release()
+                self._count('rate_limited')
+                raise RateLimitedError("Слишком много одновременных запросов к OpenAI")
+            try:
+                result = func()
+            except Exception as e:
+                delay = self._failed(e, attempt, started)
+                if delay is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self._semaphore.release()
+            time.sleep(delay)
+            attempt += 1
+
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_semaphore
+
+    async def call_async(self, coro_func: Callable[[], Awaitable], tokens: int = 0):
+        """Выполнить корутину coro_func() под защитой (без блокировки цикла событий)"""
+        self._count('calls')
+        semaphore = self._get_async_semaphore()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._admit(tokens))
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.breaker.release()
+                self._count('rate_limited')
+                raise RateLimitedError("Слишком много одновременных запросов к OpenAI")
+            try:
+                result = await coro_func()
+            except Exception as e:
+                delay = self._failed(e, attempt, started)
+                if delay is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                semaphore.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @property
+    def degraded(self) -> bool:
+        """Предохранитель разомкнут - обращаться к API бесполезно"""
+        return self.breaker.state == CircuitBreaker.OPEN
+
+    def stats(self) -> Dict:
+        """Счетчики запросов и состояние предохранителя"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'failures': self.failures,
+                'rate_limited': self.rate_limited,
+                'short_circuited': self.short_circuited,
+                'circuit': self.breaker.state,
+                'circuit_opened': self.breaker.opened
+            }
@@ -0,0 +1,168 @@
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class UserScheduler:
+    """Очереди обработчиков по пользователям.
+
+    Обновления одного пользователя выполняются строго по одному и в порядке
+    поступления ("купил кофе" записан раньше, чем /history его покажет),
+    разных пользователей - параллельно, не больше max_concurrency сразу.
+    Пользователи с задачами обслуживаются по кругу по одной задаче, поэтому
+    тот, кто шлет сотню сообщений, не задерживает остальных. В очереди
+    пользователя не больше max_user_queue задач, лишние отклоняются.
+
+    Если задача вернула Future (корутина из coroutine_handler), пользователь
+    считается занятым, пока Future не завершится: поток при этом свободен.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_user_queue: int = 20):
+        self.max_concurrency = max_concurrency
+        self.max_user_queue = max_user_queue
+
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.peak_queued = 0
+        self._total_wait = 0.0
+
+        # user_id -> очередь (функция, время постановки); есть только у пользователей с задачами
+        self._queues = {}
+        # Пользователи с задачами в очереди, у которых ничего не выполняется - по кругу
+        self._ready = deque()
+        self._running = set()
+        self._queued = 0
+        self._cond = threading.Condition()
+        self._executor = None
+
+    def submit(self, user_id: Hashable, func: Callable, *args, **kwargs) -> bool:
+        """Поставить задачу в очередь пользователя. False - очередь переполнена"""
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="user-scheduler"
+                )
+            tasks = self._queues.setdefault(user_id, deque())
+            if len(tasks) >= self.max_user_queue:
+                self.dropped += 1
+                return False
+
+            tasks.append((functools.partial(func, *args, **kwargs), time.monotonic()))
+            self.submitted += 1
+            self._queued += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+            if len(tasks) == 1 and user_id not in self._running:
+                self._ready.append(user_id)
+            self._dispatch()
+        return True
+
+    def _dispatch(self):
+        """Запустить задачи готовых пользователей, пока есть свободные места (под _cond)"""
+        while self._ready and len(self._running) < self.max_concurrency:
+            user_id = self._ready.popleft()
+            task, enqueued = self._queues[user_id].popleft()
+            self._queued -= 1
+            self._total_wait += time.monotonic() - enqueued
+            self._running.add(user_id)
+            self._executor.submit(self._run, user_id, task)
+
+    def _run(self, user_id: Hashable, task: Callable):
+        try:
+            result = task()
+        except Exception as e:
+            logger.error("Ошибка в задаче пользователя %s: %s", user_id, e)
+            with self._cond:
+                self.failed += 1
+            result = None
+
+        if isinstance(result, Future):
+            result.add_done_callback(lambda done: self._finish(user_id))
+        else:
+            self._finish(user_id)
+
+    def _finish(self, user_id: Hashable):
+        with self._cond:
+            self._running.discard(user_id)
+            self.completed += 1
+            if self._queues[user_id]:
+                # Следующая задача пользователя - в конец круга
+                self._ready.append(user_id)
+            else:
+                del self._queues[user_id]
+            self._dispatch()
+            self._cond.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Дождаться, пока все задачи выполнятся"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queues, timeout)
+
+    def stop(self, timeout: float = 30.0):
+        """Дождаться очередей и остановить потоки (после остановки диспетчера)"""
+        self.wait(timeout)
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict:
+        """Глубина очередей и счетчики задач"""
+        with self._cond:
+            depths = [len(tasks) for tasks in self._queues.values()]
+            started = self.submitted - self._queued
+            return {
+                'queued': self._queued,
+                'peak_queued': self.peak_queued,
+                'max_user_depth': max(depths, default=0),
+                'active_users': len(self._queues),
+                'running': len(self._running),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'avg_wait_ms': self._total_wait / started * 1000 if started else 0.0
+            }
+
+
+scheduler = UserScheduler(
+    max_concurrency=int(os.getenv('SCHEDULER_CONCURRENCY', '16')),
+    max_user_queue=int(os.getenv('USER_QUEUE_LIMIT', '20'))
+)
+
+
+def scheduled(callback: Callable, user_scheduler: UserScheduler = None) -> Callable:
+    """Обработчик python-telegram-bot, который выполняется в очереди своего пользователя.
+
+    Диспетчер только ставит обновление в очередь и сразу берет следующее.
+    Исключения передаются в обработчик ошибок диспетчера.
+    """
+    user_scheduler = user_scheduler or scheduler
+
+    @functools.wraps(callback)
+    def wrapper(update, context):
+        user = update.effective_user
+        chat = update.effective_chat
+        key = user.id if user else (chat.id if chat else None)
+
+        def run():
+            try:
+                return callback(update, context)
+            except Exception as e:
+                if context.dispatcher is not None:
+                    context.dispatcher.dispatch_error(update, e)
+                else:
+                    raise
+
+        if not user_scheduler.submit(key, run):
+            logger.warning("Очередь пользователя %s переполнена, обновление пропущено", key)
+
+    return wrapper
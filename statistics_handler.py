@@ -1,6 +1,13 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
 from database_extended import db
+from renderer import (
+    format_day_statistics,
+    format_week_statistics,
+    format_month_statistics,
+    renderer
+)
+from message_edits import message_editor
 from datetime import datetime, timedelta
 import calendar
 
@@ -16,87 +23,37 @@ def statistics_command(update: Update, context: CallbackContext):
 def show_daily_statistics(update, context, user_id: int, date):
     """Показать статистику за конкретный день"""
     
-    # Получаем транзакции за день
-    daily_transactions = db.get_transactions_by_date(user_id, date)
-    
-    # Подсчитываем суммы
-    total_expenses = sum(t['amount'] for t in daily_transactions if t['type'] == 'expense')
-    total_income = sum(t['amount'] for t in daily_transactions if t['type'] == 'income')
-    transfers = [t for t in daily_transactions if t['type'] == 'transfer']
-    
-    # Форматируем дату
-    date_str = date.strftime("%d.%m.%Y")
-    weekday = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'][date.weekday()]
-    
-    message = f"📊 *Статистика за {weekday}, {date_str}:*\n\n"
-    
-    # Балансы карт
-    balances = db.get_account_balances(user_id)
-    if balances:
-        message += "💳 *Текущие балансы:*\n"
-        for balance in balances:
-            emoji = "💳" if "kaspi" in balance['account_name'].lower() or "halyk" in balance['account_name'].lower() else "💵"
-            message += f"{emoji} {balance['account_name']}: {balance['balance']:,.0f} {balance['currency']}\n"
-        message += "\n"
-    
-    # Доходы и расходы
-    if total_income > 0:
-        message += f"💰 *Доходы:* {total_income:,.0f} тг\n"
-    
-    if total_expenses > 0:
-        message += f"💸 *Расходы:* {total_expenses:,.0f} тг\n"
-    
-    if total_income > 0 or total_expenses > 0:
-        balance = total_income - total_expenses
-        emoji = "📈" if balance >= 0 else "📉"
-        message += f"{emoji} *Баланс дня:* {balance:+,.0f} тг\n\n"
-    
-    # Переводы
-    if transfers:
-        message += "🔄 *Переводы:*\n"
-        for transfer in transfers:
-            message += f"• {transfer['description']}: {transfer['amount']:,.0f} тг\n"
-        message += "\n"
-    
-    # Детализация трат
-    if daily_transactions:
-        expenses = [t for t in daily_transactions if t['type'] == 'expense']
-        income = [t for t in daily_transactions if t['type'] == 'income']
-        
-        if expenses:
-            message += "💸 *Детализация расходов:*\n"
-            for trans in expenses:
-                bank_info = f" ({trans['bank']})" if trans['bank'] else ""
-                message += f"• {trans['description']}: {trans['amount']:,.0f} тг{bank_info}\n"
-            message += "\n"
-        
-        if income:
-            message += "💰 *Детализация доходов:*\n"
-            for trans in income:
-                bank_info = f" ({trans['bank']})" if trans['bank'] else ""
-                message += f"• {trans['description']}: {trans['amount']:,.0f} тг{bank_info}\n"
-            message += "\n"
-    else:
-        message += "📝 *Операций за этот день не было*\n\n"
-    
-    # Создаем кнопки навигации
-    keyboard = create_date_navigation_keyboard(date)
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    today = datetime.now().date()
+    message, reply_markup = renderer.render(
+        'stats_day', user_id, (date, today),
+        lambda: build_daily_statistics(user_id, date)
+    )
     
     # Отправляем или редактируем сообщение
     if hasattr(update, 'callback_query') and update.callback_query:
-        update.callback_query.edit_message_text(
+        message_editor.edit(
+            update.callback_query,
             message,
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
     else:
-        update.message.reply_text(
+        sent = update.message.reply_text(
             message,
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
+        message_editor.remember(sent, message, reply_markup)
+
+def build_daily_statistics(user_id: int, date):
+    """Текст и клавиатура статистики за день"""
+    
+    message = format_day_statistics(
+        date,
+        db.get_transactions_by_date(user_id, date),
+        db.get_account_balances(user_id)
+    )
+    return message, InlineKeyboardMarkup(create_date_navigation_keyboard(date))
 
 def create_date_navigation_keyboard(current_date):
     """Создать клавиатуру навигации по датам"""
@@ -206,39 +163,14 @@ def stats_week_callback(update: Update, context: CallbackContext):
     today = datetime.now().date()
     week_start = today - timedelta(days=today.weekday())
     
-    # Получаем транзакции за неделю
-    week_transactions = []
-    for i in range(7):
-        day = week_start + timedelta(days=i)
-        day_transactions = db.get_transactions_by_date(user_id, day)
-        week_transactions.extend(day_transactions)
-    
-    total_expenses = sum(t['amount'] for t in week_transactions if t['type'] == 'expense')
-    total_income = sum(t['amount'] for t in week_transactions if t['type'] == 'income')
-    
-    message = f"📊 *Статистика за неделю*\n"
-    message += f"({week_start.strftime('%d.%m')} - {(week_start + timedelta(days=6)).strftime('%d.%m')})\n\n"
-    message += f"💰 Доходы: {total_income:,.0f} тг\n"
-    message += f"💸 Расходы: {total_expenses:,.0f} тг\n"
-    message += f"📈 Баланс: {total_income - total_expenses:+,.0f} тг\n\n"
-    
-    # Группируем по категориям
-    categories = {}
-    for trans in week_transactions:
-        if trans['type'] == 'expense':
-            cat = trans['category']
-            categories[cat] = categories.get(cat, 0) + trans['amount']
-    
-    if categories:
-        message += "🏷️ *По категориям:*\n"
-        for cat, amount in sorted(categories.items(), key=lambda x: x[1], reverse=True):
-            percentage = (amount / total_expenses) * 100 if total_expenses > 0 else 0
-            message += f"• {cat}: {amount:,.0f} тг ({percentage:.1f}%)\n"
+    def build():
+        # Итоги за неделю одним запросом
+        week_stats = db.get_range_aggregates(user_id, week_start, week_start + timedelta(days=7))
+        return format_week_statistics(week_start, week_stats), back_to_days_keyboard(today)
     
-    keyboard = [[InlineKeyboardButton("← Назад к дням", callback_data=f"stats_day_{today.strftime('%Y-%m-%d')}")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    message, reply_markup = renderer.render('stats_week', user_id, (week_start, today), build)
     
-    query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
+    message_editor.edit(query, message, reply_markup=reply_markup, parse_mode='Markdown')
 
 def stats_month_summary_callback(update: Update, context: CallbackContext):
     """Статистика за месяц"""
@@ -250,21 +182,18 @@ def stats_month_summary_callback(update: Update, context: CallbackContext):
     today = datetime.now().date()
     month_start = today.replace(day=1)
     
-    # Получаем статистику за месяц
-    month_stats = db.get_user_statistics(user_id, period_days=30)
+    next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
     
-    message = f"📊 *Статистика за {month_start.strftime('%B %Y')}*\n\n"
-    message += f"💰 Доходы: {month_stats['total_income']:,.0f} тг\n"
-    message += f"💸 Расходы: {month_stats['total_expenses']:,.0f} тг\n"
-    message += f"📈 Баланс: {month_stats['total_income'] - month_stats['total_expenses']:+,.0f} тг\n\n"
+    def build():
+        # Итоги за календарный месяц одним запросом
+        month_stats = db.get_range_aggregates(user_id, month_start, next_month, group_by=('category',))
+        return format_month_statistics(month_start, month_stats), back_to_days_keyboard(today)
     
-    if month_stats['expenses_by_category']:
-        message += "🏷️ *Расходы по категориям:*\n"
-        for cat_stat in month_stats['expenses_by_category']:
-            percentage = (cat_stat['amount'] / month_stats['total_expenses']) * 100
-            message += f"• {cat_stat['category']}: {cat_stat['amount']:,.0f} тг ({percentage:.1f}%)\n"
+    message, reply_markup = renderer.render('stats_month', user_id, (month_start, today), build)
     
+    message_editor.edit(query, message, reply_markup=reply_markup, parse_mode='Markdown')
+
+def back_to_days_keyboard(today):
+    """Кнопка возврата к статистике по дням"""
     keyboard = [[InlineKeyboardButton("← Назад к дням", callback_data=f"stats_day_{today.strftime('%Y-%m-%d')}")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
\ No newline at end of file
+    return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,183 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def to_date(value):
+    """Привести date, datetime или строку 'YYYY-MM-DD...' к date"""
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def day_range(date) -> tuple:
+    """Полуинтервал [день, следующий день) в формате ISO для условий по дате.
+
+    Сравнение `transaction_date >= ? AND transaction_date < ?` позволяет
+    планировщику использовать индекс, в отличие от `DATE(transaction_date) = ?`.
+    """
+    date = to_date(date)
+    return date.isoformat(), (date + timedelta(days=1)).isoformat()
+
+def transfer_bank(from_account: str, to_account: str) -> str:
+    """Колонка bank перевода: 'kaspi → halyk'"""
+    return f"{from_account} → {to_account}"
+
+def transfer_accounts(bank: Optional[str]) -> Optional[tuple]:
+    """Счета перевода из колонки bank: (откуда, куда) или None, если это не 'a → b'"""
+    parts = (bank or '').split(' → ')
+    return tuple(parts) if len(parts) == 2 and all(parts) else None
+
+
+class Storage(ABC):
+    """Хранилище пользователей, транзакций и балансов.
+
+    Обработчики работают только с этими методами, поэтому хранилище можно
+    заменить (SQLite - FinanceDatabase, PostgreSQL - PostgresStorage), не
+    трогая остальной код. Даты возвращаются строками 'YYYY-MM-DD', время
+    создания - 'YYYY-MM-DD HH:MM:SS', как в SQLite.
+    """
+
+    # Фильтры истории и соответствующие колонки transactions
+    HISTORY_FILTERS = {'category': 'category', 'bank': 'bank', 'type': 'transaction_type'}
+
+    # Колонки выгрузки iter_user_transactions, в порядке значений в строках
+    EXPORT_COLUMNS = ('id', 'transaction_date', 'amount', 'currency', 'category',
+                      'description', 'bank', 'transaction_type', 'created_at')
+
+    # Допустимые разрезы для get_range_aggregates (колонки daily_rollups)
+    AGGREGATE_GROUPS = ('category', 'day')
+
+    @abstractmethod
+    def close(self):
+        """Закрыть все соединения с базой"""
+
+    @abstractmethod
+    def get_data_version(self, user_id: int) -> int:
+        """Версия данных пользователя (0 - изменений не было)"""
+
+    @abstractmethod
+    def add_user(self, user_id: int, username: str = None, first_name: str = None):
+        """Добавляет нового пользователя или обновляет его имя"""
+
+    @abstractmethod
+    def add_transaction(self, transaction_data: Dict) -> bool:
+        """Добавляет новую транзакцию"""
+
+    @abstractmethod
+    def add_transactions_bulk(self, transactions: Iterable[Dict], chunk_size: int = 1000) -> int:
+        """Добавить много транзакций, пропуская известные external_id. Возвращает число добавленных"""
+
+    @abstractmethod
+    def get_transaction_by_id(self, transaction_id: int, user_id: int) -> Optional[Dict]:
+        """Получить транзакцию по ID"""
+
+    @abstractmethod
+    def delete_transaction(self, transaction_id: int, user_id: int) -> bool:
+        """Удалить транзакцию"""
+
+    def get_user_transactions_history(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Получить историю транзакций пользователя"""
+        return self.get_transactions_page(user_id, limit=limit)['transactions']
+
+    @abstractmethod
+    def get_transactions_page(self, user_id: int, cursor: Optional[tuple] = None,
+                              direction: str = 'older', limit: int = 10,
+                              filters: Optional[Dict] = None) -> Dict:
+        """Страница истории от курсора (created_at, id): {'transactions', 'has_older', 'has_newer'}"""
+
+    @abstractmethod
+    def iter_user_transactions(self, user_id: int, chunk_size: int = 1000) -> Iterator[List[tuple]]:
+        """Все транзакции пользователя порциями (колонки EXPORT_COLUMNS)"""
+
+    @abstractmethod
+    def get_user_statistics(self, user_id: int, period_days: int = 30) -> Dict:
+        """Получить статистику пользователя за период"""
+
+    @abstractmethod
+    def get_transactions_by_date(self, user_id: int, date) -> List[Dict]:
+        """Получить транзакции за конкретную дату"""
+
+    @abstractmethod
+    def rebuild_rollups(self, user_id: Optional[int] = None) -> int:
+        """Пересчитать дневные итоги из transactions (для всех или одного пользователя)"""
+
+    @abstractmethod
+    def add_transfer(self, user_id: int, amount: float, from_account: str,
+                     to_account: str, description: str = "", raw_message: str = "") -> bool:
+        """Добавить перевод между счетами и изменить балансы обоих счетов"""
+
+    @abstractmethod
+    def update_account_balance(self, user_id: int, account_name: str, amount_change: float) -> bool:
+        """Обновить баланс счета"""
+
+    @abstractmethod
+    def get_account_balances(self, user_id: int) -> List[Dict]:
+        """Получить все балансы счетов пользователя"""
+
+    @abstractmethod
+    def add_account_balance(self, user_id: int, account_name: str, balance: float,
+                            account_type: str = 'card') -> bool:
+        """Добавить или обновить баланс счета"""
+
+    @abstractmethod
+    def _select_aggregates(self, user_id: int, start, end, group_by: tuple) -> List[tuple]:
+        """Строки (тип, *разрезы, сумма, количество) из daily_rollups за [start, end)"""
+
+    def get_range_aggregates(self, user_id: int, start, end,
+                             group_by: tuple = ('category', 'day')) -> Dict:
+        """Итоги за период [start, end) одним запросом.
+
+        Всегда возвращает суммы по типам операций ('totals', 'counts'),
+        плюс разрезы из group_by: 'category' - по категориям внутри
+        типа, 'day' - по дням. Читает дневные итоги из daily_rollups,
+        поэтому стоимость зависит от числа дней, а не операций.
+        """
+        unknown = set(group_by) - set(self.AGGREGATE_GROUPS)
+        if unknown:
+            raise ValueError(f"Неизвестный разрез: {', '.join(sorted(unknown))}")
+
+        start, end = to_date(start), to_date(end)
+        rows = self._select_aggregates(user_id, start, end, tuple(group_by))
+
+        result = {
+            'start': start,
+            'end': end,
+            'totals': {'income': 0, 'expense': 0, 'transfer': 0},
+            'counts': {'income': 0, 'expense': 0, 'transfer': 0},
+        }
+        if 'category' in group_by:
+            result['by_category'] = {'income': {}, 'expense': {}, 'transfer': {}}
+        if 'day' in group_by:
+            result['by_day'] = {}
+
+        for row in rows:
+            transaction_type, values = row[0], dict(zip(group_by, row[1:-2]))
+            amount, count = row[-2], row[-1]
+
+            result['totals'][transaction_type] += amount
+            result['counts'][transaction_type] += count
+
+            if 'category' in values:
+                categories = result['by_category'][transaction_type]
+                stat = categories.setdefault(values['category'], {
+                    'category': values['category'], 'amount': 0, 'count': 0
+                })
+                stat['amount'] += amount
+                stat['count'] += count
+
+            if 'day' in values:
+                day = result['by_day'].setdefault(values['day'], {
+                    'income': 0, 'expense': 0, 'transfer': 0
+                })
+                day[transaction_type] += amount
+
+        # Категории - списком от крупных к мелким, как в get_user_statistics
+        if 'category' in group_by:
+            for transaction_type, categories in result['by_category'].items():
+                result['by_category'][transaction_type] = sorted(
+                    categories.values(), key=lambda stat: stat['amount'], reverse=True
+                )
+
+        return result
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+import time
+
+from async_runtime import AsyncRuntime, coroutine_handler, runtime
+
+
+def test_many_coroutines_in_flight():
+    """Сотни ожидающих корутин не занимают потоки"""
+    print("🧪 Тестируем асинхронный рантайм...")
+    rt = AsyncRuntime(blocking_workers=4)
+
+    async def slow_parse(i):
+        await asyncio.sleep(0.2)  # как запрос к OpenAI
+        return await rt.run_blocking(lambda: i * 2)  # как запись в SQLite
+
+    started = time.perf_counter()
+    futures = [rt.submit(slow_parse(i)) for i in range(300)]
+    results = [f.result(timeout=5) for f in futures]
+    elapsed = time.perf_counter() - started
+
+    assert results == [i * 2 for i in range(300)]
+    assert elapsed < 2, elapsed
+    print(f"✅ 300 корутин за {elapsed:.2f} с на 4 потоках")
+
+    rt.stop()
+
+
+def test_coroutine_handler_reports_errors():
+    """Исключение в корутине попадает в обработчик ошибок диспетчера"""
+    errors = []
+    done = threading.Event()
+
+    class Dispatcher:
+        def dispatch_error(self, update, error):
+            errors.append((update, error))
+            done.set()
+
+    class Context:
+        dispatcher = Dispatcher()
+
+    async def broken(update, context):
+        raise ValueError("сломалось")
+
+    future = coroutine_handler(broken)("update", Context())
+    assert done.wait(2)
+    assert future.done()
+    assert errors[0][0] == "update" and isinstance(errors[0][1], ValueError)
+    print("✅ Ошибки передаются в dispatch_error")
+
+    runtime.stop()
+
+
+if __name__ == "__main__":
+    test_many_coroutines_in_flight()
+    test_coroutine_handler_reports_errors()
+    print("🎉 Тест асинхронного рантайма ПРОЙДЕН!")
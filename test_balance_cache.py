@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+from database_extended import FinanceDatabase
+
+
+def count_queries(db: FinanceDatabase, action) -> int:
+    """Сколько SELECT к account_balances выполнил action"""
+    queries = []
+    conn = db._connect()
+    conn.set_trace_callback(
+        lambda statement: queries.append(statement) if 'FROM account_balances' in statement else None
+    )
+    try:
+        action()
+    finally:
+        conn.set_trace_callback(None)
+    return len([q for q in queries if q.lstrip().upper().startswith('SELECT')])
+
+
+def test_balances_are_cached_write_through():
+    """Повторное чтение балансов не идет в базу, запись сразу видна"""
+    print("🧪 Тестируем кэш балансов...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "balances.db"))
+    user_id = 3
+    db.add_account_balance(user_id, 'kaspi', 10000)
+
+    # Запись уже положила балансы в кэш
+    assert count_queries(db, lambda: db.get_account_balances(user_id)) == 0
+    assert db.get_account_balances(user_id)[0]['balance'] == 10000
+    print("✅ Чтение из кэша")
+
+    db.update_account_balance(user_id, 'kaspi', -800)
+    db.update_account_balance(user_id, 'halyk', 500)
+    balances = {b['account_name']: b['balance'] for b in db.get_account_balances(user_id)}
+    assert balances == {'halyk': 500, 'kaspi': 9200}
+    print("✅ Обновления видны сразу")
+
+    # Изменение результата не портит кэш
+    db.get_account_balances(user_id)[0]['balance'] = -1
+    assert db.get_account_balances(user_id)[0]['balance'] == 500
+
+    # Пользователь без кэша читается из базы один раз
+    assert count_queries(db, lambda: db.get_account_balances(99)) == 1
+    assert count_queries(db, lambda: db.get_account_balances(99)) == 0
+    db.close()
+
+
+def test_balance_cache_is_bounded():
+    """Кэш балансов ограничен по размеру"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "balances.db"), balance_cache_size=2)
+    for user_id in range(5):
+        db.add_account_balance(user_id, 'kaspi', user_id * 100)
+    assert len(db.balance_cache) == 2
+
+    # Вытесненный пользователь читается из базы с верным значением
+    assert db.get_account_balances(0)[0]['balance'] == 0
+    assert db.get_account_balances(4)[0]['balance'] == 400
+    db.close()
+
+
+if __name__ == "__main__":
+    test_balances_are_cached_write_through()
+    test_balance_cache_is_bounded()
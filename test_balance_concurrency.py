@@ -0,0 +1,57 @@
+import os
+import tempfile
+import threading
+
+from database_extended import FinanceDatabase
+
+
+def test_concurrent_balance_updates_are_not_lost():
+    """Параллельные изменения балансов из многих потоков не теряются"""
+    print("🧪 Стресс-тест балансов...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "stress.db"))
+    user_id = 1
+    threads_count = 8
+    iterations = 50
+    db.add_account_balance(user_id, 'kaspi', 100000)
+    db.add_account_balance(user_id, 'halyk', 0)
+
+    errors = []
+    start = threading.Barrier(threads_count)
+
+    def worker(index: int):
+        start.wait()
+        for i in range(iterations):
+            ok = db.update_account_balance(user_id, 'наличные', 10)
+            # Переводы в обе стороны: сумма kaspi + halyk не меняется
+            if (index + i) % 2:
+                ok = ok and db.add_transfer(user_id, 7, 'kaspi', 'halyk')
+            else:
+                ok = ok and db.add_transfer(user_id, 3, 'halyk', 'kaspi')
+            if not ok:
+                errors.append((index, i))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, f"Неудачные записи: {errors[:5]}"
+
+    # Кэш, заполненный гонкой записей, и база сходятся
+    cached = db.get_account_balances(user_id)
+    db.balance_cache.clear()
+    assert cached == db.get_account_balances(user_id)
+
+    balances = {b['account_name']: b['balance'] for b in cached}
+    transfers = threads_count * iterations
+    assert balances['наличные'] == transfers * 10
+    assert balances['kaspi'] + balances['halyk'] == 100000
+    assert balances['halyk'] == (7 - 3) * transfers // 2
+    print(f"✅ {transfers * 2} параллельных записей без потерь")
+    db.close()
+
+
+if __name__ == "__main__":
+    test_concurrent_balance_updates_are_not_lost()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+from datetime import date
+
+from bank_import import import_statement, parse_amount, StatementError
+from database_extended import FinanceDatabase
+
+KASPI_STATEMENT = """Дата;Сумма;Операция;Детали
+01.03.25;- 2 500,00 ₸;Покупка;Magnum Cash&Carry
+01.03.25;- 2 500,00 ₸;Покупка;Magnum Cash&Carry
+02.03.25;+ 450 000,00 ₸;Пополнение;Зарплата ТОО Ромашка
+03.03.25;- 1 800,00 ₸;Покупка;Яндекс Такси
+04.03.25;- 20 000,00 ₸;Перевод;Иван И.
+05.03.25;;Покупка;Пустая строка
+"""
+
+
+def write_statement(directory: str, name: str, content: str) -> str:
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+def test_parse_amount():
+    """Суммы в форматах выписок"""
+    assert parse_amount("- 2 500,00 ₸") == -2500.0
+    assert parse_amount("1,234.50") == 1234.5
+    assert parse_amount("1.234,50") == 1234.5
+    assert parse_amount("+450000") == 450000.0
+    assert parse_amount(12.5) == 12.5
+    try:
+        parse_amount("₸")
+        assert False, "ожидалась ошибка"
+    except StatementError:
+        pass
+
+
+def test_import_statement():
+    """Импорт выписки Kaspi и повторный импорт без дубликатов"""
+    print("🧪 Тестируем импорт выписки...")
+
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "import.db"))
+    path = write_statement(directory, "kaspi_march.csv", KASPI_STATEMENT)
+    user_id = 21
+
+    stats = import_statement(db, path, user_id, chunk_size=2)
+    assert stats == {'bank': 'kaspi', 'read': 6, 'inserted': 5, 'duplicates': 0, 'skipped': 1}
+    print("✅ Выписка импортирована")
+
+    transactions = {t['description']: t for t in db.get_user_transactions_history(user_id, limit=10)}
+    assert transactions['Magnum Cash&Carry']['category'] == 'еда'
+    assert transactions['Magnum Cash&Carry']['bank'] == 'kaspi'
+    assert transactions['Зарплата ТОО Ромашка']['type'] == 'income'
+    assert transactions['Зарплата ТОО Ромашка']['category'] == 'зарплата'
+    assert transactions['Яндекс Такси']['category'] == 'транспорт'
+    assert transactions['Иван И.']['type'] == 'transfer'
+
+    # Дневные итоги пересчитаны для импортированных дат
+    aggregates = db.get_range_aggregates(user_id, date(2025, 3, 1), date(2025, 3, 6))
+    assert aggregates['totals']['expense'] == 6800
+    assert aggregates['totals']['income'] == 450000
+    assert aggregates['by_day']['2025-03-01']['expense'] == 5000
+
+    # Повторная загрузка той же выписки ничего не добавляет
+    stats = import_statement(db, path, user_id)
+    assert stats['inserted'] == 0 and stats['duplicates'] == 5
+    aggregates = db.get_range_aggregates(user_id, date(2025, 3, 1), date(2025, 3, 6))
+    assert aggregates['totals']['expense'] == 6800
+    print("✅ Повторный импорт не создает дубликатов")
+
+    db.close()
+
+
+def test_import_missing_columns():
+    """Файл без нужных колонок отклоняется целиком"""
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "import.db"))
+    path = write_statement(directory, "statement.csv", "Детали;Комментарий\nкофе;утро\n")
+
+    try:
+        import_statement(db, path, 1)
+        assert False, "ожидалась ошибка"
+    except StatementError as e:
+        assert "date" in str(e)
+    assert db.get_user_transactions_history(1) == []
+    db.close()
+
+
+def test_import_unsigned_statement():
+    """Суммы без знака: тип берется из названия операции, а не из знака"""
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "import.db"))
+    path = write_statement(directory, "halyk.csv", """Дата;Сумма;Операция;Детали
+01.03.25;2 500,00;Покупка;Magnum Cash&Carry
+02.03.25;1 200,00;Оплата;Билайн
+03.03.25;450 000,00;Зачисление;Зарплата ТОО Ромашка
+04.03.25;3 000,00;Возврат покупки;Kaspi Магазин
+""")
+
+    stats = import_statement(db, path, 8)
+    assert stats['inserted'] == 4
+    types = {t['description']: t['type'] for t in db.get_user_transactions_history(8, limit=10)}
+    assert types == {'Magnum Cash&Carry': 'expense', 'Билайн': 'expense',
+                     'Зарплата ТОО Ромашка': 'income', 'Kaspi Магазин': 'income'}
+    db.close()
+
+
+def test_import_cp1251_after_ascii_rows():
+    """cp1251 с кириллицей далеко от начала файла: строки не читаются дважды"""
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "import.db"))
+    path = os.path.join(directory, "halyk.csv")
+    lines = ["Date;Amount;Description"]
+    lines += [f"01.03.25;-{n + 1};Shop {n}" for n in range(2000)]
+    lines.append("02.03.25;-500;Магазин у дома")
+    with open(path, 'w', encoding='cp1251') as f:
+        f.write("\n".join(lines) + "\n")
+
+    stats = import_statement(db, path, 5)
+    assert stats['read'] == 2001 and stats['inserted'] == 2001
+    assert db.get_user_transactions_history(5, limit=1)[0]['description'] == "Магазин у дома"
+    db.close()
+
+
+if __name__ == "__main__":
+    test_parse_amount()
+    test_import_statement()
+    test_import_missing_columns()
+    test_import_unsigned_statement()
+    test_import_cp1251_after_ascii_rows()
@@ -0,0 +1,105 @@
+import os
+import tempfile
+
+from database_extended import FinanceDatabase
+
+
+def test_data_version_bumps_on_writes():
+    """Каждая запись данных пользователя увеличивает его версию"""
+    print("🧪 Тестируем версию данных пользователя...")
+
+    path = os.path.join(tempfile.mkdtemp(), "versions.db")
+    db = FinanceDatabase(path)
+    user_id = 11
+
+    assert db.get_data_version(user_id) == 0
+    db.add_user(user_id, "anna", "Анна")
+    assert db.get_data_version(user_id) == 0
+
+    versions = [db.get_data_version(user_id)]
+    writes = [
+        lambda: db.add_transaction({'user_id': user_id, 'amount': 800, 'category': 'еда'}),
+        lambda: db.add_transfer(user_id, 5000, 'kaspi', 'halyk'),
+        lambda: db.add_account_balance(user_id, 'kaspi', 10000),
+        lambda: db.update_account_balance(user_id, 'kaspi', -800),
+        lambda: db.add_transactions_bulk([{'user_id': user_id, 'amount': 1, 'category': 'еда'}]),
+        lambda: db.delete_transaction(db.get_user_transactions_history(user_id, 1)[0]['id'], user_id),
+    ]
+    for write in writes:
+        assert write()
+        versions.append(db.get_data_version(user_id))
+    assert versions == sorted(set(versions)), versions
+    print("✅ Версия растет при каждой записи")
+
+    # Неудачная запись и чужие записи версию не меняют
+    current = db.get_data_version(user_id)
+    assert not db.delete_transaction(10**6, user_id)
+    db.add_transaction({'user_id': 12, 'amount': 100, 'category': 'еда'})
+    assert db.get_data_version(user_id) == current
+
+    # Имя пользователя сохраняется и обновляется, версия хранится в базе
+    db.add_user(user_id, None, None)
+    db.add_user(12, "boris", "Борис")
+    db.close()
+
+    reopened = FinanceDatabase(path)
+    assert reopened.get_data_version(user_id) == current
+    rows = reopened._connect().execute(
+        "SELECT user_id, username, first_name FROM users ORDER BY user_id"
+    ).fetchall()
+    assert rows == [(11, "anna", "Анна"), (12, "boris", "Борис")]
+    reopened.close()
+
+
+def test_data_version_read_from_memory():
+    """Версия берется из памяти: записи обновляют ее сами, база читается при промахе"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "versions.db"))
+    user_id = 13
+    db.add_transaction({'user_id': user_id, 'amount': 800, 'category': 'еда'})
+    assert db.get_data_version(user_id) == 1
+
+    statements = []
+    db._connect(user_id).set_trace_callback(statements.append)
+    for _ in range(10):
+        assert db.get_data_version(user_id) == 1
+    assert statements == []
+
+    db.add_transactions_bulk([{'user_id': user_id, 'amount': 1, 'category': 'еда'}])
+    statements.clear()
+    assert db.get_data_version(user_id) == 2
+    assert statements == []
+    db._connect(user_id).set_trace_callback(None)
+
+    # После вытеснения из кэша версия читается из базы
+    db.data_versions.clear()
+    assert db.get_data_version(user_id) == 2
+    db.close()
+
+
+def test_add_user_writes_only_changes():
+    """add_user не пишет в базу, если пользователь уже известен с тем же именем"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "users.db"))
+    statements = []
+    db._connect().set_trace_callback(statements.append)
+
+    db.add_user(1, "anna", "Анна")
+    writes = len(statements)
+    assert writes > 0
+
+    for _ in range(10):
+        db.add_user(1, "anna", "Анна")
+    assert len(statements) == writes
+
+    db.add_user(1, "anna_k", "Анна")
+    assert len(statements) > writes
+    db._connect().set_trace_callback(None)
+
+    row = db._connect().execute("SELECT username FROM users WHERE user_id = 1").fetchone()
+    assert row == ("anna_k",)
+    db.close()
+
+
+if __name__ == "__main__":
+    test_data_version_bumps_on_writes()
+    test_data_version_read_from_memory()
+    test_add_user_writes_only_changes()
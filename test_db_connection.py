@@ -0,0 +1,74 @@
+import gc
+import os
+import sqlite3
+import tempfile
+import threading
+
+from database_extended import FinanceDatabase
+from db_connection import SQLiteConnectionManager
+
+
+def test_connection_reuse():
+    """Тест постоянных соединений FinanceDatabase"""
+    print("🧪 Тестируем пул соединений...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "test.db"))
+
+    # В одном потоке - одно и то же соединение
+    assert db._connect() is db._connect()
+    print("✅ Соединение переиспользуется в потоке")
+
+    # В другом потоке - свое соединение
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not db._connect()
+    print("✅ У каждого потока свое соединение")
+
+    # PRAGMA применены
+    conn = db._connect()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    print("✅ WAL и synchronous=NORMAL включены")
+
+    # Методы работают через общее соединение
+    db.add_user(1, "test_user", "Test User")
+    assert db.add_transaction({
+        'user_id': 1, 'amount': 800, 'category': 'еда',
+        'description': 'кофе', 'type': 'expense'
+    })
+    assert len(db.get_user_transactions_history(1)) == 1
+    print("✅ Методы базы работают")
+
+    db.close()
+
+
+def test_thread_connections_closed_on_exit():
+    """Соединения завершившихся потоков закрываются, а не копятся до close_all()"""
+    manager = SQLiteConnectionManager(os.path.join(tempfile.mkdtemp(), "threads.db"))
+    main_conn = manager.connection()
+    opened = []
+
+    for _ in range(20):
+        thread = threading.Thread(target=lambda: opened.append(manager.connection()))
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    assert manager.open_connections() == 1
+    try:
+        opened[0].execute("SELECT 1")
+        assert False, "соединение завершившегося потока должно быть закрыто"
+    except sqlite3.ProgrammingError:
+        pass
+    assert main_conn.execute("SELECT 1").fetchone() == (1,)
+
+    manager.close_all()
+    assert manager.open_connections() == 0
+
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    test_thread_connections_closed_on_exit()
+    print("🎉 Тест соединений ПРОЙДЕН!")
@@ -0,0 +1,89 @@
+import csv
+import os
+import tempfile
+from datetime import date, timedelta
+
+from database_extended import FinanceDatabase
+from transaction_export import ExportError, export_transactions
+
+
+def make_db(directory: str) -> FinanceDatabase:
+    db = FinanceDatabase(os.path.join(directory, "export.db"))
+    start = date(2025, 1, 1)
+    db.add_transactions_bulk(
+        {
+            'user_id': 7,
+            'amount': 100 + i,
+            'category': 'еда',
+            'description': f'обед {i}',
+            'bank': 'kaspi',
+            'date': start + timedelta(days=i % 40)
+        }
+        for i in range(250)
+    )
+    db.add_transaction({'user_id': 8, 'amount': 1, 'category': 'еда', 'description': 'чужая'})
+    return db
+
+
+def test_iter_user_transactions():
+    """Порции fetchmany покрывают все строки пользователя по порядку"""
+    db = make_db(tempfile.mkdtemp())
+
+    chunks = list(db.iter_user_transactions(7, chunk_size=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    ids = [row[0] for chunk in chunks for row in chunk]
+    assert ids == sorted(ids)
+    assert all(len(row) == len(db.EXPORT_COLUMNS) for chunk in chunks for row in chunk)
+    assert list(db.iter_user_transactions(999)) == []
+    db.close()
+
+
+def test_export_csv():
+    """CSV-выгрузка содержит все транзакции пользователя и только их"""
+    print("🧪 Тестируем выгрузку CSV...")
+
+    directory = tempfile.mkdtemp()
+    db = make_db(directory)
+    path = os.path.join(directory, "out.csv")
+
+    stats = export_transactions(db, 7, path, 'csv', chunk_size=64)
+    assert stats['rows'] == 250
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:3] == ['id', 'Дата', 'Сумма']
+    assert len(rows) == 251
+    assert rows[1][1:6] == ['2025-01-01', '100.0', 'KZT', 'еда', 'обед 0']
+    assert all(row[5] != 'чужая' for row in rows)
+    print("✅ CSV выгружен")
+    db.close()
+
+
+def test_export_parquet():
+    """Parquet-выгрузка (если установлен pyarrow)"""
+    directory = tempfile.mkdtemp()
+    db = make_db(directory)
+    path = os.path.join(directory, "out.parquet")
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        try:
+            export_transactions(db, 7, path, 'parquet')
+            assert False, "ожидалась ошибка"
+        except ExportError:
+            print("⚠️ pyarrow не установлен, проверили только сообщение об ошибке")
+        db.close()
+        return
+
+    stats = export_transactions(db, 7, path, 'parquet', chunk_size=64)
+    table = pq.read_table(path)
+    assert stats['rows'] == table.num_rows == 250
+    assert table.column('amount').to_pylist()[0] == 100.0
+    db.close()
+
+
+if __name__ == "__main__":
+    test_iter_user_transactions()
+    test_export_csv()
+    test_export_parquet()
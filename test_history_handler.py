@@ -21,5 +21,34 @@ def test_import():
     
     print("🎉 Тест импорта завершен!")
 
+def test_filter_in_callback_data():
+    """Фильтр истории едет в callback_data кнопок и укладывается в 64 байта"""
+    print("🧪 Тестируем фильтр в кнопках истории...")
+    
+    for filters in ({}, {'type': 'income'}, {'bank': 'наличные', 'category': 'еда'},
+                    {'type': 'expense', 'bank': 'kaspi', 'category': 'моё_хобби'}):
+        data = history_callback("hist_o_20261017120000_123456", filters)
+        assert len(data.encode('utf-8')) <= CALLBACK_DATA_LIMIT
+        parts = data.split('_', 4)
+        assert decode_filters(parts[4] if len(parts) > 4 else '') == filters
+    
+    assert history_callback("refresh_history", {}) == "refresh_history"
+    assert history_callback("refresh_history", {'type': 'transfer'}) == "refresh_history_t"
+    
+    try:
+        history_callback("hist_o_20261017120000_123456", {'category': 'оченьдлинноеназваниекатегории'})
+        assert False, "ожидалась ошибка"
+    except ValueError:
+        pass
+    # Номера вне списков из старой или подделанной кнопки
+    for code in ("b99", "c999", "ib5", "x"):
+        try:
+            decode_filters(code)
+            assert False, f"ожидалась ошибка для {code}"
+        except ValueError:
+            pass
+    print("✅ Фильтр восстанавливается из кнопки")
+
 if __name__ == "__main__":
-    test_import()
\ No newline at end of file
+    test_import()
+    test_filter_in_callback_data()
\ No newline at end of file
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+from database_extended import FinanceDatabase
+
+
+def make_db() -> FinanceDatabase:
+    """25 транзакций с одинаковым created_at - порядок держится на id"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "pages.db"))
+    db.add_transactions_bulk(
+        {
+            'user_id': 3,
+            'amount': i,
+            'category': 'еда' if i % 2 else 'транспорт',
+            'bank': 'kaspi' if i % 3 else 'halyk',
+            'type': 'income' if i % 5 == 0 else 'expense',
+        }
+        for i in range(1, 26)
+    )
+    return db
+
+
+def page_amounts(page: dict) -> list:
+    return [int(t['amount']) for t in page['transactions']]
+
+
+def test_keyset_pages():
+    """Листание вперед и назад по курсору (created_at, id)"""
+    print("🧪 Тестируем постраничную историю...")
+
+    db = make_db()
+    cursor_of = lambda t: (t['created_at'], t['id'])
+
+    first = db.get_transactions_page(3, limit=10)
+    assert page_amounts(first) == list(range(25, 15, -1))
+    assert first['has_older'] and not first['has_newer']
+
+    second = db.get_transactions_page(3, cursor_of(first['transactions'][-1]), 'older', limit=10)
+    assert page_amounts(second) == list(range(15, 5, -1))
+    assert second['has_older'] and second['has_newer']
+
+    last = db.get_transactions_page(3, cursor_of(second['transactions'][-1]), 'older', limit=10)
+    assert page_amounts(last) == [5, 4, 3, 2, 1]
+    assert not last['has_older'] and last['has_newer']
+
+    # Назад от последней страницы - снова вторая, в том же порядке
+    back = db.get_transactions_page(3, cursor_of(last['transactions'][0]), 'newer', limit=10)
+    assert page_amounts(back) == page_amounts(second)
+    assert back['has_newer'] and back['has_older']
+
+    back = db.get_transactions_page(3, cursor_of(back['transactions'][0]), 'newer', limit=10)
+    assert page_amounts(back) == page_amounts(first)
+    assert not back['has_newer']
+    print("✅ Листание работает")
+
+    db.close()
+
+
+def test_filtered_pages():
+    """Фильтры по категории, банку и типу"""
+    db = make_db()
+
+    food = db.get_transactions_page(3, limit=100, filters={'category': 'еда'})
+    assert page_amounts(food) == list(range(25, 0, -2))
+
+    halyk_income = db.get_transactions_page(3, limit=100, filters={'bank': 'halyk', 'type': 'income'})
+    assert page_amounts(halyk_income) == [15]
+
+    try:
+        db.get_transactions_page(3, filters={'amount': 1})
+        assert False, "ожидалась ошибка"
+    except ValueError:
+        pass
+
+    db.close()
+
+
+if __name__ == "__main__":
+    test_keyset_pages()
+    test_filtered_pages()
@@ -0,0 +1,65 @@
+import asyncio
+
+from llm_batcher import MicroBatcher
+
+
+def test_batches_concurrent_messages():
+    """Одновременные сообщения уходят пакетами, результаты возвращаются адресатам"""
+    print("🧪 Тестируем пакетирование запросов...")
+    requests = []
+
+    async def send_batch(messages):
+        requests.append(list(messages))
+        await asyncio.sleep(0.01)
+        return [{'success': True, 'description': message} for message in messages]
+
+    async def scenario():
+        batcher = MicroBatcher(send_batch, window=0.05, max_size=8)
+        results = await asyncio.gather(*(batcher.submit(f"msg {i}") for i in range(20)))
+        return batcher, results
+
+    batcher, results = asyncio.run(scenario())
+
+    assert [r['description'] for r in results] == [f"msg {i}" for i in range(20)]
+    assert [len(batch) for batch in requests] == [8, 8, 4]
+    assert batcher.stats()['requests_saved'] == 17
+    print(f"✅ 20 сообщений → {len(requests)} запроса: {batcher.stats()}")
+
+
+def test_window_bounds_latency():
+    """Одиночное сообщение ждет не дольше окна"""
+    async def send_batch(messages):
+        return [{'success': True} for _ in messages]
+
+    async def scenario():
+        batcher = MicroBatcher(send_batch, window=0.05, max_size=8)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await batcher.submit("кофе")
+        return loop.time() - started
+
+    elapsed = asyncio.run(scenario())
+    assert 0.04 <= elapsed < 0.2, elapsed
+    print(f"✅ Одиночное сообщение отправлено через {elapsed * 1000:.0f} мс")
+
+
+def test_errors_reach_every_caller():
+    """Ошибка запроса или неверная длина ответа получают все ожидающие"""
+    async def short_answer(messages):
+        return [{'success': True}]
+
+    async def scenario():
+        batcher = MicroBatcher(short_answer, window=0.01, max_size=8)
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    print("✅ Ошибка передана всем ожидающим")
+
+
+if __name__ == "__main__":
+    test_batches_concurrent_messages()
+    test_window_bounds_latency()
+    test_errors_reach_every_caller()
+    print("🎉 Тест пакетирования ПРОЙДЕН!")
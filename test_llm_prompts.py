@@ -0,0 +1,92 @@
+import json
+
+import llm_prompts
+from llm_usage import TokenUsage
+from local_parser import DEFAULT_CATEGORIES
+
+BANKS = ["kaspi", "halyk", "sber", "forte", "наличные", "другое"]
+
+
+def test_schema_carries_lists_instead_of_prompt():
+    """Категории и банки - в enum схемы, инструкция не зависит от сообщения"""
+    print("🧪 Тестируем схемы функций...")
+
+    function = llm_prompts.transaction_function(DEFAULT_CATEGORIES, BANKS)
+    properties = function['parameters']['properties']
+    assert "транспорт" in properties['category']['enum']
+    assert "зарплата" in properties['category']['enum']
+    assert None in properties['bank']['enum']
+    assert "транспорт" not in llm_prompts.TRANSACTION_PROMPT
+
+    messages = llm_prompts.function_messages(llm_prompts.TRANSACTION_PROMPT, "кофе 800")
+    assert messages[0]['content'] == llm_prompts.TRANSACTION_PROMPT
+    assert messages[1] == {"role": "user", "content": "кофе 800"}
+
+    batch = llm_prompts.transaction_batch_function(DEFAULT_CATEGORIES, BANKS)
+    assert batch['parameters']['properties']['results']['items'] == function['parameters']
+    assert llm_prompts.numbered(["кофе 800", "такси 1200"]) == "1. кофе 800\n2. такси 1200"
+    print(f"✅ Инструкция {len(llm_prompts.TRANSACTION_PROMPT)} символов, "
+          f"схема ~{llm_prompts.schema_tokens(function)} токенов")
+
+
+def test_function_arguments():
+    """Ответ модели - аргументы вызова функции, без оберток в ```"""
+    arguments = {"success": True, "amount": 800, "category": "еда"}
+    response = {"choices": [{"message": {
+        "role": "assistant", "content": None,
+        "function_call": {"name": "save_transaction", "arguments": json.dumps(arguments)}
+    }}]}
+    assert llm_prompts.function_arguments(response) == arguments
+
+    for message in ({"content": "```json\n{}\n```"},
+                    {"function_call": {"name": "save_transaction", "arguments": "{обрыв"}}):
+        try:
+            llm_prompts.function_arguments({"choices": [{"message": message}]})
+            assert False, "ожидалась ошибка"
+        except ValueError:
+            pass
+
+
+def test_incomplete_success_is_rejected():
+    """Успешный ответ без нужных полей или с неверной суммой/типом не считается успехом"""
+    complete = {"success": True, "amount": 800, "currency": "KZT", "category": "еда",
+                "description": "Кофе", "type": "expense", "confidence": 0.9}
+    fields = llm_prompts.TRANSACTION_FIELDS
+    assert llm_prompts.result_problem(complete, fields) is None
+
+    without_description = dict(complete)
+    del without_description["description"]
+    assert "description" in llm_prompts.result_problem(without_description, fields)
+    assert "сумма" in llm_prompts.result_problem(dict(complete, amount="800"), fields)
+    assert "сумма" in llm_prompts.result_problem(dict(complete, amount=0), fields)
+    assert "тип" in llm_prompts.result_problem(dict(complete, type="transfer"), fields)
+
+    transfer = {"success": True, "amount": 5000, "currency": "KZT", "from_account": "kaspi",
+                "description": "Перевод", "confidence": 0.8}
+    assert "to_account" in llm_prompts.result_problem(transfer, llm_prompts.TRANSFER_FIELDS)
+
+
+def test_token_usage_report():
+    """Учет токенов по видам запросов, в том числе на сообщение в пакете"""
+    usage = TokenUsage()
+    usage.record('transaction', {'prompt_tokens': 300, 'completion_tokens': 40}, 0.5)
+    usage.record('transaction', {'prompt_tokens': 320, 'completion_tokens': 60}, 0.7)
+    usage.record('transaction_batch', {'prompt_tokens': 400, 'completion_tokens': 400}, 1.0, items=8)
+    usage.record('transfer', None)
+
+    stats = usage.stats()
+    assert stats['transaction']['prompt_per_call'] == 310
+    assert stats['transaction']['completion_per_call'] == 50
+    assert round(stats['transaction']['avg_latency_ms']) == 600
+    assert stats['transaction_batch']['tokens_per_item'] == 100
+    assert stats['transfer']['calls'] == 1 and stats['transfer']['prompt_tokens'] == 0
+    assert "transaction_batch: 1 запросов, 8 сообщений" in usage.report()
+    assert TokenUsage().report() == "запросов к модели не было"
+    print(f"✅ Отчет:\n{usage.report()}")
+
+
+if __name__ == "__main__":
+    test_schema_carries_lists_instead_of_prompt()
+    test_function_arguments()
+    test_incomplete_success_is_rejected()
+    test_token_usage_report()
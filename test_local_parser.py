@@ -0,0 +1,58 @@
+from local_parser import LocalParser, normalize_bank_name
+
+CATEGORIES = {
+    "expense": ["еда", "транспорт", "развлечения", "покупки", "жилье", "здоровье", "другое"],
+    "income": ["зарплата", "инвестиции", "подарки", "подработка", "другое"]
+}
+
+
+def test_local_parser_simple_messages():
+    """Простые сообщения разбираются локально с высокой уверенностью"""
+    print("🧪 Тестируем локальный парсер...")
+    parser = LocalParser(CATEGORIES)
+
+    cases = [
+        ("купил кофе 800 тг", 800, "еда", "expense", None),
+        ("такси 1200 с каспи", 1200, "транспорт", "expense", "kaspi"),
+        ("получил зарплату 350000", 350000, "зарплата", "income", None),
+        ("5к на бензин", 5000, "транспорт", "expense", None),
+        ("такси 1 200", 1200, "транспорт", "expense", None),
+    ]
+    for message, amount, category, trans_type, bank in cases:
+        result = parser.parse(message)
+        assert result['success'], message
+        assert result['amount'] == amount, message
+        assert result['category'] == category, message
+        assert result['type'] == trans_type, message
+        assert result['bank'] == bank, message
+        assert result['confidence'] >= parser.threshold, message
+        print(f"   ✅ '{message}' → {result['amount']:,.0f} [{result['category']}]")
+
+
+def test_local_parser_defers_to_llm():
+    """Неоднозначные сообщения уходят в OpenAI"""
+    parser = LocalParser(CATEGORIES)
+
+    assert not parser.parse("что-то непонятное")['success']
+    assert not parser.parse("перевел с каспи на халык 50000")['success']
+    assert parser.parse("подарок маме 20000")['confidence'] < parser.threshold
+    assert parser.parse("обед 2 порции 5000")['confidence'] < parser.threshold
+
+    stats = parser.stats()
+    assert stats['attempts'] == 4 and stats['accepted'] == 0
+    print("✅ Неоднозначные сообщения не принимаются")
+
+
+def test_normalize_bank_name():
+    """Нормализация банков вынесена из AIParser без изменений"""
+    assert normalize_bank_name("Halyk Bank") == "halyk"
+    assert normalize_bank_name("каспи") == "kaspi"
+    assert normalize_bank_name("неизвестный банк") == "другое"
+    assert normalize_bank_name(None) == "другое"
+
+
+if __name__ == "__main__":
+    test_local_parser_simple_messages()
+    test_local_parser_defers_to_llm()
+    test_normalize_bank_name()
+    print("🎉 Тест локального парсера ПРОЙДЕН!")
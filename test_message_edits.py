@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from message_edits import MessageEditor
+
+
+class FakeQuery:
+    """callback_query с подсчетом запросов editMessageText"""
+
+    def __init__(self, chat_id: int = 1, message_id: int = 10, error: Exception = None):
+        self.message = SimpleNamespace(chat_id=chat_id, message_id=message_id)
+        self.error = error
+        self.calls = 0
+
+    def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.calls += 1
+        if self.error:
+            raise self.error
+
+
+def test_skip_unchanged_edit():
+    """Повторная отправка того же экрана не вызывает Bot API"""
+    print("🧪 Тестируем пропуск одинаковых правок...")
+
+    editor = MessageEditor()
+    query = FakeQuery()
+
+    assert editor.edit(query, "📋 История", parse_mode='Markdown')
+    assert not editor.edit(query, "📋 История", parse_mode='Markdown')
+    assert query.calls == 1
+
+    # Другое сообщение того же чата правится независимо
+    other = FakeQuery(message_id=11)
+    assert editor.edit(other, "📋 История")
+    assert other.calls == 1
+
+    # Новый текст - новый запрос
+    assert editor.edit(query, "📋 История (обновлено)")
+    assert query.calls == 2
+
+    # Запомненное при отправке сообщение тоже не правится повторно
+    editor.remember(SimpleNamespace(chat_id=1, message_id=12), "📊 Статистика")
+    assert not editor.edit(FakeQuery(message_id=12), "📊 Статистика")
+
+    assert editor.stats() == {'edits': 3, 'skipped': 2, 'not_modified': 0, 'saved_calls': 2}
+    print("✅ Одинаковые правки пропущены")
+
+
+def test_not_modified_error_is_swallowed():
+    """Ошибка 'Message is not modified' не доходит до обработчика ошибок"""
+    editor = MessageEditor()
+    query = FakeQuery(error=Exception("Message is not modified: specified new message content "
+                                      "and reply markup are exactly the same"))
+    editor.edit(query, "текст")
+    assert editor.stats()['not_modified'] == 1
+
+    # После этого содержимое известно, повторный вызов не делает запрос
+    assert not editor.edit(query, "текст")
+    assert query.calls == 1
+
+    try:
+        editor.edit(FakeQuery(message_id=99, error=Exception("Message to edit not found")), "текст")
+        assert False, "ожидалась ошибка"
+    except Exception as e:
+        assert "not found" in str(e)
+
+
+if __name__ == "__main__":
+    test_skip_unchanged_edit()
+    test_not_modified_error_is_swallowed()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+
+from parse_cache import ParseCache, normalize_message
+
+
+def coffee(amount):
+    return {
+        'success': True, 'amount': amount, 'currency': 'KZT', 'category': 'еда',
+        'description': 'кофе', 'bank': None, 'type': 'expense', 'confidence': 0.95
+    }
+
+
+def test_normalize_message():
+    """Нормализация сообщений для ключа кэша"""
+    print("🧪 Тестируем нормализацию...")
+    assert normalize_message("Кофе  800 тг!") == ("кофе # тг", [800.0])
+    assert normalize_message("такси 1200,50") == ("такси #", [1200.5])
+    print("✅ Регистр, пробелы и числа нормализуются")
+
+
+def test_parse_cache_substitutes_amount():
+    """Повторная фраза с другой суммой берется из кэша"""
+    print("🧪 Тестируем кэш парсинга...")
+
+    cache = ParseCache(maxsize=10)
+    assert cache.get("кофе 800") is None
+
+    cache.set("кофе 800", coffee(800))
+    result = cache.get("Кофе 650")
+    assert result['amount'] == 650 and result['category'] == 'еда'
+    print("✅ Сумма подставлена из нового сообщения")
+
+    # Неудачные ответы не кэшируются
+    cache.set("что-то 5", {'success': False, 'error': 'нет'})
+    assert cache.get("что-то 5") is None
+
+    # Сумма не из текста - ключ по точному тексту
+    cache.set("обед 2 порции", coffee(5000))
+    assert cache.get("обед 2 порции")['amount'] == 5000
+    assert cache.get("обед 3 порции") is None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 3
+    print(f"✅ Счетчики: {stats}")
+
+
+def test_parse_cache_disk_and_ttl():
+    """Дисковый кэш переживает перезапуск, TTL отсекает старые записи"""
+    db_path = os.path.join(tempfile.mkdtemp(), "parse_cache.db")
+
+    ParseCache(db_path=db_path).set("такси 1200", coffee(1200))
+    restarted = ParseCache(db_path=db_path)
+    assert restarted.get("такси 900")['amount'] == 900
+    assert restarted.disk_hits == 1
+    print("✅ Запись прочитана с диска")
+
+    # Просроченная запись не возвращается и удаляется из файла при обращении
+    stale = ParseCache(db_path=db_path)
+    stale.ttl = 0.01
+    time.sleep(0.02)
+    assert stale.get("такси 900") is None
+    count = "SELECT COUNT(*) FROM parse_cache"
+    assert stale.connections.connection().execute(count).fetchone()[0] == 0
+    print("✅ Просроченные записи игнорируются и удаляются")
+
+    # Записи, к которым больше не обращаются, удаляются при запуске
+    ParseCache(db_path=db_path).set("кофе 800", coffee(800))
+    time.sleep(0.02)
+    restarted = ParseCache(db_path=db_path, ttl=0.01)
+    assert restarted.purged == 1
+    assert restarted.connections.connection().execute(count).fetchone()[0] == 0
+
+
+if __name__ == "__main__":
+    test_normalize_message()
+    test_parse_cache_substitutes_amount()
+    test_parse_cache_disk_and_ttl()
+    print("🎉 Тест кэша парсинга ПРОЙДЕН!")
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import threading
+import time
+
+from database_extended import FinanceDatabase
+from parse_queue import ParseJobQueue
+
+
+def make_queue(**kwargs) -> ParseJobQueue:
+    return ParseJobQueue(os.path.join(tempfile.mkdtemp(), "jobs.db"), **kwargs)
+
+
+def test_retries_until_api_recovers():
+    """Пока API недоступен, задача откладывается; после восстановления транзакция записывается"""
+    print("🧪 Тестируем очередь разбора...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "queue.db"))
+    queue = make_queue(workers=2, base_delay=0.02, poll_interval=0.05)
+    outage = {'left': 3}
+    notified = []
+    done = threading.Event()
+
+    def parse(message):
+        if outage['left'] > 0:
+            outage['left'] -= 1
+            return {"success": False, "error": "OpenAI временно недоступен", "unavailable": True}
+        return {"success": True, "amount": 800.0, "currency": "KZT", "category": "еда",
+                "description": message, "bank": None, "type": "expense", "confidence": 0.9}
+
+    saved_keys = []
+
+    def save(job, result):
+        saved_keys.append(job['key'])
+        return db.add_transaction({
+            'user_id': job['user_id'], 'amount': result['amount'], 'category': result['category'],
+            'description': result['description'], 'raw_message': job['message'],
+            'external_id': f"pq:{job['key']}"
+        })
+
+    def notify(job, result):
+        notified.append((job['chat_id'], result['success']))
+        done.set()
+
+    job_id = queue.enqueue(7, 70, "кофе с коллегой")
+    assert job_id is not None
+    queue.start(parse, save, notify)
+    assert done.wait(5)
+    queue.stop()
+
+    assert notified == [(70, True)]
+    assert len(db.get_user_transactions_history(7)) == 1
+    stats = queue.stats()
+    assert stats['retried'] == 3 and stats['done'] == 1 and stats['pending'] == 0
+    # Повторная запись той же задачи (падение до удаления из очереди) не дублирует транзакцию
+    repeated = {'id': job_id, 'key': saved_keys[0], 'user_id': 7, 'message': "кофе с коллегой"}
+    assert save(repeated, parse("кофе"))
+    assert len(db.get_user_transactions_history(7)) == 1
+
+    # Новый файл очереди начинает номера заново, но ключи задач другие
+    other = make_queue()
+    assert other.enqueue(7, 70, "кофе с коллегой") == job_id
+    job = other._claim()
+    assert job['key'] != saved_keys[0]
+    assert save(job, parse("кофе"))
+    assert len(db.get_user_transactions_history(7)) == 2
+    other.stop()
+    print(f"✅ Записано после {stats['retried']} отложенных попыток")
+    db.close()
+
+
+def test_jobs_survive_restart_and_give_up():
+    """Задачи переживают перезапуск; после max_attempts задача помечается неудачной"""
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    queue = ParseJobQueue(path, max_attempts=2, base_delay=0.01)
+    queue.enqueue(1, 10, "непонятно что")
+    # Процесс упал посреди разбора
+    assert queue._claim()['message'] == "непонятно что"
+    queue.connections.close_all()
+
+    queue = ParseJobQueue(path, max_attempts=2, base_delay=0.01)
+    assert queue.stats()['pending'] == 1
+    unavailable = lambda message: {"success": False, "error": "таймаут", "unavailable": True}
+    notified = []
+    notify = lambda job, result: notified.append(result['error'])
+
+    assert queue.run_once(unavailable, None, notify)
+    assert not queue.run_once(unavailable, None, notify)
+    time.sleep(0.05)
+    assert queue.run_once(unavailable, None, notify)
+    assert notified == ["таймаут"]
+    assert queue.stats()['failed_total'] == 1 and queue.stats()['pending'] == 0
+    queue.stop()
+
+
+def test_user_jobs_do_not_overlap():
+    """Задачи одного пользователя не выполняются одновременно, разных - параллельно"""
+    queue = make_queue(workers=4, poll_interval=0.02)
+    running, overlap, order = set(), [], []
+    lock = threading.Lock()
+
+    def parse(message):
+        user_id = int(message.split()[0])
+        with lock:
+            if user_id in running:
+                overlap.append(user_id)
+            running.add(user_id)
+        time.sleep(0.01)
+        with lock:
+            running.discard(user_id)
+            order.append(message)
+        return {"success": False, "error": "не операция"}
+
+    for n in range(5):
+        for user_id in (1, 2):
+            queue.enqueue(user_id, user_id, f"{user_id} сообщение {n}")
+    queue.start(parse, None, lambda job, result: None)
+    deadline = time.monotonic() + 5
+    while queue.stats()['failed'] < 10 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    queue.stop()
+
+    assert not overlap
+    for user_id in (1, 2):
+        assert [m for m in order if m.startswith(f"{user_id} ")] == \
+            [f"{user_id} сообщение {n}" for n in range(5)]
+    print("✅ Порядок задач пользователя сохранен")
+
+
+
+def test_save_error_does_not_block_user():
+    """Исключение в save помечает задачу неудачной, следующие сообщения пользователя идут дальше"""
+    queue = make_queue()
+    queue.enqueue(3, 30, "первое")
+    queue.enqueue(3, 30, "второе")
+    parse = lambda message: {"success": True, "amount": 1.0, "category": "еда"}
+    saved, notified = [], []
+
+    def save(job, result):
+        if job['message'] == "первое":
+            # Как build_transaction без поля description
+            raise KeyError('description')
+        saved.append(job['message'])
+        return True
+
+    notify = lambda job, result: notified.append((job['message'], result['success']))
+
+    assert queue.run_once(parse, save, notify)
+    assert queue.run_once(parse, save, notify)
+    assert saved == ["второе"]
+    assert notified == [("первое", False), ("второе", True)]
+    stats = queue.stats()
+    assert stats['failed_total'] == 1 and stats['pending'] == 0
+    queue.stop()
+
+
+if __name__ == "__main__":
+    test_retries_until_api_recovers()
+    test_jobs_survive_restart_and_give_up()
+    test_user_jobs_do_not_overlap()
+    test_save_error_does_not_block_user()
@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+from database_extended import FinanceDatabase
+
+
+def collect_queries(conn: sqlite3.Connection, action) -> list:
+    """Выполнить action и вернуть все SELECT-запросы, которые он отправил в SQLite"""
+    queries = []
+
+    def trace(statement):
+        if statement.lstrip().upper().startswith('SELECT'):
+            queries.append(statement)
+
+    conn.set_trace_callback(trace)
+    try:
+        action()
+    finally:
+        conn.set_trace_callback(None)
+    return queries
+
+
+def query_plan(conn: sqlite3.Connection, query: str) -> list:
+    """Шаги EXPLAIN QUERY PLAN для запроса"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+
+
+def full_scans(conn: sqlite3.Connection, query: str) -> list:
+    """Шаги плана, в которых таблица читается целиком"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    scans = []
+    for detail in query_plan(conn, query):
+        parts = detail.split()
+        if len(parts) > 1 and parts[0] == 'SCAN' and parts[1] in tables:
+            scans.append(detail)
+    return scans
+
+
+def fill(db: FinanceDatabase, user_id: int):
+    """Немного данных, чтобы запросы были реалистичными"""
+    today = datetime.now().date()
+    for day in range(30):
+        db.add_transaction({
+            'user_id': user_id,
+            'amount': 1000 + day,
+            'category': 'еда',
+            'description': 'обед',
+            'type': 'expense' if day % 5 else 'income',
+            'date': today - timedelta(days=day)
+        })
+
+
+def test_extended_queries_use_indexes():
+    """Горячие запросы database_extended не должны сканировать таблицы"""
+    print("🧪 Проверяем планы запросов database_extended...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "plans.db"))
+    user_id = 42
+    db.add_user(user_id, "test_user", "Test User")
+    fill(db, user_id)
+    today = datetime.now().date()
+
+    hot_paths = {
+        'get_user_transactions_history': lambda: db.get_user_transactions_history(user_id, limit=10),
+        'get_transactions_by_date': lambda: db.get_transactions_by_date(user_id, today),
+        'get_user_statistics': lambda: db.get_user_statistics(user_id, period_days=30),
+        'get_transaction_by_id': lambda: db.get_transaction_by_id(1, user_id),
+        'get_account_balances': lambda: db.get_account_balances(user_id),
+        'get_range_aggregates': lambda: db.get_range_aggregates(user_id, today - timedelta(days=6),
+                                                                today + timedelta(days=1)),
+        # Запрос версии идет в базу только при промахе кэша версий
+        'get_data_version': lambda: db.data_versions.clear() or db.get_data_version(user_id),
+        'iter_user_transactions': lambda: list(db.iter_user_transactions(user_id, chunk_size=7)),
+        'get_transactions_page': lambda: db.get_transactions_page(
+            user_id, cursor=(f"{today} 23:59:59", 10**9), limit=10, filters={'category': 'еда'}
+        ),
+    }
+
+    # Запросы по датам должны искать по диапазону дат в индексе,
+    # а не перебирать все строки пользователя
+    date_seeks = {
+        'get_transactions_by_date': 'transaction_date>?',
+        'get_user_statistics': 'transaction_date>?',
+        'get_range_aggregates': 'day>?',
+    }
+
+    # Страница истории - поиск от курсора, без сортировки во временном B-дереве
+    cursor_seeks = {'get_transactions_page': 'created_at<?'}
+
+    conn = db._connect()
+    failures = []
+    for name, action in hot_paths.items():
+        queries = collect_queries(conn, action)
+        assert queries, f"{name} не выполнил ни одного запроса"
+        for query in queries:
+            scans = full_scans(conn, query)
+            if scans:
+                failures.append(f"{name}: {scans}")
+                continue
+            seek = date_seeks.get(name)
+            plan = query_plan(conn, query)
+            if seek and not any(seek in detail for detail in plan):
+                failures.append(f"{name}: нет поиска по дате в {plan}")
+                continue
+            seek = cursor_seeks.get(name)
+            if seek and (not any(seek in detail for detail in plan)
+                         or any('TEMP B-TREE' in detail for detail in plan)):
+                failures.append(f"{name}: нет поиска по курсору в {plan}")
+                continue
+            print(f"   ✅ {name}")
+
+    db.close()
+    assert not failures, "Полный скан таблицы: " + "; ".join(failures)
+
+
+def test_legacy_stats_queries_use_indexes():
+    """Статистика database.py по месяцам тоже идет по индексу"""
+    print("🧪 Проверяем планы запросов database...")
+
+    import database
+
+    db = database.FinanceDatabase(os.path.join(tempfile.mkdtemp(), "legacy.db"))
+    db.add_transaction(42, 800, "KZT", "еда", "кофе")
+    today = datetime.now()
+
+    with sqlite3.connect(db.db_path) as conn:
+        for query, params in (
+            ("SELECT category, SUM(amount) FROM transactions "
+             "WHERE user_id = ? AND type = ? AND date >= ? AND date < ? GROUP BY category",
+             (42, 'expense', *database.month_range(today.month, today.year))),
+            ("SELECT * FROM transactions WHERE user_id = ? AND date >= ? AND date < ? ORDER BY date DESC",
+             (42, *database.month_range(today.month, today.year))),
+        ):
+            query_literal = query.replace('?', "'0'")
+            assert not full_scans(conn, query_literal), query
+            assert any('date>?' in detail for detail in query_plan(conn, query_literal)), query
+            assert conn.execute(query, params).fetchall()
+
+    assert db.get_category_stats(42, today.month, today.year)[0]['total'] == 800
+    print("   ✅ get_category_stats / get_user_transactions")
+
+
+if __name__ == "__main__":
+    test_extended_queries_use_indexes()
+    test_legacy_stats_queries_use_indexes()
+    print("🎉 Тест планов запросов ПРОЙДЕН!")
@@ -0,0 +1,54 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from database_extended import FinanceDatabase
+
+
+def test_range_aggregates():
+    """Тест итогов за период одним запросом"""
+    print("🧪 Тестируем get_range_aggregates...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "aggregates.db"))
+    user_id = 7
+    today = datetime.now().date()
+    yesterday = today - timedelta(days=1)
+
+    for amount, category, trans_type, date in (
+        (800, 'еда', 'expense', today),
+        (1200, 'транспорт', 'expense', today),
+        (2500, 'еда', 'expense', yesterday),
+        (350000, 'зарплата', 'income', yesterday),
+        (5000, 'перевод', 'transfer', today),
+        (9999, 'еда', 'expense', today - timedelta(days=10)),  # вне периода
+    ):
+        db.add_transaction({
+            'user_id': user_id, 'amount': amount, 'category': category,
+            'type': trans_type, 'date': date
+        })
+
+    stats = db.get_range_aggregates(user_id, yesterday, today + timedelta(days=1))
+
+    assert stats['totals'] == {'income': 350000, 'expense': 4500, 'transfer': 5000}
+    assert stats['counts']['expense'] == 3
+    print("✅ Итоги по типам")
+
+    expenses = stats['by_category']['expense']
+    assert [c['category'] for c in expenses] == ['еда', 'транспорт']
+    assert expenses[0] == {'category': 'еда', 'amount': 3300, 'count': 2}
+    print("✅ Итоги по категориям")
+
+    assert stats['by_day'][today.isoformat()]['expense'] == 2000
+    assert stats['by_day'][yesterday.isoformat()]['income'] == 350000
+    print("✅ Итоги по дням")
+
+    totals_only = db.get_range_aggregates(user_id, yesterday, today + timedelta(days=1), group_by=())
+    assert totals_only['totals'] == stats['totals']
+    assert 'by_category' not in totals_only and 'by_day' not in totals_only
+
+    db.close()
+
+
+if __name__ == "__main__":
+    test_range_aggregates()
+    print("🎉 Тест итогов за период ПРОЙДЕН!")
@@ -0,0 +1,87 @@
+import os
+import tempfile
+from datetime import date
+
+from database_extended import FinanceDatabase
+from renderer import Renderer, format_day_statistics, format_history
+
+
+def test_format_history():
+    """Текст страницы истории"""
+    transactions = [
+        {'id': 2, 'amount': 450000, 'currency': 'KZT', 'category': 'зарплата',
+         'description': 'Зарплата', 'bank': 'kaspi', 'type': 'income', 'date': '2025-03-02'},
+        {'id': 1, 'amount': 800, 'currency': 'KZT', 'category': 'еда',
+         'description': 'Кофе', 'bank': None, 'type': 'expense', 'date': '2025-03-01'},
+    ]
+
+    text = format_history(transactions, "📋 *Ваши последние транзакции:*", "еда")
+    assert text == (
+        "📋 *Ваши последние транзакции:*\n"
+        "🔎 Фильтр: еда\n\n"
+        "1. 💰 *450,000 KZT*\n"
+        "   📅 2025-03-02 • 🏷️ зарплата\n"
+        "   📝 Зарплата\n"
+        "   🏦 kaspi\n\n"
+        "2. 💸 *800 KZT*\n"
+        "   📅 2025-03-01 • 🏷️ еда\n"
+        "   📝 Кофе\n\n"
+    )
+
+
+def test_format_day_statistics():
+    """Текст статистики за день"""
+    day = date(2025, 3, 3)
+    transactions = [
+        {'amount': 800, 'description': 'Кофе', 'bank': 'kaspi', 'type': 'expense'},
+        {'amount': 5000, 'description': 'Перевод с kaspi на halyk', 'bank': None, 'type': 'transfer'},
+    ]
+    balances = [{'account_name': 'Kaspi', 'balance': 10000, 'currency': 'KZT'}]
+
+    text = format_day_statistics(day, transactions, balances)
+    assert text.startswith("📊 *Статистика за Пн, 03.03.2025:*\n\n💳 *Текущие балансы:*\n💳 Kaspi: 10,000 KZT\n")
+    assert "💸 *Расходы:* 800 тг\n📉 *Баланс дня:* -800 тг\n" in text
+    assert "• Перевод с kaspi на halyk: 5,000 тг\n" in text
+    assert "• Кофе: 800 тг (kaspi)\n" in text
+
+    assert format_day_statistics(day, [], []).endswith("📝 *Операций за этот день не было*\n\n")
+
+
+def test_render_cache_follows_data_version():
+    """Экран строится заново только после изменения данных пользователя"""
+    print("🧪 Тестируем кэш рендерера...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "render.db"))
+    renderer = Renderer(db.get_data_version)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return format_history(db.get_user_transactions_history(1), "📋")
+
+    db.add_transaction({'user_id': 1, 'amount': 800, 'category': 'еда', 'description': 'Кофе'})
+    first = renderer.render('history', 1, (), build)
+    assert renderer.render('history', 1, (), build) == first
+    assert len(builds) == 1
+    print("✅ Повторный показ из кэша")
+
+    # Запись другого пользователя не сбрасывает кэш
+    db.add_transaction({'user_id': 2, 'amount': 100, 'category': 'еда'})
+    renderer.render('history', 1, (), build)
+    assert len(builds) == 1
+
+    db.add_transaction({'user_id': 1, 'amount': 1200, 'category': 'еда', 'description': 'Обед'})
+    second = renderer.render('history', 1, (), build)
+    assert len(builds) == 2 and "Обед" in second
+    print("✅ Новая транзакция сбрасывает кэш")
+
+    stats = renderer.stats()['history']
+    assert stats['built'] == 2 and stats['cached'] == 2
+    assert sum(stats['histogram'].values()) == 2
+    db.close()
+
+
+if __name__ == "__main__":
+    test_format_history()
+    test_format_day_statistics()
+    test_render_cache_follows_data_version()
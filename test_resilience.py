@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+from resilience import (CircuitBreaker, CircuitOpenError, LLMGuard, RateLimitedError,
+                        TokenBucket, is_retryable)
+
+
+class LLMError(Exception):
+    """Ошибка API с HTTP-статусом, как у llm_client.LLMError"""
+
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+def test_token_bucket():
+    """Ведро отдает емкость сразу, дальше - со скоростью rate"""
+    print("🧪 Тестируем ведро токенов...")
+
+    bucket = TokenBucket(rate_per_minute=600, capacity=5)
+    assert [bucket.reserve(1) for _ in range(5)] == [0.0] * 5
+    # Шестой запрос ждет 1/10 с, седьмой - 2/10
+    assert abs(bucket.reserve(1) - 0.1) < 0.01
+    assert abs(bucket.delay(1) - 0.2) < 0.01
+    # Запрос больше емкости не ждет вечно
+    assert TokenBucket(60, capacity=10).reserve(1000) == 0.0
+    print("✅ Квоты")
+
+
+def test_retries_with_jitter():
+    """Временные ошибки повторяются, ошибки запроса - нет"""
+    print("🧪 Тестируем повторы...")
+
+    guard = LLMGuard(base_delay=0.01, max_delay=0.02, failure_threshold=10)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise LLMError("OpenAI API 503: перегружен", 503)
+        return "ok"
+
+    assert guard.call(flaky) == "ok"
+    assert len(attempts) == 3 and guard.stats()['retries'] == 2
+
+    def bad_key():
+        attempts.append(1)
+        raise LLMError("OpenAI API 401: неверный ключ", 401)
+
+    attempts.clear()
+    try:
+        guard.call(bad_key)
+        assert False, "ожидалась ошибка"
+    except LLMError:
+        pass
+    assert len(attempts) == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+    assert is_retryable(TimeoutError()) and is_retryable(LLMError("429", 429))
+    assert not is_retryable(LLMError("400", 400))
+    assert all(0 <= guard.retry_delay(5) <= 0.02 for _ in range(100))
+    print("✅ Повторы")
+
+
+def test_circuit_breaker_short_circuits():
+    """После серии ошибок запросы не отправляются, а через паузу пробуется один"""
+    print("🧪 Тестируем предохранитель...")
+
+    guard = LLMGuard(max_retries=0, failure_threshold=3, reset_timeout=0.2)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise LLMError("OpenAI API 500", 500)
+
+    for _ in range(3):
+        try:
+            guard.call(down)
+        except LLMError:
+            pass
+    assert guard.degraded
+
+    started = time.perf_counter()
+    try:
+        guard.call(down)
+        assert False, "ожидался отказ без запроса"
+    except CircuitOpenError:
+        pass
+    assert len(calls) == 3 and time.perf_counter() - started < 0.05
+
+    time.sleep(0.25)
+    assert guard.call(lambda: "ok") == "ok"
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.stats()['short_circuited'] == 1 and guard.stats()['circuit_opened'] == 1
+    print("✅ Предохранитель")
+
+
+def test_rate_limit_and_concurrency():
+    """Запрос не ждет квоту дольше max_wait; одновременно не больше max_concurrency"""
+    guard = LLMGuard(requests_per_minute=60, max_wait=0.1)
+    guard.requests = TokenBucket(60, capacity=1)
+    guard.call(lambda: None)
+    try:
+        guard.call(lambda: None)
+        assert False, "ожидался отказ по квоте"
+    except RateLimitedError:
+        pass
+
+    guard = LLMGuard(max_concurrency=2)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    async def request():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return 1
+
+    async def scenario():
+        return await asyncio.gather(*(guard.call_async(request) for _ in range(10)))
+
+    assert sum(asyncio.run(scenario())) == 10
+    assert peak[0] == 2
+    print("✅ Квоты и параллельность")
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_retries_with_jitter()
+    test_circuit_breaker_short_circuits()
+    test_rate_limit_and_concurrency()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from database_extended import FinanceDatabase
+
+
+def rollup_rows(db: FinanceDatabase, user_id: int) -> list:
+    """Содержимое daily_rollups пользователя"""
+    return db._connect().execute("""
+        SELECT day, transaction_type, category, total, count
+        FROM daily_rollups WHERE user_id = ?
+        ORDER BY day, transaction_type, category
+    """, (user_id,)).fetchall()
+
+
+def test_rollups_follow_writes():
+    """Дневные итоги обновляются вместе с транзакциями"""
+    print("🧪 Тестируем дневные итоги...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "rollups.db"))
+    user_id = 5
+    today = datetime.now().date()
+    yesterday = today - timedelta(days=1)
+
+    db.add_transaction({'user_id': user_id, 'amount': 800, 'category': 'еда', 'date': today})
+    db.add_transaction({'user_id': user_id, 'amount': 1200, 'category': 'еда', 'date': today})
+    db.add_transaction({'user_id': user_id, 'amount': 300, 'category': 'транспорт', 'date': yesterday})
+    db.add_transfer(user_id, 5000, 'kaspi', 'halyk')
+
+    assert rollup_rows(db, user_id) == [
+        (yesterday.isoformat(), 'expense', 'транспорт', 300, 1),
+        (today.isoformat(), 'expense', 'еда', 2000, 2),
+        (today.isoformat(), 'transfer', 'перевод', 5000, 1),
+    ]
+    print("✅ Добавление и переводы учтены")
+
+    # Удаляем единственную транзакцию за вчера - строка итога исчезает
+    yesterday_id = db.get_transactions_by_date(user_id, yesterday)[0]['id']
+    assert db.delete_transaction(yesterday_id, user_id)
+    assert not db.delete_transaction(yesterday_id, user_id)
+    assert all(row[0] != yesterday.isoformat() for row in rollup_rows(db, user_id))
+    print("✅ Удаление учтено")
+
+    # Пересчет из сырых данных дает то же самое
+    incremental = rollup_rows(db, user_id)
+    db._connect().execute("DELETE FROM daily_rollups")
+    db._connect().commit()
+    db.rebuild_rollups(user_id)
+    assert rollup_rows(db, user_id) == incremental
+    print("✅ rebuild_rollups совпадает с инкрементальными итогами")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    test_rollups_follow_writes()
+    print("🎉 Тест дневных итогов ПРОЙДЕН!")
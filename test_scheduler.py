@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from scheduler import UserScheduler, scheduled
+
+
+def test_user_order_and_parallelism():
+    """Задачи пользователя идут по одной и по порядку, разные пользователи - параллельно"""
+    print("🧪 Тестируем планировщик по пользователям...")
+
+    sched = UserScheduler(max_concurrency=4, max_user_queue=100)
+    log, running, overlap = [], {}, []
+    lock = threading.Lock()
+
+    def task(user_id, n):
+        with lock:
+            if running.get(user_id):
+                overlap.append(user_id)
+            running[user_id] = True
+        time.sleep(0.005)
+        with lock:
+            running[user_id] = False
+            log.append((user_id, n))
+
+    started = time.perf_counter()
+    for n in range(20):
+        for user_id in range(4):
+            assert sched.submit(user_id, task, user_id, n)
+    assert sched.wait(10)
+    elapsed = time.perf_counter() - started
+
+    assert not overlap
+    for user_id in range(4):
+        assert [n for uid, n in log if uid == user_id] == list(range(20))
+    # 80 задач по 5 мс на 4 местах - заметно быстрее, чем по одной
+    assert elapsed < 80 * 0.005, elapsed
+    print(f"✅ Порядок сохранен, 80 задач за {elapsed:.2f} с")
+    sched.stop()
+
+
+def test_fairness_and_caps():
+    """Пользователь с длинной очередью не задерживает остальных, лишние задачи отклоняются"""
+    print("🧪 Тестируем справедливость и лимиты...")
+
+    sched = UserScheduler(max_concurrency=1, max_user_queue=10)
+    gate = threading.Event()
+    order = []
+
+    sched.submit('spammer', gate.wait)
+    accepted = sum(sched.submit('spammer', order.append, 'spammer') for _ in range(15))
+    assert accepted == 10
+    sched.submit('other', order.append, 'other')
+
+    stats = sched.stats()
+    assert stats['queued'] == 11 and stats['max_user_depth'] == 10 and stats['dropped'] == 5
+
+    gate.set()
+    assert sched.wait(5)
+    # Второй пользователь обслужен сразу после текущей задачи спамера, а не после всей очереди
+    assert order[0] == 'other'
+    stats = sched.stats()
+    assert stats['completed'] == 12 and stats['queued'] == 0 and stats['active_users'] == 0
+    print("✅ Очередь по кругу")
+    sched.stop()
+
+
+def test_future_keeps_user_busy():
+    """Пока корутина пользователя не завершилась, следующая его задача ждет"""
+    sched = UserScheduler(max_concurrency=2)
+    pending, order = Future(), []
+
+    sched.submit(1, lambda: pending)
+    sched.submit(1, order.append, 'second')
+    sched.submit(2, order.append, 'other user')
+    time.sleep(0.1)
+    assert order == ['other user']
+    assert sched.stats()['running'] == 1
+
+    pending.set_result(None)
+    assert sched.wait(5)
+    assert order == ['other user', 'second']
+    sched.stop()
+
+
+def test_scheduled_handler_reports_errors():
+    """Обертка для диспетчера ставит обработчик в очередь пользователя и передает ошибки"""
+    sched = UserScheduler(max_concurrency=2)
+    errors = []
+
+    class User:
+        id = 42
+
+    class Update:
+        effective_user = User()
+        effective_chat = None
+
+    class Dispatcher:
+        def dispatch_error(self, update, error):
+            errors.append(error)
+
+    class Context:
+        dispatcher = Dispatcher()
+
+    def handler(update, context):
+        raise ValueError("сбой")
+
+    scheduled(handler, sched)(Update(), Context())
+    assert sched.wait(5)
+    assert [str(e) for e in errors] == ["сбой"]
+    sched.stop()
+
+
+if __name__ == "__main__":
+    test_user_order_and_parallelism()
+    test_fairness_and_caps()
+    test_future_keeps_user_busy()
+    test_scheduled_handler_reports_errors()
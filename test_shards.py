@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import tempfile
+from datetime import date
+
+from database_extended import FinanceDatabase
+
+
+def count_rows(path: str, table: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_users_are_routed_to_their_shard():
+    """Данные пользователя пишутся и читаются из его файла"""
+    print("🧪 Тестируем шардирование по user_id...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "finance.db"), shards=3)
+    assert [os.path.basename(path) for path in db.shard_paths] == [
+        "finance.shard0.db", "finance.shard1.db", "finance.shard2.db"
+    ]
+
+    for user_id in (3, 4, 5):
+        db.add_user(user_id, f"user{user_id}")
+        assert db.add_transaction({'user_id': user_id, 'amount': 100 * user_id, 'category': 'еда'})
+        db.add_account_balance(user_id, 'kaspi', 1000)
+        assert db.add_transfer(user_id, 300, 'kaspi', 'halyk')
+
+    # У каждого шарда ровно один пользователь и его две транзакции
+    for path in db.shard_paths:
+        assert count_rows(path, "users") == 1
+        assert count_rows(path, "transactions") == 2
+
+    history = db.get_user_transactions_history(4)
+    assert [t['amount'] for t in sorted(history, key=lambda t: t['id'])] == [400, 300]
+    assert db.get_transaction_by_id(history[0]['id'], 4) is not None
+    balances = {b['account_name']: b['balance'] for b in db.get_account_balances(5)}
+    assert balances == {'halyk': 300, 'kaspi': 700}
+    assert db.get_range_aggregates(3, date.today(), date.max)['totals']['expense'] == 300
+    print("✅ Запись и чтение идут в шард пользователя")
+
+    # Пакетная запись раскладывает строки по шардам
+    inserted = db.add_transactions_bulk(
+        {'user_id': user_id, 'amount': 10, 'category': 'такси', 'external_id': f"b{user_id}"}
+        for user_id in range(6, 12)
+    )
+    assert inserted == 6
+    assert [count_rows(path, "transactions") for path in db.shard_paths] == [4, 4, 4]
+    assert db.add_transactions_bulk(
+        {'user_id': user_id, 'amount': 10, 'category': 'такси', 'external_id': f"b{user_id}"}
+        for user_id in range(6, 12)
+    ) == 0
+    assert db.get_data_version(7) == 2
+    assert db.rebuild_rollups() > 0
+    print("✅ Пакетная запись по шардам")
+    db.close()
+
+
+def test_split_existing_database():
+    """split_from переносит данные обычной базы по шардам с теми же id"""
+    print("🧪 Тестируем разбиение базы на шарды...")
+
+    path = os.path.join(tempfile.mkdtemp(), "finance_bot.db")
+    source = FinanceDatabase(path)
+    ids = {}
+    for user_id in range(1, 7):
+        source.add_user(user_id, f"user{user_id}")
+        source.add_transaction({'user_id': user_id, 'amount': user_id, 'category': 'еда'})
+        source.add_account_balance(user_id, 'kaspi', 1000 * user_id)
+        ids[user_id] = source.get_user_transactions_history(user_id)[0]['id']
+    source.close()
+
+    db = FinanceDatabase(path, shards=2)
+    assert db.split_from(path) == [3, 3]
+    # Повторный запуск ничего не дублирует
+    assert db.split_from(path) == [3, 3]
+
+    for user_id, transaction_id in ids.items():
+        transaction = db.get_transaction_by_id(transaction_id, user_id)
+        assert transaction['amount'] == user_id
+        assert db.get_account_balances(user_id)[0]['balance'] == 1000 * user_id
+        assert db.get_range_aggregates(user_id, date.today(), date.max)['totals']['expense'] == user_id
+    assert count_rows(db.shard_paths[0], "users") == 3
+
+    # Новые транзакции в шарде не занимают id перенесенных
+    db.add_transaction({'user_id': 2, 'amount': 50, 'category': 'еда'})
+    assert db.get_user_transactions_history(2)[0]['id'] > max(ids.values())
+    print("✅ Данные и id сохранены")
+    db.close()
+
+
+if __name__ == "__main__":
+    test_users_are_routed_to_their_shard()
+    test_split_existing_database()
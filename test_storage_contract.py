@@ -0,0 +1,128 @@
+import os
+import tempfile
+import uuid
+from datetime import date, timedelta
+
+from database_extended import FinanceDatabase, create_database
+from storage import Storage
+
+
+def check_storage(storage: Storage):
+    """Общие требования ко всем хранилищам"""
+    user_id = 7000 + uuid.uuid4().int % 100000
+    today = date.today()
+
+    storage.add_user(user_id, "anna", "Анна")
+    assert storage.get_data_version(user_id) == 0
+
+    assert storage.add_transaction({'user_id': user_id, 'amount': 800, 'category': 'еда',
+                                    'description': 'кофе', 'bank': 'kaspi'})
+    assert storage.add_transaction({'user_id': user_id, 'amount': 50000, 'category': 'зарплата',
+                                    'type': 'income', 'date': today - timedelta(days=1)})
+    assert storage.get_data_version(user_id) == 2
+
+    # Пакет с повтором external_id добавляет строку один раз
+    rows = [{'user_id': user_id, 'amount': 1500, 'category': 'такси', 'external_id': f"e{n % 3}"}
+            for n in range(6)]
+    assert storage.add_transactions_bulk(rows, chunk_size=4) == 3
+    assert storage.add_transactions_bulk(rows) == 0
+
+    history = storage.get_user_transactions_history(user_id, limit=10)
+    assert len(history) == 5
+    first = history[-1]
+    assert set(first) == {'id', 'amount', 'currency', 'category', 'description', 'bank',
+                          'type', 'date', 'created_at'}
+    assert isinstance(first['date'], str) and len(first['created_at']) == 19
+    assert storage.get_transaction_by_id(first['id'], user_id)['amount'] == first['amount']
+    assert storage.get_transaction_by_id(first['id'], user_id + 1) is None
+
+    # Страницы по курсору без пропусков и повторов
+    page = storage.get_transactions_page(user_id, limit=2)
+    seen = [t['id'] for t in page['transactions']]
+    while page['has_older']:
+        last = page['transactions'][-1]
+        page = storage.get_transactions_page(user_id, cursor=(last['created_at'], last['id']), limit=2)
+        seen += [t['id'] for t in page['transactions']]
+    assert sorted(seen) == sorted(t['id'] for t in history)
+    only_income = storage.get_transactions_page(user_id, filters={'type': 'income'})
+    assert [t['amount'] for t in only_income['transactions']] == [50000]
+
+    exported = [row for chunk in storage.iter_user_transactions(user_id, chunk_size=2) for row in chunk]
+    assert len(exported) == 5 and len(exported[0]) == len(storage.EXPORT_COLUMNS)
+
+    aggregates = storage.get_range_aggregates(user_id, today - timedelta(days=1), today + timedelta(days=1))
+    assert aggregates['totals'] == {'income': 50000, 'expense': 5300, 'transfer': 0}
+    assert aggregates['counts']['expense'] == 4
+    assert aggregates['by_category']['expense'][0]['category'] == 'такси'
+    assert aggregates['by_day'][today.isoformat()]['expense'] == 5300
+
+    statistics = storage.get_user_statistics(user_id)
+    assert statistics['total_expenses'] == 5300 and statistics['total_income'] == 50000
+    assert len(storage.get_transactions_by_date(user_id, today)) == 4
+
+    # Балансы и перевод
+    assert storage.add_account_balance(user_id, 'kaspi', 10000)
+    assert storage.update_account_balance(user_id, 'kaspi', -800)
+    assert storage.add_transfer(user_id, 2000, 'kaspi', 'halyk')
+    balances = {b['account_name']: b['balance'] for b in storage.get_account_balances(user_id)}
+    assert balances == {'halyk': 2000, 'kaspi': 7200}
+
+    # Удаление перевода возвращает деньги на оба счета
+    assert storage.add_transfer(user_id, 1000, 'kaspi', 'halyk')
+    transfer = storage.get_transactions_page(user_id, limit=1, filters={'type': 'transfer'})['transactions'][0]
+    assert transfer['amount'] == 1000
+    assert storage.delete_transaction(transfer['id'], user_id)
+    balances = {b['account_name']: b['balance'] for b in storage.get_account_balances(user_id)}
+    assert balances == {'halyk': 2000, 'kaspi': 7200}
+
+    # Удаление меняет итоги, пересчет дает то же самое
+    taxi = next(t for t in history if t['category'] == 'такси')
+    assert storage.delete_transaction(taxi['id'], user_id)
+    assert not storage.delete_transaction(taxi['id'], user_id)
+    before = storage.get_range_aggregates(user_id, today, today + timedelta(days=1))
+    assert before['totals']['expense'] == 3800
+    assert storage.rebuild_rollups(user_id) > 0
+    assert storage.get_range_aggregates(user_id, today, today + timedelta(days=1)) == before
+
+
+def test_sqlite_storage():
+    """SQLite (один файл и шарды) выполняет контракт хранилища"""
+    print("🧪 Тестируем контракт хранилища на SQLite...")
+
+    directory = tempfile.mkdtemp()
+    for storage in (FinanceDatabase(os.path.join(directory, "contract.db")),
+                    FinanceDatabase(os.path.join(directory, "sharded.db"), shards=3)):
+        check_storage(storage)
+        storage.close()
+
+    storage = create_database(f"sqlite:///{os.path.join(directory, 'url.db')}")
+    assert isinstance(storage, FinanceDatabase)
+    storage.close()
+    print("✅ SQLite")
+
+
+def test_postgres_storage():
+    """PostgreSQL выполняет тот же контракт (нужна тестовая база в TEST_POSTGRES_DSN)"""
+    dsn = os.getenv('TEST_POSTGRES_DSN')
+    if not dsn:
+        print("⚠️ TEST_POSTGRES_DSN не задан, PostgreSQL не проверяем")
+        return
+
+    print("🧪 Тестируем контракт хранилища на PostgreSQL...")
+    from postgres_storage import PostgresStorage
+
+    # Отдельная схема, которая удаляется после теста
+    schema = f"contract_{uuid.uuid4().hex[:12]}"
+    storage = PostgresStorage(dsn, pool_size=4, schema=schema)
+    try:
+        check_storage(storage)
+        print("✅ PostgreSQL")
+    finally:
+        with storage._transaction() as cursor:
+            cursor.execute(f'DROP SCHEMA "{schema}" CASCADE')
+        storage.close()
+
+
+if __name__ == "__main__":
+    test_sqlite_storage()
+    test_postgres_storage()
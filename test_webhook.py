@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from db_connection import SQLiteConnectionManager
+from webhook import UpdateRouter, UpdateServer, update_user_id, worker_for
+
+
+def message_update(update_id: int, user_id: int) -> bytes:
+    return json.dumps({
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'from': {'id': user_id}, 'chat': {'id': user_id},
+                    'text': f"сообщение {update_id}"}
+    }).encode('utf-8')
+
+
+def test_updates_are_routed_by_user():
+    """Пользователь определяется по любому типу обновления"""
+    print("🧪 Тестируем выбор процесса по пользователю...")
+
+    assert update_user_id(json.loads(message_update(1, 42))) == 42
+    assert update_user_id({'update_id': 2, 'callback_query': {'id': 'x', 'from': {'id': 7},
+                                                               'data': 'refresh_history'}}) == 7
+    assert update_user_id({'update_id': 3, 'channel_post': {'chat': {'id': -100}}}) == -100
+    assert update_user_id({'update_id': 4}) == 0
+    assert [worker_for(user_id, 3) for user_id in (0, 1, 5, -100)] == [0, 1, 2, 2]
+    print("✅ Маршрутизация")
+
+
+def test_router_keeps_per_user_order():
+    """Обновления пользователя доходят до его процесса по порядку, даже если процесс запустился позже"""
+    print("🧪 Тестируем порядок доставки...")
+
+    received = {0: [], 1: []}
+    servers = []
+
+    def start_worker(index: int, port: int):
+        def on_update(body: bytes) -> bool:
+            update = json.loads(body)
+            received[index].append((update['message']['from']['id'], update['update_id']))
+            return True
+        server = UpdateServer(port, '/', on_update)
+        servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Свободные порты: занимаем и сразу освобождаем
+    probes = [UpdateServer(0, '/', lambda body: True) for _ in range(2)]
+    ports = [probe.server_address[1] for probe in probes]
+    for probe in probes:
+        probe.server_close()
+
+    start_worker(0, ports[0])
+    router = UpdateRouter(ports)
+    for update_id in range(60):
+        assert router.route(message_update(update_id, update_id % 4))
+
+    # Второй процесс "поднимается" позже - его обновления ждут и не теряются
+    time.sleep(0.2)
+    start_worker(1, ports[1])
+    router.stop()
+
+    assert router.stats()['forwarded'] == [30, 30]
+    assert router.stats()['retries'] > 0
+    for index, updates in received.items():
+        assert {user_id % 2 for user_id, _ in updates} == {index}
+        for user_id in {user_id for user_id, _ in updates}:
+            ids = [update_id for uid, update_id in updates if uid == user_id]
+            assert ids == sorted(ids) and len(ids) == 15
+    print("✅ Порядок сохранен")
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_connections_are_not_shared_after_fork():
+    """Дочерний процесс открывает свои соединения, а не использует родительские"""
+    print("🧪 Тестируем соединения после fork...")
+
+    manager = SQLiteConnectionManager(os.path.join(tempfile.mkdtemp(), "fork.db"))
+    parent = manager.connection()
+    parent.execute("CREATE TABLE t (x INTEGER)")
+    parent.commit()
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child = manager.connection()
+            child.execute("INSERT INTO t VALUES (1)")
+            child.commit()
+            os.write(write_end, b'1' if child is not parent else b'0')
+        finally:
+            os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1) == b'1'
+    assert manager.connection() is parent
+    assert parent.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    manager.close_all()
+    print("✅ Свои соединения в дочернем процессе")
+
+
+def test_worker_stats_endpoint():
+    """Обработчик отдает счетчики своего процесса по GET /stats"""
+    import http.client
+    from webhook import dry_run_handler
+
+    handle, stats = dry_run_handler()
+    server = UpdateServer(0, '/', lambda body: True, stats)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    conn.request('GET', '/stats')
+    response = conn.getresponse()
+    body = json.loads(response.read())
+    conn.close()
+    server.shutdown()
+    server.server_close()
+
+    assert response.status == 200
+    assert set(body['local_parser']) == {'attempts', 'accepted', 'fast_path_share'}
+
+
+if __name__ == "__main__":
+    test_updates_are_routed_by_user()
+    test_router_keeps_per_user_order()
+    test_connections_are_not_shared_after_fork()
+    test_worker_stats_endpoint()
@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from database_extended import FinanceDatabase
+from write_behind import WriteBehindQueue
+
+
+def count_rows(db: FinanceDatabase, user_id: int) -> int:
+    return db._connect().execute(
+        "SELECT COUNT(*) FROM transactions WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+
+
+def test_group_commits():
+    """Транзакции из очереди пишутся пакетами"""
+    print("🧪 Тестируем отложенную запись...")
+
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "wb.db"))
+    queue = WriteBehindQueue(db, batch_size=100, flush_interval=0.02)
+    queue.start()
+
+    for i in range(250):
+        assert queue.add_transaction({'user_id': 1, 'amount': i + 1, 'category': 'еда'})
+    assert not queue.add_transaction({'user_id': 1, 'amount': 5})
+
+    # Неполный последний пакет уходит по таймеру
+    deadline = time.monotonic() + 5
+    while count_rows(db, 1) < 250 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert count_rows(db, 1) == 250
+
+    stats = queue.stats()
+    assert stats['rows'] == 250 and stats['pending'] == 0
+    assert stats['flushes'] <= 5
+    assert db.get_range_aggregates(1, '2000-01-01', '2100-01-01')['totals']['expense'] == 250 * 251 / 2
+    print(f"✅ 250 транзакций за {stats['flushes']} коммитов")
+
+    queue.stop()
+    db.close()
+
+
+def test_journal_recovery():
+    """Недописанная очередь восстанавливается из журнала без дубликатов"""
+    directory = tempfile.mkdtemp()
+    db = FinanceDatabase(os.path.join(directory, "wb.db"))
+    journal = os.path.join(directory, "wb.journal")
+
+    # "Падение": очередь не успела записаться
+    crashed = WriteBehindQueue(db, batch_size=1000, journal_path=journal)
+    for i in range(10):
+        crashed.add_transaction({'user_id': 2, 'amount': 100, 'category': 'еда'})
+    # Часть строк успела записаться до падения
+    db.add_transactions_bulk(crashed._pending[:4])
+    assert count_rows(db, 2) == 4
+
+    recovered = WriteBehindQueue(db, journal_path=journal)
+    assert recovered.flush()
+    assert count_rows(db, 2) == 10
+    recovered.stop()
+    assert os.path.getsize(journal) == 0
+
+    # Пустой журнал ничего не добавляет
+    again = WriteBehindQueue(db, journal_path=journal)
+    assert again.stats()['pending'] == 0
+    again.stop()
+    db.close()
+
+
+def test_stop_flushes_queue():
+    """stop() дописывает очередь"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "wb.db"))
+    queue = WriteBehindQueue(db, batch_size=1000, flush_interval=60)
+    queue.start()
+    for _ in range(30):
+        queue.add_transaction({'user_id': 3, 'amount': 1, 'category': 'еда'})
+    queue.stop(timeout=5)
+    assert count_rows(db, 3) == 30
+    db.close()
+
+
+
+def test_partial_batch_after_drain():
+    """Неполный пакет после опустевшей очереди пишется по таймеру, без stop() и flush()"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "wb.db"))
+    queue = WriteBehindQueue(db, batch_size=100, flush_interval=0.02)
+    queue.start()
+
+    expected = 0
+    for rows in (1, 3, 2):
+        for _ in range(rows):
+            queue.add_transaction({'user_id': 4, 'amount': 1, 'category': 'еда'})
+        expected += rows
+        # Писатель уже спит на пустой очереди: его должна разбудить первая строка пакета
+        deadline = time.monotonic() + 2
+        while count_rows(db, 4) < expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert count_rows(db, 4) == expected
+        time.sleep(0.05)
+
+    queue.stop()
+    db.close()
+
+
+def test_invalid_rows_are_not_acknowledged():
+    """Строки, которые база не примет, не попадают в очередь и не пропадают молча при записи"""
+    db = FinanceDatabase(os.path.join(tempfile.mkdtemp(), "wb.db"))
+    queue = WriteBehindQueue(db)
+    assert not queue.add_transaction({'user_id': 5, 'amount': None, 'category': 'еда'})
+    assert not queue.add_transaction({'user_id': 5, 'amount': 1, 'category': 'еда', 'type': 'bogus'})
+    assert queue.stats()['pending'] == 0
+
+    for row in ({'user_id': 5, 'amount': None, 'category': 'еда'},
+                {'user_id': 5, 'amount': 1, 'category': 'еда', 'type': 'bogus'}):
+        try:
+            db.add_transactions_bulk([row])
+            assert False, "ожидалась ошибка"
+        except sqlite3.IntegrityError:
+            pass
+    assert count_rows(db, 5) == 0
+
+    # Повторный external_id по-прежнему просто пропускается
+    row = {'user_id': 5, 'amount': 1, 'category': 'еда', 'external_id': 'x'}
+    assert db.add_transactions_bulk([row, row]) == 1
+    queue.stop()
+    db.close()
+
+
+if __name__ == "__main__":
+    test_group_commits()
+    test_journal_recovery()
+    test_stop_flushes_queue()
+    test_partial_batch_after_drain()
+    test_invalid_rows_are_not_acknowledged()
@@ -0,0 +1,84 @@
+"""Потоковая выгрузка транзакций пользователя в CSV или Parquet.
+
+Строки читаются из базы порциями (fetchmany) и сразу пишутся в файл,
+поэтому выгрузка любой истории занимает память одной порции.
+"""
+import csv
+from typing import Dict
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Заголовки CSV для колонок FinanceDatabase.EXPORT_COLUMNS
+CSV_HEADERS = {
+    'id': 'id',
+    'transaction_date': 'Дата',
+    'amount': 'Сумма',
+    'currency': 'Валюта',
+    'category': 'Категория',
+    'description': 'Описание',
+    'bank': 'Банк',
+    'transaction_type': 'Тип',
+    'created_at': 'Добавлено',
+}
+
+
+class ExportError(ValueError):
+    """Выгрузку в запрошенном формате сделать нельзя"""
+
+
+def export_csv(db, user_id: int, path: str, chunk_size: int = 5000) -> int:
+    """Выгрузить транзакции в CSV (UTF-8 с BOM, чтобы Excel понял кириллицу)"""
+    rows = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([CSV_HEADERS[column] for column in db.EXPORT_COLUMNS])
+        for chunk in db.iter_user_transactions(user_id, chunk_size):
+            writer.writerows(chunk)
+            rows += len(chunk)
+    return rows
+
+
+def export_parquet(db, user_id: int, path: str, chunk_size: int = 50000) -> int:
+    """Выгрузить транзакции в Parquet: одна группа строк на порцию"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Для Parquet нужен пакет pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('transaction_date', pa.string()),
+        ('amount', pa.float64()),
+        ('currency', pa.string()),
+        ('category', pa.string()),
+        ('description', pa.string()),
+        ('bank', pa.string()),
+        ('transaction_type', pa.string()),
+        ('created_at', pa.string()),
+    ])
+
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for chunk in db.iter_user_transactions(user_id, chunk_size):
+            columns = [list(column) for column in zip(*chunk)]
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            rows += len(chunk)
+    return rows
+
+
+def export_transactions(db, user_id: int, path: str, export_format: str = 'csv',
+                        chunk_size: int = None) -> Dict:
+    """Выгрузить транзакции пользователя в файл, вернуть статистику"""
+    exporters = {'csv': export_csv, 'parquet': export_parquet}
+    if export_format not in exporters:
+        raise ExportError(f"Неизвестный формат: {export_format} (доступны: {', '.join(EXPORT_FORMATS)})")
+
+    if chunk_size:
+        rows = exporters[export_format](db, user_id, path, chunk_size)
+    else:
+        rows = exporters[export_format](db, user_id, path)
+    return {'format': export_format, 'rows': rows, 'path': path}
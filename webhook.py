@@ -0,0 +1,336 @@
+"""Режим webhook: несколько процессов-обработчиков за одним приемником.
+
+    python webhook.py --workers 4 --port 8443 --url https://bot.example.com
+
+Приемник (этот процесс) принимает обновления от Telegram, определяет
+пользователя и передает обновление процессу user_id % workers по
+локальному HTTP. Все обновления одного пользователя идут одному процессу
+и в порядке поступления, поэтому кэши процесса (пользователи, балансы,
+экраны, хэши сообщений) видят все изменения своих пользователей.
+С DB_SHARDS, равным числу процессов, каждый процесс пишет только в
+свой файл базы.
+
+--dry-run заменяет Telegram и OpenAI локальным разбором сообщений и
+записью в базу - так работает loadgen.py.
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+
+def update_user_id(update: Dict) -> int:
+    """Пользователь, от которого пришло обновление (0, если его нет)"""
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        sender = value.get('from') or value.get('chat')
+        if isinstance(sender, dict) and 'id' in sender:
+            return sender['id']
+    return 0
+
+
+def worker_for(user_id: int, workers: int) -> int:
+    """Номер процесса пользователя (то же правило, что у шардов базы)"""
+    return user_id % workers
+
+
+class UpdateRouter:
+    """Очереди обновлений по процессам-обработчикам.
+
+    У каждого процесса своя очередь и свой поток, который по одному
+    пересылает обновления в постоянное HTTP-соединение. Обновление, которое
+    не удалось доставить (процесс перезапускается), отправляется повторно,
+    а следующие за ним ждут - порядок внутри процесса не нарушается.
+    """
+
+    def __init__(self, ports: List[int], queue_size: int = 10000, timeout: float = 30.0):
+        self.ports = ports
+        self.timeout = timeout
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in ports]
+        self.routed = [0] * len(ports)
+        self.forwarded = [0] * len(ports)
+        self.retries = 0
+        self.rejected = 0
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._forward_loop, args=(index,),
+                             name=f"router-{index}", daemon=True)
+            for index in range(len(ports))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def route(self, body: bytes) -> bool:
+        """Поставить обновление в очередь его процесса. False - очередь переполнена"""
+        index = worker_for(update_user_id(json.loads(body)), len(self.ports))
+        try:
+            self.queues[index].put_nowait(body)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.routed[index] += 1
+        return True
+
+    def _forward_loop(self, index: int):
+        conn = None
+        while True:
+            body = self.queues[index].get()
+            if body is None:
+                break
+
+            delay = 0.05
+            while True:
+                try:
+                    if conn is None:
+                        conn = http.client.HTTPConnection('127.0.0.1', self.ports[index],
+                                                          timeout=self.timeout)
+                    conn.request('POST', '/', body, {'Content-Type': 'application/json'})
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status == 200:
+                        break
+                except (OSError, http.client.HTTPException):
+                    if conn is not None:
+                        conn.close()
+                    conn = None
+                if self._stopping:
+                    break
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+
+            with self._lock:
+                self.forwarded[index] += 1
+
+    def stop(self, timeout: float = 10.0):
+        """Дослать очереди и остановить потоки"""
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._stopping = True
+
+    def stats(self) -> Dict:
+        """Сколько обновлений принято и доставлено каждому процессу"""
+        with self._lock:
+            return {
+                'routed': list(self.routed),
+                'forwarded': list(self.forwarded),
+                'queued': [q.qsize() for q in self.queues],
+                'retries': self.retries,
+                'rejected': self.rejected
+            }
+
+
+class UpdateServer(ThreadingHTTPServer):
+    """HTTP-сервер, который передает тело POST-запроса в on_update"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, path: str, on_update: Callable[[bytes], bool],
+                 on_stats: Callable[[], Dict] = None, listen: str = '127.0.0.1'):
+        super().__init__((listen, port), _UpdateHandler)
+        self.update_path = path
+        self.on_update = on_update
+        self.on_stats = on_stats
+
+
+class _UpdateHandler(BaseHTTPRequestHandler):
+    # Keep-alive: приемник и loadgen держат соединения открытыми
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != self.server.update_path:
+            self._reply(404)
+            return
+        try:
+            accepted = self.server.on_update(body)
+        except ValueError:
+            self._reply(400)
+            return
+        # 503 - Telegram повторит доставку позже
+        self._reply(200 if accepted else 503)
+
+    def do_GET(self):
+        if self.path != '/stats' or self.server.on_stats is None:
+            self._reply(404)
+            return
+        self._reply(200, json.dumps(self.server.on_stats()).encode('utf-8'))
+
+    def _reply(self, status: int, body: bytes = b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Журнал на каждый запрос - слишком много при нагрузке
+        pass
+
+
+def dry_run_handler() -> Tuple[Callable[[Dict], None], Callable[[], Dict]]:
+    """Обработка без Telegram и OpenAI: локальный разбор текста и запись в базу.
+
+    Возвращает обработчик обновления и функцию счетчиков для /stats.
+    """
+    from database_extended import db
+    from local_parser import DEFAULT_CATEGORIES, LocalParser
+
+    parser = LocalParser(DEFAULT_CATEGORIES)
+
+    def handle(update: Dict):
+        message = update.get('message') or {}
+        user, text = message.get('from'), message.get('text')
+        if not user or not text:
+            return
+        db.add_user(user['id'], user.get('username'), user.get('first_name'))
+        result = parser.parse(text)
+        if result['success']:
+            db.add_transaction({
+                'user_id': user['id'],
+                'amount': result['amount'],
+                'currency': result['currency'],
+                'category': result['category'],
+                'description': result['description'],
+                'bank': result['bank'],
+                'type': result['type'],
+                'confidence': result['confidence'],
+                'raw_message': text
+            })
+
+    return handle, lambda: {'local_parser': parser.stats()}
+
+
+def run_worker(index: int, port: int, dry_run: bool = False):
+    """Процесс-обработчик: принимает обновления от приемника на 127.0.0.1:port"""
+    # До импорта модулей бота: по номеру процесса выбираются его файлы (журнал записи)
+    os.environ['WEB_WORKER_INDEX'] = str(index)
+
+    if dry_run:
+        handle, stats = dry_run_handler()
+        stop = lambda: None
+    else:
+        from telegram import Bot, Update
+        from telegram.ext import Dispatcher
+        import main
+
+        bot = Bot(main.TELEGRAM_TOKEN)
+        main.start_services(bot)
+        dispatcher = Dispatcher(bot, queue.Queue(), use_context=True)
+        main.register_handlers(dispatcher)
+        threading.Thread(target=dispatcher.start, name="dispatcher", daemon=True).start()
+
+        handle = lambda data: dispatcher.update_queue.put(Update.de_json(data, bot))
+        stats = main.service_stats
+
+        def stop():
+            dispatcher.stop()
+            main.stop_services()
+
+    def on_update(body: bytes) -> bool:
+        handle(json.loads(body))
+        return True
+
+    # GET /stats на порту обработчика - счетчики кэшей, очередей и OpenAI этого процесса
+    server = UpdateServer(port, '/', on_update, stats)
+    _stop_on_signal(server)
+    server.serve_forever()
+    server.server_close()
+    stop()
+
+
+def _stop_on_signal(server: ThreadingHTTPServer):
+    """SIGTERM/SIGINT останавливают serve_forever (из другого потока, иначе deadlock)"""
+    def handler(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def set_webhook(token: str, url: str):
+    """Зарегистрировать адрес приемника в Telegram"""
+    data = urllib.parse.urlencode({'url': url}).encode('utf-8')
+    with urllib.request.urlopen(f"https://api.telegram.org/bot{token}/setWebhook", data) as response:
+        result = json.loads(response.read())
+    if not result.get('ok'):
+        raise RuntimeError(f"setWebhook: {result.get('description')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бот в режиме webhook на нескольких процессах")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "2")),
+                        help="число процессов-обработчиков")
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_PORT", "8443")),
+                        help="порт приемника; обработчики слушают port+1, port+2, ...")
+    parser.add_argument("--listen", default=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                        help="адрес приемника")
+    parser.add_argument("--url", default=os.getenv("WEBHOOK_URL"),
+                        help="внешний адрес приемника для setWebhook")
+    parser.add_argument("--path", default=os.getenv("WEBHOOK_PATH"),
+                        help="путь webhook (по умолчанию - из хэша токена)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="без Telegram и OpenAI (для loadgen.py)")
+    args = parser.parse_args()
+
+    if not args.dry_run:
+        from dotenv import load_dotenv
+        load_dotenv()
+    token = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    if not args.dry_run and not token:
+        print("❌ Токен не найден! Проверьте .env файл")
+        return
+
+    # Секретный путь: обновления принимаются только по нему
+    path = args.path or "/telegram/" + hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+    # spawn: обработчики стартуют с чистого интерпретатора, без копий
+    # соединений и блокировок приемника
+    context = multiprocessing.get_context('spawn')
+    ports = [args.port + 1 + index for index in range(args.workers)]
+    processes = [
+        context.Process(target=run_worker, args=(index, port, args.dry_run),
+                        name=f"worker-{index}")
+        for index, port in enumerate(ports)
+    ]
+    for process in processes:
+        process.start()
+
+    router = UpdateRouter(ports)
+    server = UpdateServer(args.port, path, router.route, router.stats, listen=args.listen)
+    _stop_on_signal(server)
+
+    if args.url and not args.dry_run:
+        set_webhook(token, args.url.rstrip('/') + path)
+    print(f"✅ Приемник на {args.listen}:{args.port}{path}, процессов: {args.workers}")
+
+    server.serve_forever()
+    server.server_close()
+
+    # Досылаем принятые обновления и останавливаем обработчики
+    router.stop()
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(30)
+    print(f"🛑 Остановлено: {router.stats()}")
+
+
+if __name__ == "__main__":
+    main()
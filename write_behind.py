@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database_extended import db, to_date
+
+# Допустимые значения transaction_type (CHECK в таблице transactions)
+TRANSACTION_TYPES = ('income', 'expense', 'transfer')
+
+
+class WriteBehindQueue:
+    """Отложенная запись транзакций групповыми коммитами.
+
+    add_transaction() только кладет транзакцию в очередь (и в журнал на
+    диске) и сразу возвращает True. Фоновый поток пишет очередь в базу
+    через add_transactions_bulk, когда набралось batch_size строк или
+    прошло flush_interval секунд с первой строки пакета: один коммит на
+    пакет вместо коммита на каждое сообщение.
+
+    Журнал - файл JSON-строк, который очищается, когда очередь записана.
+    После падения процесса недописанные строки берутся из журнала при
+    следующем запуске; у каждой строки есть external_id, поэтому повторная
+    запись уже сохраненных строк ничего не дублирует.
+    """
+
+    def __init__(self, database, batch_size: int = 100, flush_interval: float = 0.05,
+                 journal_path: Optional[str] = None, fsync: bool = False):
+        self.db = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.fsync = fsync
+
+        self.flushes = 0
+        self.rows = 0
+        self.errors = 0
+
+        self._pending = []
+        self._in_flight = 0
+        self._flush_requested = False
+        self._stopping = False
+        self._keep_journal = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+        self._journal = None
+        if journal_path:
+            self._pending.extend(self._read_journal(journal_path))
+            self._journal = open(journal_path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _read_journal(path: str) -> List[Dict]:
+        """Недописанные строки из журнала прошлого запуска"""
+        if not os.path.exists(path):
+            return []
+        items = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Последняя строка могла не дописаться при падении
+                    continue
+        if items:
+            print(f"♻️ Восстановлено из журнала записи: {len(items)} транзакций")
+        return items
+
+    def start(self):
+        """Запустить фоновый поток записи"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def add_transaction(self, transaction_data: Dict) -> bool:
+        """Поставить транзакцию в очередь на запись"""
+        missing = [key for key in ('user_id', 'amount', 'category')
+                   if transaction_data.get(key) is None]
+        if missing:
+            # Такая строка не запишется никогда - не пускаем ее в очередь
+            print(f"❌ Ошибка добавления транзакции: нет полей {', '.join(missing)}")
+            return False
+        if transaction_data.get('type', 'expense') not in TRANSACTION_TYPES:
+            print(f"❌ Ошибка добавления транзакции: неизвестный тип {transaction_data['type']}")
+            return False
+
+        item = dict(transaction_data)
+        item.setdefault('external_id', f"wb:{uuid.uuid4().hex}")
+        item['date'] = to_date(item.get('date') or datetime.now().date()).isoformat()
+
+        with self._cond:
+            if self._journal is not None:
+                self._journal.write(json.dumps(item, ensure_ascii=False) + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            self._pending.append(item)
+            # Первая строка пакета запускает таймер flush_interval, полный пакет - запись
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+
+                # Ждем полный пакет, но не дольше flush_interval
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._pending) < self.batch_size
+                       and not self._stopping and not self._flush_requested):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._in_flight += len(batch)
+
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]) -> bool:
+        """Записать пакет одной транзакцией SQLite"""
+        try:
+            self.db.add_transactions_bulk(batch, chunk_size=len(batch))
+        except Exception as e:
+            print(f"❌ Ошибка отложенной записи {len(batch)} транзакций: {e}")
+            with self._cond:
+                self.errors += 1
+                self._in_flight -= len(batch)
+                if self._stopping:
+                    # При остановке не зацикливаемся: строки остаются в журнале
+                    self._keep_journal = True
+                else:
+                    self._pending[0:0] = batch
+                self._cond.notify_all()
+            if not self._stopping and self._thread is not None:
+                time.sleep(min(self.flush_interval * 10, 1.0))
+            return False
+
+        with self._cond:
+            self.flushes += 1
+            self.rows += len(batch)
+            self._in_flight -= len(batch)
+            if self._journal is not None and not self._pending and not self._in_flight \
+                    and not self._keep_journal:
+                # Все, что было в журнале, уже в базе
+                self._journal.truncate(0)
+            if not self._pending:
+                self._flush_requested = False
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Записать все, что в очереди, и дождаться коммита"""
+        if self._thread is None:
+            # Поток не запущен - пишем в текущем потоке
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.batch_size]
+                    del self._pending[:self.batch_size]
+                    self._in_flight += len(batch)
+                if not batch:
+                    return True
+                if not self._write(batch):
+                    return False
+
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._in_flight, timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Дописать очередь и остановить поток (вызывается при остановке бота)"""
+        self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def stats(self) -> Dict:
+        """Групповые коммиты и размер очереди"""
+        with self._cond:
+            return {
+                'pending': len(self._pending) + self._in_flight,
+                'flushes': self.flushes,
+                'rows': self.rows,
+                'avg_batch_size': self.rows / self.flushes if self.flushes else 0.0,
+                'errors': self.errors
+            }
+
+
+def create_write_behind() -> Optional[WriteBehindQueue]:
+    """Очередь из настроек окружения или None, если отложенная запись выключена"""
+    if os.getenv('WRITE_BEHIND', '0') != '1':
+        return None
+    journal_path = os.getenv('WRITE_BEHIND_JOURNAL', 'write_behind.journal') or None
+    worker = os.getenv('WEB_WORKER_INDEX')
+    if journal_path and worker is not None:
+        # У каждого процесса webhook.py свой журнал: один файл очищали бы чужие записи
+        journal_path = f"{journal_path}.{worker}"
+    return WriteBehindQueue(
+        db,
+        batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '100')),
+        flush_interval=int(os.getenv('WRITE_BEHIND_INTERVAL_MS', '50')) / 1000,
+        journal_path=journal_path
+    )
+
+
+write_behind = create_write_behind()